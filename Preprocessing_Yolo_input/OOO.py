@@ -4,9 +4,23 @@ import numpy as np
 import pyautogui
 import csv
 
+from homography import HomographyEngine
+from homography_stack import HomographyStackWriter
+from overlay import SpriteCache, Preview
+from schedule import compile_schedule
+from dynamic_export import save_exclusion_masks
+
 # get your primary monitor’s size
 screen_w, screen_h = pyautogui.size()
 
+# on-screen preview refresh cap (frames/s); None shows every frame, 0 disables
+# the window so output_video.mp4 is written at full speed
+PREVIEW_FPS = 10
+
+# the masks drawn on the reference frame only serve this run; set a path
+# (e.g. 'exclusion_masks.csv') to also save them for tool.py / export_cli.py
+SAVE_MASKS = None
+
 # --- CSV SETUP ---
 csv_file = open("polygons.csv", "w", newline="")
 csv_writer = csv.writer(csv_file)
@@ -83,25 +97,20 @@ def get_circle_centers(center):
         (cx, int(cy + panel_height/3))
     )
 
+# green intervals compiled once into a per-frame state table
+timeline = compile_schedule(traffic_light_schedule, lead=75, lag=75)
+
+panel_colors = {
+    'yellow': (dark_red, base_yellow, dark_green),
+    'green':  (dark_red, dark_yellow, base_green),
+    'red':    (base_red, dark_yellow, dark_green),
+}
+
 def get_panel_colors_by_schedule(light_id, frame_count):
-    for start, end in traffic_light_schedule.get(light_id, []):
-        if start - 75 <= frame_count < start:
-            return dark_red, base_yellow, dark_green
-        if start <= frame_count < end:
-            return dark_red, dark_yellow, base_green
-        if end <= frame_count < end + 75:
-            return dark_red, base_yellow, dark_green
-    return base_red, dark_yellow, dark_green
+    return panel_colors[timeline.state(light_id, frame_count)]
 
 def get_light_state(lid, fcount):
-    for start, end in traffic_light_schedule.get(lid, []):
-        if start - 75 <= fcount < start:
-            return 'yellow'
-        if start <= fcount < end:
-            return 'green'
-        if end <= fcount < end + 75:
-            return 'yellow'
-    return 'red'
+    return timeline.state(lid, fcount)
 
 def draw_direction_arrows(frame, center, color):
     cx, cy = center
@@ -109,29 +118,39 @@ def draw_direction_arrows(frame, center, color):
     cv2.arrowedLine(frame, (cx-10, arrow_y), (cx-30, arrow_y), color, 2, tipLength=0.3)
     cv2.arrowedLine(frame, (cx+10, arrow_y), (cx+10, arrow_y-20), color, 2, tipLength=0.3)
 
+def draw_panel(img, key):
+    """Draw the panel for key (lid, (r, y, g) colours, state); SpriteCache renders each key once."""
+    lid, (r, y, g), state = key
+    ctr = traffic_lights_positions[lid]
+    tl = (int(ctr[0] - panel_width/2), int(ctr[1] - panel_height/2))
+    br = (int(ctr[0] + panel_width/2), int(ctr[1] + panel_height/2))
+    cv2.rectangle(img, tl, br, (255,255,255), -1)
+    rc, yc, gc = get_circle_centers(ctr)
+    cv2.circle(img, rc, circle_radius, r, -1)
+    cv2.circle(img, yc, circle_radius, y, -1)
+    cv2.circle(img, gc, circle_radius, g, -1)
+    cv2.putText(img, lid, (br[0]+5, ctr[1]),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
+
+    # direction arrows
+    if lid in ("ID-2","ID-4"):
+        col = base_green if state=="green" else base_yellow if state=="yellow" else base_red
+        draw_direction_arrows(img, ctr, col)
+    if lid.endswith("-F") or lid.endswith("-L"):
+        col = base_green if state=="green" else base_yellow if state=="yellow" else base_red
+        arrow_y = ctr[1] - panel_height//2 - 10
+        if lid.endswith("-F"):
+            cv2.arrowedLine(img, (ctr[0], arrow_y),
+                            (ctr[0], arrow_y-20), col, 2, tipLength=0.3)
+        else:
+            cv2.arrowedLine(img, (ctr[0]-10, arrow_y),
+                            (ctr[0]-30, arrow_y), col, 2, tipLength=0.3)
+
 def transform_points(pts, H):
     pts = pts.reshape(-1,1,2)
     t   = cv2.perspectiveTransform(pts, H)
     return t.reshape(-1,2).astype(np.int32)
 
-def compute_dynamic_homography(ref_img, cur_img):
-    g1 = cv2.cvtColor(ref_img, cv2.COLOR_BGR2GRAY)
-    g2 = cv2.cvtColor(cur_img, cv2.COLOR_BGR2GRAY)
-    sift = cv2.SIFT_create()
-    k1,d1 = sift.detectAndCompute(g1, None)
-    k2,d2 = sift.detectAndCompute(g2, None)
-    if d1 is None or d2 is None:
-        return None
-    bf = cv2.BFMatcher(cv2.NORM_L2)
-    matches = bf.knnMatch(d1, d2, k=2)
-    good = [m for m,n in matches if m.distance < 0.75*n.distance]
-    if len(good) < 10:
-        return None
-    src = np.float32([k1[m.queryIdx].pt for m in good]).reshape(-1,1,2)
-    dst = np.float32([k2[m.trainIdx].pt for m in good]).reshape(-1,1,2)
-    H, _ = cv2.findHomography(src, dst, cv2.RANSAC, 5.0)
-    return H
-
 # --- ANNOTATION SETUP ---
 current_annotation_id     = None
 annotations               = {k:[] for k in world_intersections}
@@ -182,6 +201,7 @@ while True:
     k = cv2.waitKey(30) & 0xFF
     if k == ord('c'):
         ref_frame = frm.copy()
+        ref_idx = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1
         break
     if k == ord('q'):
         cap.release()
@@ -242,6 +262,13 @@ while True:
 
 cv2.destroyWindow("Reference Frame")
 
+# reference features are computed once and reused for every frame; the
+# masked areas (moving traffic) are left out of feature detection
+engine = HomographyEngine(ref_frame, exclude=mask_polygons)
+if SAVE_MASKS:
+    save_exclusion_masks(mask_polygons, SAVE_MASKS)
+    print(f"Saved {len(mask_polygons)} exclusion masks to {SAVE_MASKS}")
+
 # --- STEP 3: PREPARE OUTPUT ---
 cap.release()
 cap = cv2.VideoCapture(video_path)
@@ -252,110 +279,102 @@ out = cv2.VideoWriter("output_video.mp4",
                       cv2.VideoWriter_fourcc(*"mp4v"),
                       fps, (w, h))
 
-cv2.namedWindow("Dynamic Intersection Overlays", cv2.WINDOW_NORMAL)
+# panels are rendered once per light/state and blitted; the preview is rate-capped
+panels  = SpriteCache(draw_panel)
+preview = Preview("Dynamic Intersection Overlays", (screen_w, screen_h), PREVIEW_FPS)
+
+# per-frame homographies, so shapes can be re-warped later without SIFT
+stack = HomographyStackWriter("homographies.stack", size=(w, h),
+                              video=video_path, ref_frame=ref_idx)
+
+# intersection polygons in reference-frame pixels, stacked so each frame
+# needs a single perspectiveTransform instead of one Hdyn·H per intersection
+ref_ids  = list(intersection_homographies)
+ref_pts  = np.concatenate([
+    cv2.perspectiveTransform(world_intersections[k].reshape(-1,1,2).astype(np.float64),
+                             intersection_homographies[k])
+    for k in ref_ids]) if ref_ids else None
 
 # --- STEP 4: MAIN LOOP ---
 frame_count = 0
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-    frame_count += 1
-
-    Hdyn = compute_dynamic_homography(ref_frame, frame)
-
-    # static traffic lights
-    for lid, ctr in traffic_lights_positions.items():
-        r, y, g = get_panel_colors_by_schedule(lid, frame_count)
-        tl = (int(ctr[0] - panel_width/2), int(ctr[1] - panel_height/2))
-        br = (int(ctr[0] + panel_width/2), int(ctr[1] + panel_height/2))
-        cv2.rectangle(frame, tl, br, (255,255,255), -1)
-        rc, yc, gc = get_circle_centers(ctr)
-        cv2.circle(frame, rc, circle_radius, r, -1)
-        cv2.circle(frame, yc, circle_radius, y, -1)
-        cv2.circle(frame, gc, circle_radius, g, -1)
-        cv2.putText(frame, lid, (br[0]+5, ctr[1]),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
-
-        # direction arrows
-        if lid in ("ID-2","ID-4"):
-            st = get_light_state(lid, frame_count)
-            col = base_green if st=="green" else base_yellow if st=="yellow" else base_red
-            draw_direction_arrows(frame, ctr, col)
-        if lid.endswith("-F") or lid.endswith("-L"):
-            state = get_light_state(lid, frame_count)
-            col = base_green if state=="green" else base_yellow if state=="yellow" else base_red
-            arrow_y = ctr[1] - panel_height//2 - 10
-            if lid.endswith("-F"):
-                cv2.arrowedLine(frame, (ctr[0], arrow_y),
-                                (ctr[0], arrow_y-20), col, 2, tipLength=0.3)
-            else:
-                cv2.arrowedLine(frame, (ctr[0]-10, arrow_y),
-                                (ctr[0]-30, arrow_y), col, 2, tipLength=0.3)
-
-    # dynamic homography overlays & CSV logging
-    if Hdyn is not None:
-        for key, H in intersection_homographies.items():
-            Htot = Hdyn.dot(H)
-            poly = transform_points(world_intersections[key], Htot)
-
-            # write polygon coords to CSV
-            coords = poly.flatten().tolist()  # [x1,y1,...,x4,y4]
-            csv_writer.writerow([frame_count, key] + coords)
-
-            # draw on frame
-            col = intersection_colors[key]
-            cv2.polylines(frame, [poly], True, col, 1)
-            cv2.putText(frame, key, (poly[0][0], poly[0][1]-10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, col, 1)
-
-            # crossing line color logic
-            if len(poly) >= 2:
-                p1, p2 = poly[0], poly[1]
-                v = p2 - p1
-                n = np.linalg.norm(v)
-                if n > 1e-5:
-                    d = v / n
-                    perp = np.array([-d[1], d[0]])
-                    if key in ("ID-2","ID-3","ID-4"):
-                        perp = -perp
-                    pn = np.linalg.norm(perp)
-                    if pn > 1e-5:
-                        perp /= pn
-                        c1 = (p1 + crossing_offset * perp).astype(int)
-                        c2 = (p2 + crossing_offset * perp).astype(int)
-                        if key in ("ID-1","ID-3"):
-                            sF = get_light_state(f"{key}-F", frame_count)
-                            sL = get_light_state(f"{key}-L", frame_count)
-                            linecol = base_red if (sF=="red" and sL=="red") else base_green
-                        else:
-                            st = get_light_state(key, frame_count)
-                            linecol = base_green if st in ("green","yellow") else base_red
-                        cv2.line(frame, tuple(c1), tuple(c2), linecol, 1)
-
-    # masks
-    if Hdyn is not None and mask_polygons:
-        for m in mask_polygons:
-            tm = transform_points(m, Hdyn)
-            cv2.fillPoly(frame, [tm], (0,0,0))
-
-    # overlay frame count
-    cv2.putText(frame, f"Frame: {frame_count}", (20,60),
-                cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
-
-    # resize to fill screen and show
-    frame_resized = cv2.resize(frame, (screen_w, screen_h),
-                               interpolation=cv2.INTER_LINEAR)
-    cv2.imshow("Dynamic Intersection Overlays", frame_resized)
-    out.write(frame)
-
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-# cleanup
-cap.release()
-out.release()
-cv2.destroyAllWindows()
-csv_file.close()
+# the loop stops early on 'q'; the stack is closed with its metadata on every path,
+# covering the frames written so far
+try:
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame_count += 1
+
+        Hdyn = engine.estimate(frame)
+        stack.write(frame_count, Hdyn)
+
+        # static traffic lights
+        for lid in traffic_lights_positions:
+            panels.blit(frame, (lid, get_panel_colors_by_schedule(lid, frame_count),
+                                get_light_state(lid, frame_count)))
+
+        # dynamic homography overlays & CSV logging
+        if Hdyn is not None and ref_ids:
+            # via float32, like the old float32 transform, so polygons.csv is unchanged
+            frame_polys = cv2.perspectiveTransform(ref_pts, Hdyn).reshape(-1,4,2) \
+                             .astype(np.float32).astype(np.int32)
+            for key, poly in zip(ref_ids, frame_polys):
+
+                # write polygon coords to CSV
+                coords = poly.flatten().tolist()  # [x1,y1,...,x4,y4]
+                csv_writer.writerow([frame_count, key] + coords)
+
+                # draw on frame
+                col = intersection_colors[key]
+                cv2.polylines(frame, [poly], True, col, 1)
+                cv2.putText(frame, key, (poly[0][0], poly[0][1]-10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, col, 1)
+
+                # crossing line color logic
+                if len(poly) >= 2:
+                    p1, p2 = poly[0], poly[1]
+                    v = p2 - p1
+                    n = np.linalg.norm(v)
+                    if n > 1e-5:
+                        d = v / n
+                        perp = np.array([-d[1], d[0]])
+                        if key in ("ID-2","ID-3","ID-4"):
+                            perp = -perp
+                        pn = np.linalg.norm(perp)
+                        if pn > 1e-5:
+                            perp /= pn
+                            c1 = (p1 + crossing_offset * perp).astype(int)
+                            c2 = (p2 + crossing_offset * perp).astype(int)
+                            if key in ("ID-1","ID-3"):
+                                sF = get_light_state(f"{key}-F", frame_count)
+                                sL = get_light_state(f"{key}-L", frame_count)
+                                linecol = base_red if (sF=="red" and sL=="red") else base_green
+                            else:
+                                st = get_light_state(key, frame_count)
+                                linecol = base_green if st in ("green","yellow") else base_red
+                            cv2.line(frame, tuple(c1), tuple(c2), linecol, 1)
+
+        # masks
+        if Hdyn is not None and mask_polygons:
+            for m in mask_polygons:
+                tm = transform_points(m, Hdyn)
+                cv2.fillPoly(frame, [tm], (0,0,0))
+
+        # overlay frame count
+        cv2.putText(frame, f"Frame: {frame_count}", (20,60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
+
+        # write every frame; the screen (resized to fill it) only at the preview rate
+        out.write(frame)
+        if preview.show(frame) == ord('q'):
+            break
+finally:
+    # cleanup
+    cap.release()
+    out.release()
+    cv2.destroyAllWindows()
+    csv_file.close()
+    stack.close()
 
 print("Processed video saved to output_video.mp4")
@@ -0,0 +1,121 @@
+"""
+benchmark_crops.py
+Full-frame detection against ROI-cropped detection (roi_crops.py): pixels
+the detector gets, throughput, and how far the car counts and light
+states move.
+
+    python benchmark_crops.py VIDEO [--model best.pt] [--frames 240]
+    python benchmark_crops.py VIDEO --polygons world_intersections.csv --scale 1 --imgsz 1280
+
+The ROIs are the static polygons of --polygons (id,x1,y1,…,x4,y4 rows, as
+world_intersections.csv) and the light panels are last.py's.  Both runs
+use detection.detect() with the same batch size and conf; the full-frame
+run gets imgsz, the cropped run mosaics `imgsz` wide.  Counts per ROI use
+roi_index.RoiLabelMap and light states the panel rule of last.py, and the
+report gives, per ROI, the share of frames whose count differs and the
+mean absolute difference, then the share of frames with any light state
+differing.
+"""
+
+import argparse
+import csv
+import time
+
+import numpy as np
+from ultralytics import YOLO
+
+from benchmark_detection import FrameList, read_frames
+from detection import detect, to_records
+from roi_crops import CropPlanner, CroppedModel
+from roi_index import RoiLabelMap
+
+PANELS = [("ID-1", 15, 83, 40, 130), ("ID-2", 105, 83, 40, 130),
+          ("ID-3", 180, 83, 40, 130), ("ID-4", 270, 83, 40, 130)]
+PRIORITY = {"red": 3, "yellow": 2, "green": 1}
+
+
+def read_polygons(path):
+    with open(path, newline="") as f:
+        return [(r["id"], np.array([[float(r[f"x{i}"]), float(r[f"y{i}"])] for i in range(1, 5)], np.int32))
+                for r in csv.DictReader(f)]
+
+
+def light_states(dets):
+    """Panel name → colour, by last.py's priority rule."""
+    states = {name: "unknown" for name, *_ in PANELS}
+    lights = dets[(dets["cls"] >= 1) & (dets["cls"] <= 3)]
+    for cls_id, cx, cy in zip(*(lights[k].tolist() for k in ("cls", "cx", "cy"))):
+        colour = {1: "green", 2: "red", 3: "yellow"}[cls_id]
+        for name, px, py, pw, ph in PANELS:
+            if px <= cx <= px + pw and py <= cy <= py + ph:
+                if PRIORITY[colour] > PRIORITY.get(states[name], 0):
+                    states[name] = colour
+                break
+    return states
+
+
+def run(model, frames, roi_map, batch_size, **predict_kw):
+    """(seconds, [counts per frame], [light states per frame])."""
+    list(detect(model, FrameList(frames[:batch_size]), batch_size, **predict_kw))   # warm-up
+    counts, states = [], []
+    t0 = time.perf_counter()
+    for _, res in detect(model, FrameList(frames), batch_size, **predict_kw):
+        dets = to_records(res.boxes)
+        cars = dets[dets["cls"] == 0]
+        counts.append(roi_map.count(np.stack([cars["cx"], cars["cy"]], axis=1)))
+        states.append(light_states(dets))
+    return time.perf_counter() - t0, counts, states
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    ap.add_argument("video")
+    ap.add_argument("--model", default="best.pt")
+    ap.add_argument("--polygons", default="world_intersections.csv")
+    ap.add_argument("--frames", type=int, default=240)
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--conf", type=float, default=0.2)
+    ap.add_argument("--imgsz", type=int, default=640)
+    ap.add_argument("--scale", type=float, default=None, help="crop resize factor; default imgsz / max(w, h)")
+    ap.add_argument("--margin", type=int, default=96)
+    ap.add_argument("--device", default=None, help="e.g. cpu, 0; default lets ultralytics choose")
+    args = ap.parse_args()
+
+    frames = read_frames(args.video, args.frames)
+    if not frames:
+        ap.error(f"no frames read from {args.video}")
+    h, w = frames[0].shape[:2]
+    polys = read_polygons(args.polygons)
+    roi_map = RoiLabelMap((h, w))
+    roi_map.update(polys)
+    planner = CropPlanner((w, h), [p[1:] for p in PANELS], margin=args.margin, scale=args.scale, tile=args.imgsz)
+    planner.update(polys)
+
+    model = YOLO(args.model)
+    predict_kw = {"conf": args.conf, "imgsz": args.imgsz, "verbose": False}
+    if args.device is not None:
+        predict_kw["device"] = args.device
+
+    full_px = args.imgsz * -(-args.imgsz * min(h, w) // max(h, w) // 32) * 32    # letterboxed frame
+    print(f"{len(frames)} frames {w}x{h}, model {args.model}, imgsz {args.imgsz}, {len(polys)} ROIs")
+    print(f"crops: {sum(map(len, planner.canvases))} tiles in {len(planner.canvases)} mosaic(s) "
+          f"{planner.heights}, {planner.crop_pixels / (w * h):.1%} of the frame, "
+          f"{planner.model_pixels / full_px:.1%} of the full-frame detector input")
+
+    secs_full, counts_full, states_full = run(model, frames, roi_map, args.batch_size, **predict_kw)
+    secs_crop, counts_crop, states_crop = run(CroppedModel(model, planner), frames, roi_map,
+                                              args.batch_size, **predict_kw)
+    print(f"{'run':<8}{'s':>8}{'fps':>8}")
+    for name, secs in (("full", secs_full), ("cropped", secs_crop)):
+        print(f"{name:<8}{secs:>8.2f}{len(frames) / secs:>8.1f}")
+
+    print(f"{'ROI':<8}{'frames off':>12}{'mean |d|':>10}")
+    for pid, _ in polys:
+        d = np.array([abs(a[pid] - b[pid]) for a, b in zip(counts_full, counts_crop)])
+        print(f"{pid:<8}{(d > 0).mean():>11.1%}{d.mean():>10.3f}")
+    off = np.mean([a != b for a, b in zip(states_full, states_crop)])
+    print(f"light states differ on {off:.1%} of frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+benchmark_crossings.py
+Per-frame crossing detection: the per-track, per-line loop of
+run_traffic_management against crossing.CrossingLines.
+
+    python benchmark_crossings.py                      # 200 tracks, 600 frames
+    python benchmark_crossings.py --tracks 200 400 800 --frames 1200
+
+Tracks are synthetic SORT rows: cars driving across four polygons of
+world_intersections.csv size, with track ids that end and get replaced
+(a new, higher id) as SORT does.  The polygons drift by a pixel every
+--drift frames, as the homography tracks move them, and each light's
+counting window opens and closes in turn.  "loop" is the old code,
+crossing_edges rebuilt every frame and segment_intersects() per pair;
+both runs must give the same crossings per line, which is checked.
+The engine frees the state of ended tracks (track_state.py) every frame;
+"loop keys" is the size its last_positions dict reached, against the
+engine's peak rows, final capacity and bytes.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from crossing import CrossingLines
+
+POLYS = [("ID-1", [[620, 520], [980, 500], [1000, 700], [600, 720]]),
+         ("ID-2", [[1100, 300], [1400, 320], [1380, 520], [1080, 500]]),
+         ("ID-3", [[300, 250], [560, 240], [580, 440], [280, 460]]),
+         ("ID-4", [[900, 800], [1300, 780], [1320, 1000], [880, 1020]])]
+
+
+def ccw(A, B, C):
+    return (C[1]-A[1])*(B[0]-A[0]) > (B[1]-A[1])*(C[0]-A[0])
+
+
+def segment_intersects(A, B, C, D):
+    return ccw(A,C,D) != ccw(B,C,D) and ccw(A,B,C) != ccw(A,B,D)
+
+
+class LoopCrossings:
+    """The crossing code of run_traffic_management, as it was."""
+
+    def __init__(self):
+        self.seen_ids = {pid: set() for pid, _ in POLYS}
+        self.last_positions = {}
+
+    def frame(self, polys, tracked, counting_active):
+        crossing_edges = {}
+        for pid, poly in polys:
+            if len(poly) >= 2:
+                p1, p2 = poly[0], poly[1]
+                vec = p2 - p1
+                norm = np.linalg.norm(vec)
+                if norm < 1e-5:
+                    continue
+                shrink_ratio = {"ID-1": 0.05, "ID-2": 0.17, "ID-3": 0.2, "ID-4": 0.2}[pid]
+                p1 = p1 + vec * shrink_ratio
+                p2 = p2 - vec * shrink_ratio
+                perp = np.array([-vec[1], vec[0]]) / norm
+                if pid in ("ID-2", "ID-3", "ID-4"):
+                    perp = -perp
+                crossing_edges[pid] = ((p1 + perp * 5).astype(int), (p2 + perp * 5).astype(int))
+
+        out = []
+        for x1, y1, x2, y2, obj_id in tracked:
+            obj_id = int(obj_id)
+            center = np.array([(x1 + x2) / 2, (y1 + y2) / 2])
+            for pid, (c1, c2) in crossing_edges.items():
+                if not counting_active[pid] or obj_id in self.seen_ids[pid]:
+                    continue
+                key = (pid, obj_id)
+                prev_center = self.last_positions.get(key)
+                if prev_center is not None and segment_intersects(prev_center, center, c1, c2):
+                    out.append((pid, obj_id))
+                    self.seen_ids[pid].add(obj_id)
+                self.last_positions[key] = center
+        return out
+
+
+def synthetic_frames(n_tracks, n_frames, drift, life=150, seed=0):
+    """(polys, tracked, counting_active) per frame."""
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform((200, 150), (1700, 1050), (n_tracks, 2))
+    vel = rng.normal(0, 4, (n_tracks, 2))
+    ids = np.arange(1, n_tracks + 1, dtype=np.float64)
+    age = rng.integers(0, life, n_tracks)
+    next_id = n_tracks + 1
+    base = [(pid, np.array(p, np.float64)) for pid, p in POLYS]
+    frames = []
+    for f in range(n_frames):
+        shift = f // drift if drift else 0
+        polys = [(pid, (p + shift).astype(np.int32)) for pid, p in base]
+        ended = age >= life
+        k = int(ended.sum())
+        if k:
+            pos[ended] = rng.uniform((200, 150), (1700, 1050), (k, 2))
+            vel[ended] = rng.normal(0, 4, (k, 2))
+            ids[ended] = np.arange(next_id, next_id + k)
+            age[ended] = 0
+            next_id += k
+        pos += vel + rng.normal(0, 0.5, pos.shape)
+        age += 1
+        wh = np.array([60.0, 40.0])
+        tracked = np.hstack([pos - wh / 2, pos + wh / 2, ids[:, None]])
+        active = {pid: (f // 100 + j) % 4 < 2 for j, (pid, _) in enumerate(POLYS)}
+        frames.append((polys, tracked, active))
+    return frames
+
+
+def run(frames, step):
+    totals = {pid: 0 for pid, _ in POLYS}
+    t0 = time.perf_counter()
+    for polys, tracked, active in frames:
+        for pid, _ in step(polys, tracked, active):
+            totals[pid] += 1
+    return totals, time.perf_counter() - t0
+
+
+def engine_step():
+    lines = CrossingLines()
+
+    def step(polys, tracked, active):
+        lines.update(polys)
+        lines.tracks.evict(tracked[:, 4].astype(int))     # SORT's live tracks, here the drawn ones
+        return lines.cross(tracked, active)
+    return step, lines
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    ap.add_argument("--tracks", type=int, nargs="+", default=[200])
+    ap.add_argument("--frames", type=int, default=600)
+    ap.add_argument("--drift", type=int, default=30, help="frames per pixel of polygon drift (0: static)")
+    args = ap.parse_args()
+
+    print(f"{'tracks':>7}{'crossings':>11}{'loop µs':>10}{'engine µs':>11}{'speedup':>9}{'rebuilds':>10}"
+          f"{'loop keys':>11}{'peak rows':>11}{'capacity':>10}{'KB':>7}")
+    for n in args.tracks:
+        frames = synthetic_frames(n, args.frames, args.drift)
+        loop = LoopCrossings()
+        loop_totals, t_loop = run(frames, loop.frame)
+        step, lines = engine_step()
+        totals, t_engine = run(frames, step)
+        assert totals == loop_totals, f"crossings differ: loop {loop_totals}, engine {totals}"
+        per = 1e6 / len(frames)
+        print(f"{n:>7}{sum(totals.values()):>11}{t_loop * per:>10.0f}{t_engine * per:>11.0f}"
+              f"{t_loop / max(t_engine, 1e-9):>8.1f}x{lines.rebuilt:>10}{len(loop.last_positions):>11}"
+              f"{lines.tracks.peak:>11}{lines.tracks.capacity:>10}{lines.tracks.nbytes() / 1024:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
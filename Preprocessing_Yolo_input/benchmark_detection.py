@@ -0,0 +1,86 @@
+"""
+benchmark_detection.py
+YOLO throughput (frames/sec) against the inference batch size.
+
+    python benchmark_detection.py VIDEO [--model best.pt] [--frames 240]
+    python benchmark_detection.py VIDEO --batch-sizes 1 4 8 16 32 --device cpu
+
+Every batch size runs detection.detect() over the same frames, the way
+last.py and run_traffic_management do (conf 0.2).  Batch size 1 is the old
+one-call-per-frame loop.  Frames are decoded up front so only inference is
+timed, and one batch is run first as a warm-up.  The "boxes" column is the
+total number of detections, which should not depend on the batch size.
+"""
+
+import argparse
+import time
+
+import cv2
+from ultralytics import YOLO
+
+from detection import detect
+
+
+class FrameList:
+    """Stands in for cv2.VideoCapture over frames already in memory."""
+
+    def __init__(self, frames):
+        self.frames = iter(frames)
+
+    def read(self):
+        frame = next(self.frames, None)
+        return frame is not None, frame
+
+
+def read_frames(video, n):
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < n:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run(model, frames, batch_size, **predict_kw):
+    """(seconds, total boxes) for detecting every frame in batches of `batch_size`."""
+    list(detect(model, FrameList(frames[:batch_size]), batch_size, **predict_kw))   # warm-up
+    t0 = time.perf_counter()
+    boxes = sum(len(res.boxes) for _, res in detect(model, FrameList(frames), batch_size, **predict_kw))
+    return time.perf_counter() - t0, boxes
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    ap.add_argument("video")
+    ap.add_argument("--model", default="best.pt")
+    ap.add_argument("--frames", type=int, default=240)
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--conf", type=float, default=0.2)
+    ap.add_argument("--imgsz", type=int, default=640)
+    ap.add_argument("--device", default=None, help="e.g. cpu, 0; default lets ultralytics choose")
+    args = ap.parse_args()
+
+    frames = read_frames(args.video, args.frames)
+    if not frames:
+        ap.error(f"no frames read from {args.video}")
+    model = YOLO(args.model)
+    predict_kw = {"conf": args.conf, "imgsz": args.imgsz, "verbose": False}
+    if args.device is not None:
+        predict_kw["device"] = args.device
+
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} frames {w}x{h}, model {args.model}, imgsz {args.imgsz}")
+    print(f"{'batch':>6}{'s':>10}{'fps':>10}{'speedup':>10}{'boxes':>8}")
+    base = None
+    for bs in args.batch_sizes:
+        secs, boxes = run(model, frames, bs, **predict_kw)
+        fps = len(frames) / secs
+        base = base or fps
+        print(f"{bs:>6}{secs:>10.2f}{fps:>10.1f}{fps / base:>9.2f}x{boxes:>8}")
+
+
+if __name__ == "__main__":
+    main()
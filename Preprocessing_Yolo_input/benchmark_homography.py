@@ -0,0 +1,173 @@
+"""
+benchmark_homography.py
+Frames/sec of the per-frame dynamic homography step.
+
+    python benchmark_homography.py VIDEO [--ref 0] [--frames 200]
+    python benchmark_homography.py VIDEO --methods engine --scales 0.5 0.25 [--refine]
+    python benchmark_homography.py VIDEO --methods engine --exclude exclusion_masks.csv
+
+"legacy" is the old compute_dynamic_homography(ref, cur) that rebuilt SIFT
+and the reference features for every frame, "engine" is HomographyEngine
+with the reference features cached, "track" is TrackingHomographyEngine
+(Lucas-Kanade tracking, SIFT re-anchor every 30 frames), "adaptive" is
+AdaptiveHomographyEngine (ORB, escalating to SIFT on poor fits) and
+"keyframe" runs the engine on keyframes only (keyframes.py) and
+interpolates the rest.
+--scales adds "engine@<scale>" runs (SIFT on a downscaled gray image, H
+conjugated back to full resolution) and --refine their full-resolution
+refit variants, which gives the accuracy-versus-speed report for the
+analysis scale.  --exclude adds "engine+mask" (exclusion masks left out of
+detection, see homography.py) and reports the keypoints detected and the
+time spent per frame with and without the masks.  Frames are decoded up front so only the homography work is
+timed.  The corner columns are the mean / largest distance (px) between the
+frame corners warped by the first method's H and by each method's H.
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from homography import AdaptiveHomographyEngine, HomographyEngine, TrackingHomographyEngine
+from keyframes import KeyframeSelector, keyframe_homographies
+from dynamic_export import load_exclusion_masks
+
+
+def legacy_compute_dynamic_homography(ref, cur):
+    g1, g2 = cv2.cvtColor(ref, cv2.COLOR_BGR2GRAY), cv2.cvtColor(cur, cv2.COLOR_BGR2GRAY)
+    sift = cv2.SIFT_create()
+    k1, d1 = sift.detectAndCompute(g1, None); k2, d2 = sift.detectAndCompute(g2, None)
+    if d1 is None or d2 is None: return None
+    bf = cv2.BFMatcher(cv2.NORM_L2); m = bf.knnMatch(d1, d2, k=2)
+    good = [x for x, y in m if x.distance < 0.75 * y.distance]
+    if len(good) < 10: return None
+    src = np.float32([k1[x.queryIdx].pt for x in good]).reshape(-1, 1, 2)
+    dst = np.float32([k2[x.trainIdx].pt for x in good]).reshape(-1, 1, 2)
+    H, _ = cv2.findHomography(src, dst, cv2.RANSAC, 5.0); return H
+
+
+def per_frame(make_estimate):
+    def run(ref, frames):
+        estimate = make_estimate(ref)
+        return [estimate(frm) for frm in frames]
+    return run
+
+
+def keyframed(ref, frames):
+    pairs = keyframe_homographies(enumerate(frames), HomographyEngine(ref), KeyframeSelector())
+    return [H for _, H in pairs]
+
+
+# name → callable(ref_frame, frames) returning one H per frame
+METHODS = {
+    "legacy":   per_frame(lambda ref: (lambda frm: legacy_compute_dynamic_homography(ref, frm))),
+    "engine":   per_frame(lambda ref: HomographyEngine(ref).estimate),
+    "track":    per_frame(lambda ref: TrackingHomographyEngine(ref).estimate),
+    "adaptive": per_frame(lambda ref: AdaptiveHomographyEngine(ref).estimate),
+    "keyframe": keyframed,
+}
+
+
+def scaled(scale, refine):
+    return per_frame(lambda ref: HomographyEngine(ref, scale=scale, refine=refine).estimate)
+
+
+def masked(exclude):
+    return per_frame(lambda ref: HomographyEngine(ref, exclude=exclude).estimate)
+
+
+def keypoint_report(ref, frames, exclude):
+    """Mean keypoints and ms per frame of the engine without and with the exclusion masks."""
+    rows = []
+    for name, kw in (("engine", {}), ("engine+mask", {"exclude": exclude})):
+        engine = HomographyEngine(ref, **kw)
+        kps, t0 = [], time.perf_counter()
+        for frm in frames:
+            engine.estimate(frm)
+            kps.append(engine.info["keypoints"])
+        ms = 1000 * (time.perf_counter() - t0) / max(len(frames), 1)
+        rows.append((name, len(engine.features.ref_kp), np.mean(kps), ms))
+        print(f"{name:<18}{rows[-1][1]:>8}{rows[-1][2]:>12.0f}{ms:>10.2f}")
+    print(f"masks save {rows[0][2] - rows[1][2]:.0f} keypoints and {rows[0][3] - rows[1][3]:.2f} ms per frame")
+
+
+def read_frames(video_path, ref_idx, n_frames):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open {video_path}")
+    cap.set(cv2.CAP_PROP_POS_FRAMES, ref_idx)
+    ok, ref = cap.read()
+    if not ok:
+        raise RuntimeError(f"Cannot read reference frame {ref_idx}")
+    frames = []
+    while len(frames) < n_frames:
+        ok, frm = cap.read()
+        if not ok:
+            break
+        frames.append(frm)
+    cap.release()
+    return ref, frames
+
+
+def run_method(method, ref, frames):
+    t0 = time.perf_counter()
+    Hs = method(ref, frames)         # setup cost is part of the run
+    return Hs, time.perf_counter() - t0
+
+
+def corner_error(H_a, H_b, w, h):
+    if H_a is None or H_b is None:
+        return float("nan")
+    corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+    a = cv2.perspectiveTransform(corners, H_a)
+    b = cv2.perspectiveTransform(corners, H_b)
+    return float(np.linalg.norm(a - b, axis=2).max())
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    ap.add_argument("video")
+    ap.add_argument("--ref", type=int, default=0, help="reference frame index")
+    ap.add_argument("--frames", type=int, default=200, help="frames to time")
+    ap.add_argument("--methods", nargs="+", default=list(METHODS), choices=list(METHODS))
+    ap.add_argument("--scales", nargs="+", type=float, default=[],
+                    help="extra engine runs at these analysis scales")
+    ap.add_argument("--refine", action="store_true",
+                    help="also run each --scales entry with full-resolution refinement")
+    ap.add_argument("--exclude", help="exclusion mask CSV: adds engine+mask and a keypoint report")
+    args = ap.parse_args()
+
+    methods = [(name, METHODS[name]) for name in args.methods]
+    for sc in args.scales:
+        methods.append((f"engine@{sc:g}", scaled(sc, False)))
+        if args.refine:
+            methods.append((f"engine@{sc:g}+ref", scaled(sc, True)))
+    exclude = load_exclusion_masks(args.exclude) if args.exclude else []
+    if exclude:
+        methods.append(("engine+mask", masked(exclude)))
+
+    ref, frames = read_frames(args.video, args.ref, args.frames)
+    h, w = ref.shape[:2]
+    print(f"{len(frames)} frames @ {w}x{h}, reference frame {args.ref}")
+
+    baseline = None
+    print(f"{'method':<18}{'fps':>9}{'speedup':>9}{'valid':>7}{'mean px':>10}{'max px':>10}")
+    for name, method in methods:
+        Hs, dt = run_method(method, ref, frames)
+        fps = len(frames) / dt if dt > 0 else float("inf")
+        if baseline is None:
+            baseline = (Hs, fps)
+        errs = [corner_error(a, b, w, h) for a, b in zip(baseline[0], Hs)]
+        errs = [e for e in errs if not np.isnan(e)] or [float("nan")]
+        valid = sum(H is not None for H in Hs)
+        print(f"{name:<18}{fps:>9.2f}{fps / baseline[1]:>8.2f}x{valid:>7}"
+              f"{np.mean(errs):>10.3f}{max(errs):>10.3f}")
+
+    if exclude:
+        print(f"\n{'':<18}{'ref kp':>8}{'kp / frame':>12}{'ms/frame':>10}")
+        keypoint_report(ref, frames, exclude)
+
+
+if __name__ == "__main__":
+    main()
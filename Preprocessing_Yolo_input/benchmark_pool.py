@@ -0,0 +1,89 @@
+"""
+benchmark_pool.py
+Wall time of the chunk worker pool (chunk_pool.py) against the number of
+workers, over the notebook's CHUNK_RANGES of one video.
+
+    python benchmark_pool.py VIDEO [--model best.pt] [--workers 1 2 4 8]
+    python benchmark_pool.py VIDEO --frames-per-chunk 300 --batch-size 8 --device cpu
+
+Each chunk is a virtual chunk (chunks.py), its frame range read in place
+from VIDEO, run through detection.detect() (conf 0.2) without the
+counting / drawing of run_traffic_management, so the table shows how
+detection scales over processes.  Threads per worker default to the cores divided among the
+workers.  --frames-per-chunk shortens every range for a quick run.
+Model loading is timed separately and not part of the wall time.
+"""
+
+import argparse
+import os
+import time
+
+from ultralytics import YOLO
+
+from chunk_pool import ChunkPool
+from chunks import virtual_chunks
+from detection import detect
+
+CHUNK_RANGES = [
+    (0, 2999), (3000, 5999), (6000, 8999), (9000, 11999),
+    (12000, 14999), (15000, 18049), (18050, 20999),
+    (21000, 24099),
+]
+
+
+class ChunkJob:
+    """run_chunk / load_model pair for the pool (picklable for any start method)."""
+
+    def __init__(self, model, batch_size, frames_per_chunk, predict_kw):
+        self.model = model
+        self.batch_size, self.frames_per_chunk = batch_size, frames_per_chunk
+        self.predict_kw = predict_kw
+
+    def load(self):
+        return YOLO(self.model)
+
+    def __call__(self, chunk, model):
+        cap = chunk.open()
+        if self.frames_per_chunk:
+            cap.left = min(cap.left, self.frames_per_chunk)
+        for _ in detect(model, cap, self.batch_size, **self.predict_kw):
+            pass
+        cap.release()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    ap.add_argument("video")
+    ap.add_argument("--model", default="best.pt")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--threads", type=int, default=None, help="threads per worker")
+    ap.add_argument("--frames-per-chunk", type=int, default=None)
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--conf", type=float, default=0.2)
+    ap.add_argument("--device", default=None, help="e.g. cpu, 0; default lets ultralytics choose")
+    args = ap.parse_args()
+
+    chunks = virtual_chunks(args.video, CHUNK_RANGES)
+    if not chunks:
+        ap.error(f"{args.video} has no frames in CHUNK_RANGES")
+    predict_kw = {"conf": args.conf, "verbose": False}
+    if args.device is not None:
+        predict_kw["device"] = args.device
+    job = ChunkJob(args.model, args.batch_size, args.frames_per_chunk, predict_kw)
+
+    print(f"{len(chunks)} chunks of {args.video}, {os.cpu_count()} cores, model {args.model}")
+    print(f"{'workers':>8}{'threads':>9}{'wall s':>9}{'speedup':>9}{'effic.':>8}{'load s':>8}{'failed':>8}")
+    base = None
+    for n in args.workers:
+        pool = ChunkPool(job, job.load, workers=n, threads=args.threads, on_result=lambda r: None)
+        t0 = time.perf_counter()
+        results = pool.run(chunks)
+        wall = time.perf_counter() - t0 - max(pool.load_secs, default=0)
+        base = base or wall
+        failed = sum(not r["ok"] for r in results)
+        print(f"{n:>8}{pool.threads:>9}{wall:>9.1f}{base / wall:>8.2f}x{base / wall / n:>8.0%}"
+              f"{max(pool.load_secs, default=0):>8.1f}{failed:>8}")
+
+
+if __name__ == "__main__":
+    main()
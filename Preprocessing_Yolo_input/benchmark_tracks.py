@@ -0,0 +1,83 @@
+"""
+benchmark_tracks.py
+Load time of polygons.csv versus its binary track (polygon_tracks.py).
+
+    python benchmark_tracks.py polygons.csv
+    python benchmark_tracks.py --synthetic 24100      # fake 4-ID CSV of N frames
+
+"csv" is the DictReader → {frame: [(id, array)]} loader used by last.py and
+run_traffic_management, "tracks" opens the memory-mapped track.  "lookup"
+then fetches every frame's polygons the way the counting loops do.  The CSV
+is converted once before timing, as open_tracks() does on a first run.
+"""
+
+import argparse
+import csv
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from polygon_tracks import PolygonTracks, csv_to_tracks
+
+
+def load_csv(csv_path):
+    poly_by_frame = {}
+    with open(csv_path, newline="") as f:
+        for row in csv.DictReader(f):
+            fid, pid = int(row["frame"]), row["id"]
+            pts = np.array([[float(row[f"x{i}"]), float(row[f"y{i}"])]
+                            for i in range(1, 5)], np.float32)
+            poly_by_frame.setdefault(fid, []).append((pid, pts))
+    return poly_by_frame
+
+
+def write_synthetic(csv_path, n_frames, ids=("ID-1", "ID-2", "ID-3", "ID-4")):
+    rng = np.random.default_rng(0)
+    base = rng.uniform(300, 1500, (len(ids), 8))
+    with open(csv_path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["frame", "id", "x1", "y1", "x2", "y2", "x3", "y3", "x4", "y4"])
+        for fidx in range(1, n_frames + 1):
+            for j, pid in enumerate(ids):
+                w.writerow([fidx, pid] + [round(v, 2) for v in base[j] + 0.01 * fidx])
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    ap.add_argument("csv", nargs="?")
+    ap.add_argument("--synthetic", type=int, default=0, help="generate a CSV with this many frames")
+    args = ap.parse_args()
+    if not args.csv and not args.synthetic:
+        ap.error("give a CSV or --synthetic N")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(args.csv) if args.csv else Path(tmp) / "polygons.csv"
+        if args.synthetic:
+            write_synthetic(csv_path, args.synthetic)
+        tracks_dir, t_convert = timed(csv_to_tracks, csv_path, Path(tmp) / "polygons.tracks")
+
+        poly_by_frame, t_csv = timed(load_csv, csv_path)
+        tracks, t_tracks = timed(PolygonTracks, tracks_dir)
+        frames = range(tracks.first_frame, tracks.last_frame + 1)
+        _, t_csv_look = timed(lambda: [poly_by_frame.get(i, []) for i in frames])
+        _, t_trk_look = timed(lambda: [tracks.polys(i) for i in frames])
+
+        print(f"{len(tracks)} frames × {len(tracks.ids)} ids, "
+              f"{csv_path.stat().st_size / 1e6:.1f} MB CSV, one-off conversion {t_convert:.3f}s")
+        print(f"{'':<8}{'load s':>10}{'lookup s':>10}")
+        print(f"{'csv':<8}{t_csv:>10.4f}{t_csv_look:>10.4f}")
+        print(f"{'tracks':<8}{t_tracks:>10.4f}{t_trk_look:>10.4f}")
+        print(f"load speedup {t_csv / max(t_tracks, 1e-9):.0f}x")
+        del tracks      # release the memory maps before the directory is removed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+chunk_pool.py
+Pool of chunk worker processes, each with its own warm model, in place of
+the notebook's single gpu_worker process.
+
+    pool = ChunkPool(run_traffic_management, load_model, workers=4, threads=4, retries=1)
+    results = pool.run(chunks)          # one dict per chunk, in finishing order
+
+Every worker caps its CPU threads (torch, OpenCV, OMP/MKL) at `threads`
+(default: the cores divided among the workers), calls load_model() once
+and then runs run_chunk(chunk, model) for the chunks it takes from a
+shared queue.  A worker that cannot load the model stops the pool.
+Workers are started with multiprocessing's default method, so run_chunk
+and load_model may be notebook functions (fork).
+
+The result channel is a queue of messages back to the parent:
+"ready" (model loaded, seconds), "start" (worker took a chunk) and "done"
+(status, seconds, traceback on failure).  A chunk that raised, or whose
+worker died (the parent sees the exit code while it waits), is queued
+again up to `retries` times, and a dead worker is replaced.  Each finished
+chunk gives
+
+    {"chunk": ..., "ok": True, "worker": 2, "attempt": 1, "secs": 41.3, "error": None}
+
+and `on_result(result)` is called for it as it arrives (default: one
+printed line).  run() returns once every chunk succeeded or ran out of
+retries.
+
+    python benchmark_pool.py VIDEO --workers 1 2 4 8    # wall time against workers
+"""
+
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+
+THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def cap_threads(n):
+    """Limit this process's torch / OpenCV / BLAS threads to `n`."""
+    for var in THREAD_ENV:
+        os.environ[var] = str(n)
+    try:
+        import cv2
+        cv2.setNumThreads(n)
+    except ImportError:
+        pass
+    try:
+        import torch
+        torch.set_num_threads(n)
+    except ImportError:
+        pass
+
+
+def _worker(wid, run_chunk, load_model, threads, tasks, results):
+    cap_threads(threads)
+    t0 = time.perf_counter()
+    model = load_model()
+    results.put(("ready", wid, None, {"secs": time.perf_counter() - t0}))
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        i, chunk, attempt = task
+        results.put(("start", wid, i, {"attempt": attempt}))
+        t0 = time.perf_counter()
+        try:
+            run_chunk(chunk, model)
+            ok, error = True, None
+        except Exception:
+            ok, error = False, traceback.format_exc()
+        results.put(("done", wid, i, {"ok": ok, "attempt": attempt,
+                                          "secs": time.perf_counter() - t0, "error": error}))
+
+
+def print_result(r):
+    status = "ok" if r["ok"] else f"FAILED (attempt {r['attempt']})"
+    print(f"[POOL] chunk {r['chunk']} on worker {r['worker']}: {status} in {r['secs']:.1f}s")
+    if r["error"]:
+        print(r["error"].rstrip())
+
+
+class ChunkPool:
+    def __init__(self, run_chunk, load_model, workers=1, threads=None, retries=1, on_result=print_result):
+        self.run_chunk = run_chunk
+        self.load_model = load_model
+        self.workers = max(1, workers)
+        self.threads = threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.retries = retries
+        self.on_result = on_result
+        self.load_secs = []
+
+    def _spawn(self, wid, tasks, results):
+        p = multiprocessing.Process(target=_worker, name=f"chunk-worker-{wid}",
+                                    args=(wid, self.run_chunk, self.load_model, self.threads, tasks, results))
+        p.start()
+        return p
+
+    def run(self, chunks):
+        """Process every chunk; returns the final result of each."""
+        tasks, results = multiprocessing.Queue(), multiprocessing.Queue()
+        for i, c in enumerate(chunks):
+            tasks.put((i, c, 1))
+        procs = {wid: self._spawn(wid, tasks, results) for wid in range(self.workers)}
+        running = {}                # worker → (chunk index, attempt, start time)
+        ready = set()
+        final = {}                  # chunk index → result
+        next_wid = self.workers
+
+        def finish(i, r):
+            r = {"chunk": chunks[i], **r}
+            if not r["ok"] and r["attempt"] <= self.retries:
+                tasks.put((i, chunks[i], r["attempt"] + 1))
+            else:
+                final[i] = r
+            self.on_result(r)
+
+        while len(final) < len(chunks):
+            try:
+                kind, wid, i, info = results.get(timeout=1.0)
+            except queue.Empty:
+                # a worker that died mid-chunk (crash, OOM kill) never reports
+                for wid, p in list(procs.items()):
+                    if p.exitcode is not None and p.exitcode != 0:
+                        del procs[wid]
+                        if wid not in ready:
+                            for q in procs.values():
+                                q.terminate()
+                            raise RuntimeError(f"chunk worker {wid} exited with code {p.exitcode} "
+                                               f"before its model was loaded")
+                        if wid in running:
+                            i, attempt, t0 = running.pop(wid)
+                            finish(i, {"ok": False, "worker": wid, "attempt": attempt,
+                                       "secs": time.perf_counter() - t0,
+                                       "error": f"worker exited with code {p.exitcode}"})
+                        procs[next_wid] = self._spawn(next_wid, tasks, results)
+                        next_wid += 1
+                continue
+            if kind == "ready":
+                ready.add(wid)
+                self.load_secs.append(info["secs"])
+            elif kind == "start":
+                running[wid] = (i, info["attempt"], time.perf_counter())
+            else:
+                running.pop(wid, None)
+                finish(i, {"worker": wid, **info})
+
+        for _ in procs:
+            tasks.put(None)
+        for p in procs.values():
+            p.join()
+        return list(final.values())
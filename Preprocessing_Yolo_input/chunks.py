@@ -0,0 +1,102 @@
+"""
+chunks.py
+Virtual chunks: frame ranges of the source video, read in place, in place
+of re-encoded clips/chunk_N.mp4 files.
+
+    chunks = virtual_chunks(VIDEO_IN, CHUNK_RANGES)      # [ChunkRange, …], empty ranges dropped
+    cap = chunks[3].open()          # seeks to frame `start`, reads end - start + 1 frames
+    for frame, res in detect(model, cap, ...): ...
+    path = chunks[3].clip(CLIPS_DIR)    # clips/chunk_3.mp4, written on first call only
+
+split_into_chunks() decoded the whole input and re-encoded every range
+with mp4v before any analysis started.  A ChunkRange only holds
+(id, video, start, end); open() returns a capture over the original file
+that stops after the range, so workers decode each frame once, losslessly.
+A playable clip (the dashboard's video_path) is encoded from the range by
+clip() the first time it is asked for, and reused after that.
+"""
+
+import os
+from pathlib import Path
+
+import cv2
+
+
+class RangeCapture:
+    """cv2.VideoCapture over `n` frames from the current position of `cap`."""
+
+    def __init__(self, cap, n):
+        self.cap, self.left = cap, n
+
+    def read(self):
+        if self.left <= 0:
+            return False, None
+        self.left -= 1
+        return self.cap.read()
+
+    def grab(self):
+        if self.left <= 0:
+            return False
+        self.left -= 1
+        return self.cap.grab()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.left)
+        return self.cap.get(prop)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class ChunkRange:
+    def __init__(self, chunk_id, video, start, end):
+        self.id = chunk_id
+        self.video = str(video)
+        self.start, self.end = start, end      # global frame numbers, inclusive
+
+    def __len__(self):
+        return self.end - self.start + 1
+
+    def __repr__(self):
+        return f"chunk_{self.id}[{self.start}-{self.end}]"
+
+    def open(self):
+        """Capture over the chunk's frames of the source video."""
+        cap = cv2.VideoCapture(self.video)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, self.start)
+        return RangeCapture(cap, len(self))
+
+    def clip(self, clips_dir):
+        """Path of clips_dir/chunk_N.mp4, encoding it from the range if it does not exist yet."""
+        path = Path(clips_dir) / f"chunk_{self.id}.mp4"
+        if path.exists() and path.stat().st_size > 0:
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cap = self.open()
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        size = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.part.mp4")
+        writer = cv2.VideoWriter(str(tmp), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            writer.write(frame)
+        writer.release()
+        cap.release()
+        tmp.replace(path)       # a half-written clip never has the final name
+        return path
+
+
+def virtual_chunks(video, ranges):
+    """ChunkRange per (start, end) of `ranges` (ids in order), clipped to the video's frames."""
+    cap = cv2.VideoCapture(str(video))
+    assert cap.isOpened(), f"Cannot open {video}"
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return [ChunkRange(i, video, start, min(end, n_frames - 1))
+            for i, (start, end) in enumerate(ranges) if start < n_frames]
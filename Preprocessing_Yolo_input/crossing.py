@@ -0,0 +1,129 @@
+"""
+crossing.py
+Line-crossing counts for all tracks against all crossing lines in one
+NumPy pass.
+
+    lines = CrossingLines()
+    lines.update(polys)                             # [(pid, (k,2) int32)]; no-op if unchanged
+    for pid, obj_id in lines.cross(tracked, counting_active):
+        crossings[pid] += 1                         # each (pid, track) crosses at most once
+    for pid, (c1, c2) in lines.edges.items(): ...   # for drawing
+
+run_traffic_management rebuilt its crossing_edges dict from the polygons
+on every frame and then called segment_intersects() for every tracked
+object and every line.  Here a polygon's crossing line (its first edge,
+shrunk by SHRINK at both ends and moved OFFSET pixels along the normal,
+the other way for FLIPPED ids) is only rebuilt when the polygons change.
+Per frame, the motion segments (previous centre → current centre) of all
+tracks are tested against all lines at once, with the same ccw() rule and
+float64 arithmetic as the loop, so the crossings are exactly its.
+
+The per-(line, track) state of the loop, last_positions[(pid, obj_id)]
+and seen_ids[pid], is kept in a track_state.TrackStore: one row per live
+track id, one column per polygon id.  A pair whose line is not
+counting_active, or whose track already crossed it, is left alone (its
+previous centre is not updated), as before.  lines.tracks.evict(...)
+frees the rows of tracks SORT has dropped.
+
+    python benchmark_crossings.py --tracks 200 400    # loop against the engine, µs per frame
+"""
+
+import numpy as np
+
+from track_state import TrackStore
+
+SHRINK = {"ID-1": 0.05, "ID-2": 0.17, "ID-3": 0.2, "ID-4": 0.2}     # cut from each end of the edge
+FLIPPED = ("ID-2", "ID-3", "ID-4")
+OFFSET = 5                      # pixels between the polygon edge and its crossing line
+
+
+def crossing_edge(pid, poly):
+    """(c1, c2) int crossing line of polygon `pid`, or None for a degenerate first edge."""
+    if len(poly) < 2:
+        return None
+    p1, p2 = poly[0], poly[1]
+    vec = p2 - p1
+    norm = np.linalg.norm(vec)
+    if norm < 1e-5:
+        return None
+    if pid in SHRINK:
+        p1 = p1 + vec * SHRINK[pid]
+        p2 = p2 - vec * SHRINK[pid]
+    perp = np.array([-vec[1], vec[0]]) / norm
+    if pid in FLIPPED:
+        perp = -perp
+    return (p1 + perp * OFFSET).astype(int), (p2 + perp * OFFSET).astype(int)
+
+
+def _ccw(a, b, c):
+    return (c[..., 1] - a[..., 1]) * (b[..., 0] - a[..., 0]) > (b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0])
+
+
+class CrossingLines:
+    def __init__(self, capacity=256):
+        self.edges = {}                 # pid → (c1, c2), in polygon order
+        self.ids = []
+        self._c1 = self._c2 = np.empty((0, 2))
+        self._cols = np.empty(0, np.intp)
+        self._key = None
+        self.rebuilt = 0                # how often update() actually rebuilt the lines
+
+        self.col = {}                   # pid → column of the track fields
+        self.tracks = TrackStore(capacity)
+        self._n_cols = None
+        self._fields()
+
+    def update(self, polys):
+        """Use the crossing lines of `polys` ([(pid, poly)]) from now on, rebuilding them only if they changed."""
+        key = [(pid, np.asarray(poly).tobytes()) for pid, poly in polys]
+        if key == self._key:
+            return
+        self._key = key
+        self.edges = {}
+        for pid, poly in polys:
+            edge = crossing_edge(pid, poly)
+            if edge is not None:
+                self.edges[pid] = edge
+        self.ids = list(self.edges)
+        for pid in self.ids:
+            if pid not in self.col:
+                self.col[pid] = len(self.col)
+        self._fields()
+        self._c1 = np.array([c1 for c1, _ in self.edges.values()]).reshape(-1, 2)
+        self._c2 = np.array([c2 for _, c2 in self.edges.values()]).reshape(-1, 2)
+        self._cols = np.array([self.col[pid] for pid in self.ids], np.intp)
+        self.rebuilt += 1
+
+    def _fields(self):
+        n = len(self.col)
+        if n == self._n_cols:
+            return
+        self._n_cols = n
+        self.tracks.field("last", (n, 2))              # previous centre per (track, pid)
+        self.tracks.field("has_last", (n,), bool)
+        self.tracks.field("seen", (n,), bool)          # track already crossed pid's line
+
+    def cross(self, tracked, active):
+        """[(pid, track id)] that crossed a line this frame; `tracked` is SORT's (n, 5) x1, y1, x2, y2, id."""
+        tracked = np.asarray(tracked, np.float64).reshape(-1, 5)
+        if not len(tracked) or not self.ids:
+            return []
+        track_ids = tracked[:, 4].astype(int)
+        centres = (tracked[:, :2] + tracked[:, 2:4]) / 2
+        rows = self.tracks.rows(track_ids)[:, None]
+        cols = self._cols[None, :]
+
+        last, has_last, seen = self.tracks["last"], self.tracks["has_last"], self.tracks["seen"]
+        live = np.array([bool(active[pid]) for pid in self.ids])
+        todo = live & ~seen[rows, cols]                         # (tracks, lines)
+        a, b = last[rows, cols], centres[:, None, :]            # motion segment a → b
+        c, d = self._c1[None], self._c2[None]
+        hit = (todo & has_last[rows, cols]
+               & (_ccw(a, c, d) != _ccw(b, c, d)) & (_ccw(a, b, c) != _ccw(a, b, d)))
+
+        ti, li = np.nonzero(todo)
+        last[rows[ti, 0], cols[0, li]] = centres[ti]
+        has_last[rows[ti, 0], cols[0, li]] = True
+        ti, li = np.nonzero(hit)
+        seen[rows[ti, 0], cols[0, li]] = True
+        return [(self.ids[l], int(track_ids[t])) for t, l in zip(ti, li)]
@@ -0,0 +1,215 @@
+"""
+detection.py
+Batched YOLO inference over a video capture, and the detections as arrays.
+
+last.py and run_traffic_management (notebook) used to call
+`model(frame, conf=0.2, ...)` once per decoded frame.  detect() reads
+`batch_size` frames, hands them to the model as one list (ultralytics runs a
+list of images as a single batch) and then yields (frame, result) pairs one
+by one in frame order, so the per-frame counting / light-state / tracking /
+best-frame code stays a plain loop:
+
+    for frame, res in detect(model, cap, BATCH_SIZE, conf=0.2, verbose=False):
+        dets = to_records(res.boxes)     # structured DET_DTYPE array, one row per box
+        cars = dets[dets["cls"] == 0]
+        ...
+
+The last batch of a video is shorter.  At most `batch_size` decoded frames
+are held at once; batch_size=1 is the old frame-by-frame behaviour.
+detect_strided() does the same under a StridePolicy (stride.py), grabbing
+the frames it skips without decoding them (or decoding them, for stages
+such as light_panels.py that run on every frame).  Its two halves,
+read_strided() and infer(), run as separate stages in pipeline.py.
+
+A frame's detections are one structured array (cls, cx, cy, w, h, conf in
+pixels), handed as is to every stage instead of being formatted into YOLO
+text lines and parsed back.  A chunk's detections can be kept on disk as a
+columnar directory (`chunk0.detections/`) in place of one .yolo.txt per
+frame:
+
+    cls.i2 cx.f4 cy.f4 w.f4 h.f4 conf.f4   one raw file per column, all frames back to back
+    offsets.i8   int64 (frames + 1,), frame i owns rows offsets[i]:offsets[i+1]
+    meta.json    {"first_frame": 1, "n_frames": N, "n_dets": M, "size": [w, h]}
+
+    with DetectionWriter(OUT_DIR / "chunk0.detections", size=(w, h)) as dw:
+        dw.write(local_idx, dets)                 # buffered, appended in blocks
+    Detections(OUT_DIR / "chunk0.detections").frame(120)   # → DET_DTYPE array
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+DET_DTYPE = np.dtype([("cls", np.int16), ("cx", np.float32), ("cy", np.float32),
+                      ("w", np.float32), ("h", np.float32), ("conf", np.float32)])
+OFFSETS_FILE = "offsets.i8"
+META_FILE = "meta.json"
+
+
+def read_batches(cap, batch_size):
+    """Lists of up to `batch_size` frames read from `cap`, until it runs out."""
+    while True:
+        batch = []
+        while len(batch) < batch_size:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            batch.append(frame)
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+
+
+def detect(model, cap, batch_size=8, **predict_kw):
+    """(frame, result) per frame of `cap`, with `batch_size` frames per model call."""
+    for batch in read_batches(cap, max(1, batch_size)):
+        yield from zip(batch, model(batch, **predict_kw))
+
+
+def read_strided(cap, policy, batch_size=8, decode_skipped=False):
+    """Batches [(idx, frame, detect)] of `cap` (1-based) under `policy`; skipped frames are grabbed, frame None, unless `decode_skipped`."""
+    idx, ended = 0, False
+    while not ended:
+        # one batch spans at most batch_size frames, so a change of stride lags by no more
+        stride = max(1, policy.stride)
+        plan = []
+        for _ in range(max(1, batch_size // stride)):
+            for _ in range(stride - 1):
+                ok, frame = cap.read() if decode_skipped else (cap.grab(), None)
+                if not ok:
+                    ended = True
+                    break
+                idx += 1
+                plan.append((idx, frame, False))
+            ok, frame = (False, None) if ended else cap.read()
+            if not ok:
+                ended = True
+                break
+            idx += 1
+            plan.append((idx, frame, True))
+        if plan:
+            yield plan
+
+
+def infer(model, plan, **predict_kw):
+    """[(idx, frame, result, …)] of a read_strided() batch, one model call for its frames to detect; others get None."""
+    frames = [f for _, f, detected, *_ in plan if detected]
+    results = iter(model(frames, **predict_kw) if frames else ())
+    # fields after the detect flag (e.g. stride.watch_lights() states) are passed through
+    return [(i, frame, next(results) if detected else None, *rest) for i, frame, detected, *rest in plan]
+
+
+def detect_strided(model, cap, policy, batch_size=8, decode_skipped=False, **predict_kw):
+    """(idx, frame, result) per frame of `cap` (1-based); skipped frames have result None, and frame None unless `decode_skipped`."""
+    for plan in read_strided(cap, policy, batch_size, decode_skipped):
+        yield from infer(model, plan, **predict_kw)
+
+
+def _numpy(t):
+    return t.cpu().numpy() if hasattr(t, "cpu") else np.asarray(t)
+
+
+def to_records(boxes):
+    """DET_DTYPE array of an ultralytics Boxes (or roi_crops.CropBoxes), one row per box."""
+    xywh = _numpy(boxes.xywh)
+    dets = np.empty(len(xywh), DET_DTYPE)
+    dets["cls"] = _numpy(boxes.cls)
+    dets["cx"], dets["cy"], dets["w"], dets["h"] = xywh.T.reshape(4, -1)
+    dets["conf"] = _numpy(boxes.conf)
+    return dets
+
+
+def corners(dets):
+    """(n, 5) float32 x1, y1, x2, y2, conf rows of `dets`, the layout SORT takes."""
+    half_w, half_h = dets["w"] / 2, dets["h"] / 2
+    return np.stack([dets["cx"] - half_w, dets["cy"] - half_h,
+                     dets["cx"] + half_w, dets["cy"] + half_h, dets["conf"]], axis=1)
+
+
+def _column_file(name):
+    return f"{name}.{DET_DTYPE[name].kind}{DET_DTYPE[name].itemsize}"
+
+
+class DetectionWriter:
+    def __init__(self, out_dir, first_frame=1, size=None, block=256):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.first_frame = first_frame
+        self.size = list(size) if size else None
+        self.block = block          # frames buffered per append
+        # meta.json only exists for a finished file
+        (self.out_dir / META_FILE).unlink(missing_ok=True)
+        self._cols = {name: open(self.out_dir / _column_file(name), "wb") for name in DET_DTYPE.names}
+        self._offsets = open(self.out_dir / OFFSETS_FILE, "wb")
+        self._offsets.write(np.zeros(1, np.int64).tobytes())
+        self._pending = []
+        self.n_frames = self.n_dets = 0
+
+    def write(self, frame_idx, dets):
+        """Add `dets` (DET_DTYPE) as frame `frame_idx`; skipped frames get no detections."""
+        if frame_idx < self.first_frame + self.n_frames + len(self._pending):
+            raise ValueError(f"frame {frame_idx} written out of order")
+        while self.first_frame + self.n_frames + len(self._pending) < frame_idx:
+            self._pending.append(np.empty(0, DET_DTYPE))
+        self._pending.append(np.asarray(dets, DET_DTYPE))
+        if len(self._pending) >= self.block:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered frames to the column files."""
+        if self._pending:
+            rows = np.concatenate(self._pending)
+            for name, f in self._cols.items():
+                f.write(np.ascontiguousarray(rows[name]).tobytes())
+            ends = self.n_dets + np.cumsum([len(d) for d in self._pending])
+            self._offsets.write(ends.astype(np.int64).tobytes())
+            self.n_frames += len(self._pending)
+            self.n_dets += len(rows)
+            self._pending = []
+        for f in (*self._cols.values(), self._offsets):
+            f.flush()
+
+    def close(self, complete=True):
+        if complete:
+            self.flush()
+        for f in (*self._cols.values(), self._offsets):
+            f.close()
+        if complete:
+            meta = {"first_frame": self.first_frame, "n_frames": self.n_frames,
+                    "n_dets": self.n_dets, "size": self.size}
+            (self.out_dir / META_FILE).write_text(json.dumps(meta, indent=2))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(complete=exc_type is None)
+
+
+class Detections:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / META_FILE).read_text())
+        self.first_frame = self.meta["first_frame"]
+        self.offsets = np.fromfile(self.path / OFFSETS_FILE, np.int64)
+        n = self.meta["n_dets"]
+        # whole columns, e.g. detections.columns["conf"] for every box of the chunk
+        self.columns = {name: np.asarray(np.memmap(self.path / _column_file(name), DET_DTYPE[name], "r",
+                                                   shape=(n,))) if n else np.empty(0, DET_DTYPE[name])
+                        for name in DET_DTYPE.names}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def frame(self, frame_idx):
+        """DET_DTYPE array of `frame_idx` (empty outside the file)."""
+        i = frame_idx - self.first_frame
+        if not 0 <= i < len(self):
+            return np.empty(0, DET_DTYPE)
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        dets = np.empty(hi - lo, DET_DTYPE)
+        for name, col in self.columns.items():
+            dets[name] = col[lo:hi]
+        return dets
@@ -0,0 +1,291 @@
+"""
+dynamic_export.py
+Per-frame export of the annotated world polygons and crossing lines.
+
+Reads world_intersections.csv / crossing_lines.csv (reference-frame
+coordinates), warps them into every frame of the video with a homography
+engine (see homography.py) and writes
+
+    dynamic_polygons.csv       frame,id,x1,y1,x2,y2,x3,y3,x4,y4
+    dynamic_lines.csv          frame,id,x1,y1,x2,y2
+    dynamic_polygons.tracks/   the same polygons as a binary track (polygon_tracks.py)
+    homographies.stack/        the per-frame homographies (homography_stack.py)
+    homography_log.csv         frame,method,attempts,keypoints,matches,inliers,inlier_ratio,reproj_px,ms
+                               for every frame the engine estimated (engine.info + wall time)
+
+`frame` is 1-based.  Frames before the first successful homography are
+skipped; afterwards a failed frame reuses the last valid homography.
+
+With keyframe_gap > 0 the homography is only estimated on keyframes (see
+keyframes.py) and interpolated in between; every frame still gets its rows,
+so the files stay row-compatible with the per-frame polygons.csv read by
+last.py and run_traffic_management.  int_coords=True truncates the
+coordinates to ints like the overlay scripts' polygons.csv (last.py parses
+them with int()).
+
+The homography stack makes later edits cheap: after changing
+world_intersections.csv or crossing_lines.csv, reproject_dynamic_shapes()
+rewrites the same files from the stack without touching the video.
+
+Long exports checkpoint themselves (export.checkpoint.json) every
+`checkpoint_every` frames: the last frame written, the last valid
+homography and the flushed size of every output file.  Running the same
+export again truncates the outputs to those sizes, seeks the video to the
+checkpoint frame and carries on, giving the same bytes as an uninterrupted
+run.  Checkpoints are only taken on frames from which a fresh engine
+reproduces the pipeline state (see HomographyEngine.resumable; keyframes in
+keyframe mode), and that frame is estimated again, but not rewritten, on
+resume; the engine's mask seed (HomographyEngine.seed) is restored first.
+The checkpoint is removed once the export finishes.
+"""
+
+import csv
+import json
+import os
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from homography_stack import HomographyStack, HomographyStackWriter
+from keyframes import KeyframeSelector, keyframe_homographies
+from polygon_tracks import PolygonTrackWriter
+
+CHECKPOINT_FILE = 'export.checkpoint.json'
+LOG_FILE = 'homography_log.csv'
+LOG_FIELDS = ['frame', 'method', 'attempts', 'keypoints', 'matches', 'inliers', 'inlier_ratio',
+              'reproj_px', 'ms']
+MASKS_FILE = 'exclusion_masks.csv'
+
+
+class EstimateLog:
+    """Engine proxy that writes the quality and wall time of every estimate to homography_log.csv."""
+
+    def __init__(self, engine, f, skip_until=0):
+        self.engine = engine
+        self.writer = csv.DictWriter(f, LOG_FIELDS)
+        self.skip_until = skip_until    # frames already logged before a resume
+        self.idx = 0                    # frame being estimated, set by the frame reader
+
+    def __call__(self, idx):
+        self.idx = idx
+
+    def estimate(self, frame):
+        t0 = time.perf_counter()
+        H = self.engine.estimate(frame)
+        ms = 1000 * (time.perf_counter() - t0)
+        if self.idx > self.skip_until:
+            info = self.engine.info
+            reproj = info.get('reproj_px')
+            self.writer.writerow({
+                'frame': self.idx, 'method': info.get('method', ''),
+                'attempts': info.get('attempts', 1), 'keypoints': info.get('keypoints', 0),
+                'matches': info.get('matches', 0),
+                'inliers': info.get('inliers', 0),
+                'inlier_ratio': round(info.get('inlier_ratio', 0.0), 4),
+                'reproj_px': '' if reproj is None else round(reproj, 3),
+                'ms': round(ms, 2)})
+        return H
+
+
+def load_static_shapes(out_dir=Path.cwd(), world_csv='world_intersections.csv',
+                       lines_csv='crossing_lines.csv'):
+    """Read the reference-frame annotations → ({id: (4,2)}, {id: (2,2)}) float32 arrays."""
+    out_dir = Path(out_dir)
+    world, lines = {}, {}
+    with open(out_dir / world_csv) as f:
+        for r in csv.DictReader(f):
+            world[r['id']] = np.array(
+                [[float(r[f'x{i}']), float(r[f'y{i}'])] for i in range(1, 5)], np.float32)
+    with open(out_dir / lines_csv) as f:
+        for r in csv.DictReader(f):
+            lines[r['id']] = np.array(
+                [[float(r[f'x{i}']), float(r[f'y{i}'])] for i in range(1, 3)], np.float32)
+    return world, lines
+
+
+def load_exclusion_masks(path=MASKS_FILE):
+    """Read id,x1,y1,…,xn,yn rows → [(n,2) float32] reference-frame polygons ([] if there is no file)."""
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))[1:]
+    return [np.array(r[1:], np.float32).reshape(-1, 2) for r in rows if r]
+
+
+def save_exclusion_masks(polys, path=MASKS_FILE):
+    """Write reference-frame mask polygons (any number of points each) for load_exclusion_masks."""
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['id', 'x1', 'y1', 'x2', 'y2', '...'])
+        for i, poly in enumerate(polys, 1):
+            w.writerow([f'mask-{i}'] + np.asarray(poly, np.float32).reshape(-1).tolist())
+
+
+def iter_frames(cap, progress=None, first=1):
+    """(idx, frame) for every remaining frame of `cap`, numbered from `first`; idx goes to `progress`."""
+    idx = first - 1
+    while True:
+        ret, frm = cap.read()
+        if not ret: break
+        idx += 1
+        if progress is not None: progress(idx)
+        yield idx, frm
+
+
+def export_dynamic_shapes(cap, engine, world, lines, out_dir=Path.cwd(),
+                          keyframe_gap=0, drift_px=8.0, int_coords=False,
+                          video=None, ref_frame=None, progress=None, checkpoint_every=500):
+    """Warp `world`/`lines` into every frame of `cap`; returns the number of frames read.
+
+    `progress`, if given, is called with each frame index as it is read.
+    An export interrupted after a checkpoint resumes from it when called
+    again with the same arguments.
+    """
+    out_dir = Path(out_dir)
+    config = {'video': str(video), 'ref_frame': ref_frame, 'engine': type(engine).__name__,
+              'scale': engine.scale, 'keyframe_gap': keyframe_gap, 'drift_px': drift_px,
+              'int_coords': int_coords, 'log': LOG_FILE,
+              'exclude': [p.tolist() for p in engine.exclude],
+              'world': {k: v.tolist() for k, v in world.items()},
+              'lines': {k: v.tolist() for k, v in lines.items()}}
+    resume = load_checkpoint(out_dir, config)
+
+    # resuming re-reads the checkpoint frame to rebuild the engine state
+    first = resume['frame'] if resume else 1
+    if resume:
+        engine.restore(resume['engine_seed'])
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first - 1)
+    log_path = out_dir / LOG_FILE
+    if resume:
+        os.truncate(log_path, resume['offsets']['log'])
+    log_file = open(log_path, 'a' if resume else 'w', newline='')
+    logged = EstimateLog(engine, log_file, resume['frame'] if resume else 0)
+    if not resume:
+        logged.writer.writeheader()
+
+    def on_frame(idx):
+        logged(idx)
+        if progress is not None: progress(idx)
+
+    frames = iter_frames(cap, on_frame, first)
+    selector = KeyframeSelector(keyframe_gap, drift_px) if keyframe_gap > 0 else None
+    if selector is not None:
+        homographies = keyframe_homographies(frames, logged, selector)
+    else:
+        homographies = ((idx, logged.estimate(frm)) for idx, frm in frames)
+
+    def resumable(idx):
+        return engine.resumable and (selector is None or selector.key_idx == idx)
+
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    with log_file, \
+         HomographyStackWriter(out_dir / 'homographies.stack', size=size, video=video,
+                               ref_frame=ref_frame,
+                               resume_frames=resume['stack_frames'] if resume else 0) as stack:
+        last = write_dynamic_shapes(homographies, world, lines, out_dir, int_coords, stack,
+                                    checkpoint=(config, checkpoint_every, resumable, engine),
+                                    resume=resume, extra_files={'log': log_file})
+    (out_dir / CHECKPOINT_FILE).unlink(missing_ok=True)
+    return last
+
+
+def reproject_dynamic_shapes(stack_dir, world, lines, out_dir=Path.cwd(), int_coords=False):
+    """Rewrite the dynamic files from a saved homography stack; returns the last frame index."""
+    return write_dynamic_shapes(HomographyStack(stack_dir), world, lines, out_dir, int_coords)
+
+
+def load_checkpoint(out_dir, config):
+    """The checkpoint in `out_dir` if it was written by an export with the same `config`."""
+    path = Path(out_dir) / CHECKPOINT_FILE
+    if not path.exists():
+        return None
+    ckpt = json.loads(path.read_text())
+    if ckpt.get('config') != json.loads(json.dumps(config)):
+        print(f"Ignoring {path}: written by a different export configuration")
+        return None
+    print(f"Resuming export after frame {ckpt['frame']}")
+    return ckpt
+
+
+def save_checkpoint(out_dir, ckpt):
+    """Write `ckpt` atomically, so a crash mid-write keeps the previous checkpoint."""
+    path = Path(out_dir) / CHECKPOINT_FILE
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(ckpt))
+    os.replace(tmp, path)
+
+
+def write_dynamic_shapes(homographies, world, lines, out_dir=Path.cwd(), int_coords=False,
+                         stack=None, checkpoint=None, resume=None, extra_files=None):
+    """Write the dynamic CSVs and track for (idx, H or None) pairs, recording them in `stack` if given.
+
+    `checkpoint` = (config, every, resumable(idx), engine) enables checkpoints,
+    `resume` is a loaded checkpoint to continue from.  `extra_files`
+    ({name: file}) are other outputs whose size is saved in the checkpoint.
+    """
+    extra_files = extra_files or {}
+    out_dir = Path(out_dir)
+    poly_path, line_path = out_dir / 'dynamic_polygons.csv', out_dir / 'dynamic_lines.csv'
+
+    def coords(pts, H):
+        warped = cv2.perspectiveTransform(pts.reshape(-1, 1, 2), H).reshape(-1, 2)
+        if int_coords:
+            warped = warped.astype(np.int32)
+        return warped.flatten().tolist()
+
+    if resume:
+        # drop whatever was written after the checkpoint
+        os.truncate(poly_path, resume['offsets']['polygons'])
+        os.truncate(line_path, resume['offsets']['lines'])
+    mode = 'a' if resume else 'w'
+    with open(poly_path, mode, newline='') as dyn_poly, \
+         open(line_path, mode, newline='') as dyn_line, \
+         PolygonTrackWriter(out_dir / 'dynamic_polygons.tracks', world,
+                            resume_frames=resume['track_frames'] if resume else 0) as tracks:
+        pw = csv.writer(dyn_poly); lw = csv.writer(dyn_line)
+        if not resume:
+            pw.writerow(['frame', 'id', 'x1', 'y1', 'x2', 'y2', 'x3', 'y3', 'x4', 'y4'])
+            lw.writerow(['frame', 'id', 'x1', 'y1', 'x2', 'y2'])
+
+        frame_idx = 0; last_H = None; done = 0
+        if resume:
+            done = resume['frame']
+            last_H = None if resume['last_H'] is None else np.array(resume['last_H'])
+        last_ckpt = done
+        for frame_idx, H in homographies:
+            if H is not None: last_H = H
+            if frame_idx <= done: continue          # already on disk
+            if stack is not None: stack.write(frame_idx, H)
+            if last_H is not None:
+                # dynamic polygons
+                polys = {}
+                for iid, pts in world.items():
+                    polys[iid] = coords(pts, last_H)
+                    pw.writerow([frame_idx, iid] + polys[iid])
+                tracks.write(frame_idx, polys)
+
+                # dynamic lines
+                for iid, pts in lines.items():
+                    lw.writerow([frame_idx, iid] + coords(pts, last_H))
+
+            if checkpoint is not None:
+                config, every, resumable, engine = checkpoint
+                if frame_idx - last_ckpt >= every and resumable(frame_idx):
+                    for f in (dyn_poly, dyn_line, tracks, *extra_files.values()):
+                        f.flush()
+                    if stack is not None: stack.flush()
+                    save_checkpoint(out_dir, {
+                        'frame': frame_idx,
+                        'last_H': None if last_H is None else np.asarray(last_H).tolist(),
+                        'offsets': {'polygons': dyn_poly.tell(), 'lines': dyn_line.tell(),
+                                    **{k: f.tell() for k, f in extra_files.items()}},
+                        'track_frames': tracks.n_frames,
+                        'stack_frames': stack.n_frames if stack else 0,
+                        'engine_seed': engine.seed,
+                        'config': config,
+                    })
+                    last_ckpt = frame_idx
+    return frame_idx
@@ -0,0 +1,137 @@
+"""
+event_log.py
+Append-only per-chunk event log (JSON Lines), in place of the per-frame
+counts/lights .txt/.json files and the best-frame .json/.txt files.
+
+Each line is one event, a JSON object with at least "kind" and, for frame
+events, "frame":
+
+    {"kind": "lights", "frame": 412, "cars": {"ID-1": 3, ...}, "lights": {"ID-1": "yellow", ...}}
+    {"kind": "best", "frame": 415, "tid": "ID-1", "cars": {...}, "lights": {...}}
+    {"kind": "recommendations", "recommendations": [...]}
+
+    with EventLog(EVENTS_DIR / "chunk_0.events.jsonl") as log:
+        log.append("lights", frame=412, cars=counts, lights=tl_state)
+
+    events = EventLogReader(EVENTS_DIR / "chunk_0.events.jsonl")
+    events.last("best", tid="ID-1")          # latest matching event, or None
+    events.at(412)                           # every event of frame 412
+    for ev in events.iter("lights"): ...
+
+The writer buffers lines and fsyncs at most every `fsync_every` seconds
+(and on close), so a crash loses at most that much of the log.  The
+reader indexes the byte offset of every complete line by kind and frame
+on open and reads events back by seeking.  A torn last line of a crashed
+run is ignored, and EventLog(..., append=True) cuts it off before
+appending.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+
+class EventLog:
+    def __init__(self, path, fsync_every=5.0, append=False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fsync_every = fsync_every      # seconds between fsyncs; 0 syncs every event
+        if append and self.path.exists():
+            drop_torn_tail(self.path)
+        self._f = open(self.path, "ab" if append else "wb", buffering=1 << 16)
+        self._synced = time.monotonic()
+
+    def append(self, kind, **fields):
+        """Write one event of `kind` with `fields` (JSON-serializable)."""
+        self._f.write(json.dumps({"kind": kind, **fields}, separators=(",", ":")).encode() + b"\n")
+        if time.monotonic() - self._synced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        """Flush the buffer and fsync the file."""
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._synced = time.monotonic()
+
+    def close(self):
+        if not self._f.closed:
+            self.sync()
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def drop_torn_tail(path, block=1 << 16):
+    """Truncate `path` after its last complete line."""
+    with open(path, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            nl = f.read(pos - start).rfind(b"\n")
+            if nl >= 0:
+                keep = start + nl + 1
+                break
+            pos = start
+        else:
+            keep = 0
+        if keep < end:
+            f.truncate(keep)
+
+
+class EventLogReader:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.kinds = {}         # kind → [offset, …] in log order
+        self.frames = {}        # frame → [offset, …]
+        self._f = open(self.path, "rb")
+        offset = 0
+        for line in self._f:
+            if not line.endswith(b"\n"):
+                break           # torn last line
+            ev = json.loads(line)
+            self.kinds.setdefault(ev["kind"], []).append(offset)
+            if "frame" in ev:
+                self.frames.setdefault(ev["frame"], []).append(offset)
+            offset += len(line)
+
+    def __len__(self):
+        return sum(map(len, self.kinds.values()))
+
+    def _read(self, offset):
+        self._f.seek(offset)
+        return json.loads(self._f.readline())
+
+    def iter(self, kind, **match):
+        """Events of `kind` whose fields equal `match`, in log order."""
+        for offset in self.kinds.get(kind, []):
+            ev = self._read(offset)
+            if all(ev.get(k) == v for k, v in match.items()):
+                yield ev
+
+    def last(self, kind, **match):
+        """Latest event of `kind` whose fields equal `match`, or None."""
+        for offset in reversed(self.kinds.get(kind, [])):
+            ev = self._read(offset)
+            if all(ev.get(k) == v for k, v in match.items()):
+                return ev
+        return None
+
+    def at(self, frame):
+        """Every event logged for `frame`, in log order."""
+        return [self._read(offset) for offset in self.frames.get(frame, [])]
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,166 @@
+"""
+export_cli.py
+Headless batch export: the export half of tool.py, without any windows.
+
+    python export_cli.py VIDEO [VIDEO ...] --ref 120 \
+        [--world world_intersections.csv] [--lines crossing_lines.csv] \
+        [--out exports] [--mode sift] [--scale 1.0] [--keyframe-gap 0] \
+        [--int-coords] [--reuse] [--exclude exclusion_masks.csv] [--summary summary.json]
+
+Every video is exported into <out>/<video stem>/ (dynamic CSVs, polygon
+track, homography stack) using the shapes annotated on frame `--ref` of
+that video.  Videos run back-to-back; a failing video is reported and the
+batch goes on.  Progress (frames/s, ETA) goes to stderr, and a JSON summary
+goes to stdout (and to --summary).  The exit code is 1 if any video failed.
+An interrupted batch resumes each unfinished video from its checkpoint
+when the same command is run again.
+"""
+
+import argparse
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import cv2
+
+from homography import ENGINES, make_engine
+from homography_stack import HomographyStack
+from dynamic_export import (load_static_shapes, load_exclusion_masks, export_dynamic_shapes,
+                            reproject_dynamic_shapes)
+
+
+class Progress:
+    def __init__(self, name, total, every=2.0):
+        self.name = name
+        self.total = total          # frame count from the container, 0 if unknown
+        self.every = every          # seconds between reports
+        self.t0 = self.last = time.perf_counter()
+        self.first = None           # first index seen (> 1 when resuming)
+
+    def __call__(self, idx):
+        if self.first is None:
+            self.first = idx
+        now = time.perf_counter()
+        if now - self.last < self.every:
+            return
+        self.last = now
+        fps = (idx - self.first + 1) / (now - self.t0)
+        msg = f"[{self.name}] {idx}"
+        if self.total:
+            eta = max(self.total - idx, 0) / fps if fps > 0 else 0
+            msg += f"/{self.total} frames ({100 * idx / self.total:.1f}%)  {fps:.1f} fps  ETA {fmt_secs(eta)}"
+        else:
+            msg += f" frames  {fps:.1f} fps"
+        print(msg, file=sys.stderr, flush=True)
+
+
+def fmt_secs(s):
+    m, s = divmod(int(s), 60)
+    h, m = divmod(m, 60)
+    return f"{h}h{m:02d}m{s:02d}s" if h else f"{m}m{s:02d}s"
+
+
+def read_frame(cap, idx):
+    cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+    ok, frame = cap.read()
+    if not ok:
+        raise RuntimeError(f"cannot read reference frame {idx}")
+    return frame
+
+
+def export_video(video, args, world, lines, exclude):
+    """Export one video; returns its summary entry."""
+    out_dir = Path(args.out) / Path(video).stem
+    out_dir.mkdir(parents=True, exist_ok=True)
+    entry = {"video": str(video), "out_dir": str(out_dir), "ref_frame": args.ref}
+    t0 = time.perf_counter()
+
+    stack_dir = out_dir / "homographies.stack"
+    meta = HomographyStack(stack_dir).meta if (stack_dir / "meta.json").exists() else {}
+    if args.reuse and meta.get("video") == str(video) and meta.get("ref_frame") == args.ref:
+        entry["frames"] = reproject_dynamic_shapes(stack_dir, world, lines, out_dir, args.int_coords)
+        entry["reused_homographies"] = True
+    else:
+        cap = cv2.VideoCapture(str(video))
+        if not cap.isOpened():
+            raise IOError(f"cannot open {video}")
+        try:
+            engine_kw = {"scale": args.scale, "refine": args.refine, "exclude": exclude}
+            if args.mode == "track":
+                engine_kw["reanchor_every"] = args.reanchor_every
+            engine = make_engine(read_frame(cap, args.ref), args.mode, **engine_kw)
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            entry["frames"] = export_dynamic_shapes(
+                cap, engine, world, lines, out_dir,
+                keyframe_gap=args.keyframe_gap, int_coords=args.int_coords,
+                video=video, ref_frame=args.ref,
+                progress=Progress(Path(video).name, total, args.report_every),
+                checkpoint_every=args.checkpoint_every)
+        finally:
+            cap.release()
+        entry["reused_homographies"] = False
+
+    entry["seconds"] = round(time.perf_counter() - t0, 3)
+    entry["fps"] = round(entry["frames"] / entry["seconds"], 2) if entry["seconds"] > 0 else None
+    return entry
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    ap.add_argument("videos", nargs="+")
+    ap.add_argument("--ref", type=int, required=True, help="reference frame index (0-based)")
+    ap.add_argument("--world", default="world_intersections.csv")
+    ap.add_argument("--lines", default="crossing_lines.csv")
+    ap.add_argument("--out", default="exports", help="one sub-directory per video is created here")
+    ap.add_argument("--mode", default="sift", choices=list(ENGINES))
+    ap.add_argument("--reanchor-every", type=int, default=30)
+    ap.add_argument("--scale", type=float, default=1.0, help="analysis scale (<1: match on a downscaled frame)")
+    ap.add_argument("--refine", action="store_true")
+    ap.add_argument("--keyframe-gap", type=int, default=0)
+    ap.add_argument("--int-coords", action="store_true")
+    ap.add_argument("--exclude", help="reference-frame mask polygons left out of feature detection")
+    ap.add_argument("--reuse", action="store_true",
+                    help="re-warp from an existing homographies.stack of the same video/ref frame")
+    ap.add_argument("--checkpoint-every", type=int, default=500,
+                    help="frames between checkpoints; rerun the same command to resume")
+    ap.add_argument("--report-every", type=float, default=2.0, help="seconds between progress lines")
+    ap.add_argument("--summary", help="also write the JSON summary to this file")
+    args = ap.parse_args()
+
+    world, lines = load_static_shapes(Path.cwd(), args.world, args.lines)
+    if args.exclude and not Path(args.exclude).exists():
+        ap.error(f"no such mask file: {args.exclude}")
+    exclude = load_exclusion_masks(args.exclude) if args.exclude else []
+    if args.exclude:
+        print(f"exclusion masks: {len(exclude)} polygons from {args.exclude}", file=sys.stderr, flush=True)
+    results = []
+    for i, video in enumerate(args.videos, 1):
+        print(f"[{i}/{len(args.videos)}] {video}", file=sys.stderr, flush=True)
+        try:
+            with redirect_stdout(sys.stderr):       # keep stdout for the JSON summary
+                entry = export_video(video, args, world, lines, exclude)
+            entry["ok"] = True
+        except Exception as e:
+            entry = {"video": str(video), "ok": False, "error": f"{type(e).__name__}: {e}"}
+        print(f"[{i}/{len(args.videos)}] {'done' if entry['ok'] else 'FAILED'}: "
+              f"{entry.get('frames', 0)} frames, {entry.get('fps') or 0} fps"
+              + ("" if entry["ok"] else f" ({entry['error']})"), file=sys.stderr, flush=True)
+        results.append(entry)
+
+    summary = {
+        "videos": results,
+        "ok": sum(r["ok"] for r in results),
+        "failed": sum(not r["ok"] for r in results),
+        "frames": sum(r.get("frames", 0) for r in results),
+    }
+    text = json.dumps(summary, indent=2)
+    if args.summary:
+        Path(args.summary).write_text(text)
+    print(text)
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
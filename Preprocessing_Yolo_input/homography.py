@@ -0,0 +1,336 @@
+"""
+homography.py
+Reference frame → current frame homography shared by the export loop
+(tool.py) and the overlay scripts (test.py, OOO.py, Test2.py, testtest.py).
+
+The reference frame never changes during a run, so its SIFT keypoints and
+descriptors are computed once and kept together with a single detector and
+matcher instance.  Every later frame only pays for its own detection,
+matching and RANSAC.
+
+    engine = HomographyEngine(ref_frame)
+    H = engine.estimate(frame)      # 3x3 ref → frame, or None
+
+`scale` < 1 runs detection, matching and tracking on a downscaled gray
+image (4K drone footage does not need full-resolution SIFT).  The result is
+conjugated back to full-resolution pixels with the exact per-axis resize
+mapping, so callers always get a full-resolution homography.  With
+`refine=True` the RANSAC inliers are re-located at full resolution with a
+one-level Lucas-Kanade step seeded by that homography, and H is refit on
+them; the cost grows with the inlier count, not the image size.
+
+TrackingHomographyEngine is the cheap variant for sequential video: it
+tracks the SIFT inliers of the last anchor frame with pyramidal
+Lucas-Kanade and only falls back to a full SIFT match ("re-anchor") every
+`reanchor_every` frames or when too few tracked points survive RANSAC.
+
+AdaptiveHomographyEngine starts on cheap binary features (ORB, as in
+finalcodeforprocessing.txt) and escalates to a bigger ORB budget or SIFT
+only when the inlier count, inlier ratio or mean reprojection error of the
+fit is poor, dropping back a tier after `relax_after` good frames.
+
+`exclude` takes static exclusion masks: polygons in reference-frame
+pixels (road surfaces, lanes, the mask_polygons of the overlay scripts)
+whose moving traffic only feeds RANSAC outliers.  They are cut out of the
+reference detection once and, warped by the previous frame's homography,
+out of every frame's detection, so only background features are extracted
+and matched.  Frames before the first successful estimate are detected
+without a mask.
+
+Every engine leaves the quality of its last estimate in `engine.info`
+(method, keypoints, matches, inliers, inlier_ratio, reproj_px in
+full-resolution px); the export logs it per frame.
+"""
+
+import cv2
+import numpy as np
+
+# detector factory and descriptor norm per feature type; specs are "sift",
+# "sift:<max features>" or "orb:<max features>"
+DETECTORS = {
+    "sift": (lambda n: cv2.SIFT_create(n or 0), cv2.NORM_L2),
+    "orb":  (lambda n: cv2.ORB_create(n or 1000), cv2.NORM_HAMMING),
+}
+
+
+class Features:
+    def __init__(self, spec, ref_gray, ref_mask=None):
+        kind, _, n = spec.partition(":")
+        if kind not in DETECTORS:
+            raise ValueError(f"Unknown feature type {kind!r}, expected one of {list(DETECTORS)}")
+        create, norm = DETECTORS[kind]
+        self.name = spec
+        self.detector = create(int(n) if n else 0)
+        self.matcher = cv2.BFMatcher(norm)
+
+        # reference features, computed once
+        self.ref_kp, self.ref_des = self.detector.detectAndCompute(ref_gray, ref_mask)
+        self.ref_pts = np.float32([k.pt for k in self.ref_kp]).reshape(-1, 2)
+
+
+class HomographyEngine:
+    def __init__(self, ref_img, ratio=0.75, min_matches=10, ransac_thresh=5.0,
+                 scale=1.0, refine=False, features="sift", exclude=None):
+        self.ratio = ratio                  # Lowe ratio test
+        self.min_matches = min_matches      # below this → no homography
+        self.ransac_thresh = ransac_thresh  # px (full resolution), reprojection threshold
+        self.scale = scale                  # analysis scale, 1.0 = full resolution
+        self.refine = refine                # full-resolution refit on the inliers
+
+        # full-res → analysis pixel mapping (pixel centres preserved)
+        h, w = ref_img.shape[:2]
+        self.size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        sx, sy = self.size[0] / w, self.size[1] / h
+        self.S = np.array([[sx, 0, 0.5 * sx - 0.5],
+                           [0, sy, 0.5 * sy - 0.5],
+                           [0, 0, 1]])
+        self.S_inv = np.linalg.inv(self.S)
+        self.match_thresh = max(1.0, ransac_thresh * scale)  # same threshold in analysis px
+
+        # exclusion polygons, in reference pixels and at the analysis scale
+        self.exclude = [np.asarray(p, np.float32).reshape(-1, 2) for p in exclude or ()]
+        self.exclude_pts = [cv2.perspectiveTransform(p.reshape(-1, 1, 2).astype(np.float64), self.S)
+                            for p in self.exclude]
+        self.prev_H = None      # analysis-scale H of the last successful estimate
+        self.frame_seed = None  # prev_H as it was when the last frame was estimated
+
+        # one detector / matcher (and the reference features) for the whole run
+        self.ref_gray = self._gray(ref_img)
+        self.ref_mask = self._mask(self.ref_gray.shape, np.eye(3)) if self.exclude else None
+        self.features = Features(features, self.ref_gray, self.ref_mask)
+        self.ref_full = cv2.cvtColor(ref_img, cv2.COLOR_BGR2GRAY) if refine else None
+        self.info = {}
+
+    def estimate(self, frame):
+        """Return the 3x3 homography mapping reference pixels onto `frame` (None if it fails)."""
+        H, src, _ = self._match_gray(self._gray(frame))
+        return self._to_full(H, src, frame)
+
+    @property
+    def resumable(self):
+        """True when a fresh engine that estimates the last frame again ends up in this engine's state."""
+        return True                         # no per-frame state (the mask seed aside)
+
+    @property
+    def seed(self):
+        """What a fresh engine needs (see restore) to estimate the last frame exactly like this one."""
+        return None if self.frame_seed is None else self.frame_seed.tolist()
+
+    def restore(self, seed):
+        """Continue from `seed`: the next frame's masks are warped by the H it holds."""
+        self.prev_H = None if seed is None else np.array(seed)
+
+    def _mask(self, shape, H):
+        """Detector mask (255 = detect) with the exclusion polygons warped by analysis-scale `H`."""
+        mask = np.full(shape, 255, np.uint8)
+        polys = [cv2.perspectiveTransform(p, H).reshape(-1, 2).round().astype(np.int32)
+                 for p in self.exclude_pts]
+        cv2.fillPoly(mask, polys, 0)
+        return mask
+
+    def _gray(self, img):
+        """Gray image at the analysis scale."""
+        if self.scale != 1.0:
+            img = cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    def _to_full(self, H, src, frame):
+        """Conjugate an analysis-scale H back to full-resolution pixels, refining it if asked."""
+        # every estimate ends here: the next frame's masks follow this H
+        self.frame_seed = self.prev_H
+        if H is None:
+            return None
+        self.prev_H = H
+        if self.scale != 1.0:
+            H = self.S_inv @ H @ self.S
+            H = H / H[2, 2]
+        if self.refine and src is not None and len(src) >= self.min_matches:
+            H = self._refine(H, src, frame)
+        return H
+
+    def _refine(self, H, src, frame):
+        """Re-locate the inliers at full resolution (LK seeded by H) and refit H on them."""
+        ref_pts = cv2.perspectiveTransform(src.astype(np.float32), self.S_inv).astype(np.float32)
+        guess = cv2.perspectiveTransform(ref_pts, H).astype(np.float32)
+        cur_full = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        nxt, status, _ = cv2.calcOpticalFlowPyrLK(
+            self.ref_full, cur_full, ref_pts, guess, winSize=(15, 15), maxLevel=1,
+            flags=cv2.OPTFLOW_USE_INITIAL_FLOW)
+        ok = status.ravel() == 1
+        if ok.sum() < self.min_matches:
+            return H
+        H_ref, _ = cv2.findHomography(ref_pts[ok], nxt[ok], cv2.RANSAC, self.ransac_thresh)
+        return H if H_ref is None else H_ref
+
+    def _fit(self, method, src, dst, keypoints=None):
+        """RANSAC H for src → dst; records the fit quality in self.info → (H, inlier mask)."""
+        keypoints = len(src) if keypoints is None else keypoints
+        self.info = {"method": method, "keypoints": keypoints, "matches": len(src), "inliers": 0,
+                     "inlier_ratio": 0.0, "reproj_px": None}
+        if len(src) < 4:
+            return None, None
+        H, mask = cv2.findHomography(src, dst, cv2.RANSAC, self.match_thresh)
+        if H is None:
+            return None, None
+        inl = mask.ravel().astype(bool)
+        err = np.linalg.norm(cv2.perspectiveTransform(src[inl], H) - dst[inl], axis=2)
+        self.info.update(inliers=int(inl.sum()), inlier_ratio=float(inl.mean()),
+                         reproj_px=float(err.mean()) / self.scale)
+        return H, inl
+
+    def _match_gray(self, gray, feats=None):
+        """Feature-match `gray` against the reference → (H, ref inliers, frame inliers)."""
+        feats = feats or self.features
+        self.info = {"method": feats.name, "keypoints": 0, "matches": 0, "inliers": 0,
+                     "inlier_ratio": 0.0, "reproj_px": None}
+        if feats.ref_des is None:
+            return None, None, None
+        mask = None
+        if self.exclude and self.prev_H is not None:
+            mask = self._mask(gray.shape, self.prev_H)
+        kp, des = feats.detector.detectAndCompute(gray, mask)
+        self.info["keypoints"] = len(kp)
+        if des is None:
+            return None, None, None
+
+        matches = feats.matcher.knnMatch(feats.ref_des, des, k=2)
+        good = [p[0] for p in matches
+                if len(p) == 2 and p[0].distance < self.ratio * p[1].distance]
+        self.info["matches"] = len(good)
+        if len(good) < self.min_matches:
+            return None, None, None
+
+        cur_pts = np.float32([k.pt for k in kp])
+        src = feats.ref_pts[[m.queryIdx for m in good]].reshape(-1, 1, 2)
+        dst = cur_pts[[m.trainIdx for m in good]].reshape(-1, 1, 2)
+        H, inl = self._fit(feats.name, src, dst, keypoints=len(kp))
+        if H is None:
+            return None, None, None
+        return H, src[inl], dst[inl]
+
+
+class TrackingHomographyEngine(HomographyEngine):
+    def __init__(self, ref_img, reanchor_every=30, min_tracked=30, max_points=400,
+                 lk_win=21, lk_levels=3, **kwargs):
+        super().__init__(ref_img, **kwargs)
+        self.reanchor_every = reanchor_every  # frames between forced SIFT anchors
+        self.min_tracked = min_tracked        # RANSAC inliers needed to trust LK
+        self.max_points = max_points          # tracked points kept per anchor
+        self.lk_params = dict(
+            winSize=(lk_win, lk_win), maxLevel=lk_levels,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01),
+        )
+
+        self.prev_gray = None
+        self.track_ref = None   # (N,1,2) reference coords of the tracked points
+        self.track_cur = None   # (N,1,2) their positions in prev_gray
+        self.since_anchor = 0
+        self.stats = {"anchors": 0, "tracked": 0}
+
+    def estimate(self, frame):
+        gray = self._gray(frame)
+        H = None
+        if self.track_cur is not None and self.since_anchor < self.reanchor_every:
+            H = self._track(gray)
+        if H is None:
+            H = self._anchor(gray)
+        self.prev_gray = gray
+        return self._to_full(H, self.track_ref, frame)
+
+    @property
+    def resumable(self):
+        # right after an anchor (or with nothing tracked) the state depends on the last frame only
+        return self.track_cur is None or self.since_anchor == 0
+
+    def _anchor(self, gray):
+        H, src, dst = self._match_gray(gray)
+        if H is None:
+            self.track_ref = self.track_cur = None
+            return None
+        if len(src) > self.max_points:
+            keep = np.linspace(0, len(src) - 1, self.max_points).astype(int)
+            src, dst = src[keep], dst[keep]
+        self.track_ref, self.track_cur = src, dst
+        self.since_anchor = 0
+        self.stats["anchors"] += 1
+        return H
+
+    def _track(self, gray):
+        nxt, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray,
+                                                  self.track_cur, None, **self.lk_params)
+        ok = status.ravel() == 1
+        if ok.sum() < self.min_tracked:
+            return None
+        ref, cur = self.track_ref[ok], nxt[ok]
+        H, inl = self._fit("lk", ref, cur)
+        if H is None:
+            return None
+        if inl.sum() < self.min_tracked:
+            return None
+        # drop outliers so they do not pollute the next frame
+        self.track_ref, self.track_cur = ref[inl], cur[inl]
+        self.since_anchor += 1
+        self.stats["tracked"] += 1
+        return H
+
+
+class AdaptiveHomographyEngine(HomographyEngine):
+    def __init__(self, ref_img, tiers=("orb:1000", "orb:4000", "sift"), min_inliers=20,
+                 min_inlier_ratio=0.3, max_reproj_px=2.0, relax_after=50, **kwargs):
+        super().__init__(ref_img, **kwargs)
+        self.min_inliers = min_inliers            # quality gate: RANSAC inliers …
+        self.min_inlier_ratio = min_inlier_ratio  # … share of ratio-test matches kept by RANSAC …
+        self.max_reproj_px = max_reproj_px        # … and mean inlier error (full-res px)
+        self.relax_after = relax_after            # good frames before trying a cheaper tier
+
+        # cheapest first; the base engine's features are reused when they match a tier
+        self.tiers = [self.features if spec == self.features.name
+                      else Features(spec, self.ref_gray, self.ref_mask) for spec in tiers]
+        self.level = 0          # tier the next frame starts on
+        self.entry_level = 0    # tier the last frame started on
+        self.good_run = 0       # consecutive good frames on an escalated tier
+        self.stats = {t.name: 0 for t in self.tiers}
+
+    def estimate(self, frame):
+        gray = self._gray(frame)
+        self.entry_level = self.level
+        for level in range(self.level, len(self.tiers)):
+            H, src, _ = self._match_gray(gray, self.tiers[level])
+            good = H is not None and self._good(self.info)
+            if good:
+                break
+        self.info["attempts"] = level - self.entry_level + 1
+        self.stats[self.tiers[level].name] += 1
+
+        if level > self.entry_level or not good:
+            # stay on the tier that worked (the top one if none did)
+            self.level, self.good_run = level, 0
+        elif self.level > 0:
+            self.good_run += 1
+            if self.good_run >= self.relax_after:
+                self.level, self.good_run = self.level - 1, 0
+        return self._to_full(H, src, frame)
+
+    @property
+    def resumable(self):
+        # a fresh engine starts on the cheapest tier, which is all the state there is
+        return self.entry_level == 0
+
+    def _good(self, info):
+        return (info["inliers"] >= self.min_inliers
+                and info["inlier_ratio"] >= self.min_inlier_ratio
+                and info["reproj_px"] <= self.max_reproj_px)
+
+
+ENGINES = {
+    "sift":     HomographyEngine,          # full SIFT match every frame
+    "track":    TrackingHomographyEngine,  # LK tracking + periodic SIFT re-anchor
+    "adaptive": AdaptiveHomographyEngine,  # ORB first, SIFT only when the fit is poor
+}
+
+
+def make_engine(ref_img, mode="sift", **kwargs):
+    """Build the homography engine for `mode` (a key of ENGINES); kwargs go to the engine."""
+    if mode not in ENGINES:
+        raise ValueError(f"Unknown homography mode {mode!r}, expected one of {list(ENGINES)}")
+    return ENGINES[mode](ref_img, **kwargs)
@@ -0,0 +1,132 @@
+"""
+homography_stack.py
+Per-frame reference → frame homographies saved with the export, so any
+shape annotated on the reference frame (polygons, crossing lines, masks)
+can be warped into any frame later without running SIFT over the video
+again.
+
+A stack is a directory (`homographies.stack/`):
+
+    H.f64       float64 (frames, 3, 3), raw C order, memory-mapped
+    valid.u8    uint8   (frames,), 1 where the homography was estimated
+    meta.json   {"first_frame": 1, "n_frames": N, "size": [w, h],
+                 "video": ..., "ref_frame": ...}
+
+Frames whose estimate failed hold the last valid homography, exactly like
+the CSV export; frames before the first valid one have none:
+
+    stack = HomographyStack("homographies.stack")
+    frames, shapes, ok = stack.warp({"ID-1": poly, "line-1": line}, 100, 250)
+    # shapes["ID-1"] is (len(frames), 4, 2) float32, rows with ok == False are zero
+"""
+
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from polygon_tracks import open_after
+
+H_FILE = "H.f64"
+VALID_FILE = "valid.u8"
+META_FILE = "meta.json"
+
+
+class HomographyStackWriter:
+    def __init__(self, out_dir, first_frame=1, size=None, video=None, ref_frame=None,
+                 resume_frames=0):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.first_frame = first_frame
+        self.info = {"size": list(size) if size else None,
+                     "video": str(video) if video else None,
+                     "ref_frame": ref_frame}
+        # meta.json only exists for a finished stack
+        (self.out_dir / META_FILE).unlink(missing_ok=True)
+        # resume_frames > 0 keeps that many records of an interrupted run and appends after them
+        self.n_frames = resume_frames
+        self._H = open_after(self.out_dir / H_FILE, resume_frames * 9 * 8)
+        self._valid = open_after(self.out_dir / VALID_FILE, resume_frames)
+
+    def write(self, frame_idx, H):
+        """Append `H` (3x3 or None) as frame `frame_idx`; skipped frames are stored invalid."""
+        if frame_idx < self.first_frame + self.n_frames:
+            raise ValueError(f"frame {frame_idx} written out of order")
+        while self.first_frame + self.n_frames < frame_idx:
+            self._append(None)
+        self._append(H)
+
+    def _append(self, H):
+        ok = H is not None
+        self._H.write(np.asarray(H if ok else np.zeros((3, 3)), np.float64).tobytes())
+        self._valid.write(bytes([ok]))
+        self.n_frames += 1
+
+    def flush(self):
+        self._H.flush()
+        self._valid.flush()
+
+    def close(self, complete=True):
+        self._H.close()
+        self._valid.close()
+        if complete:
+            meta = {"first_frame": self.first_frame, "n_frames": self.n_frames, **self.info}
+            (self.out_dir / META_FILE).write_text(json.dumps(meta, indent=2))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(complete=exc_type is None)
+
+
+class HomographyStack:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / META_FILE).read_text())
+        self.first_frame = self.meta["first_frame"]
+        n = self.meta["n_frames"]
+        if n == 0:            # np.memmap refuses empty files
+            self.H = np.zeros((0, 3, 3))
+            self.valid = np.zeros(0, bool)
+        else:
+            self.H = np.asarray(np.memmap(self.path / H_FILE, np.float64, "r", shape=(n, 3, 3)))
+            self.valid = np.asarray(np.memmap(self.path / VALID_FILE, np.bool_, "r", shape=(n,)))
+        # row whose homography each frame uses (-1 before the first valid one)
+        self.source = np.maximum.accumulate(np.where(self.valid, np.arange(n), -1))
+
+    def __len__(self):
+        return len(self.H)
+
+    @property
+    def last_frame(self):
+        return self.first_frame + len(self) - 1
+
+    def __iter__(self):
+        """(frame_idx, H or None) per stored frame, as estimated (no hold)."""
+        for i, ok in enumerate(self.valid.tolist()):
+            yield self.first_frame + i, (self.H[i] if ok else None)
+
+    def held(self, start=None, end=None):
+        """(frames, H (m,3,3), ok (m,)) for frames start…end, failed frames holding the last valid H."""
+        lo = 0 if start is None else max(0, start - self.first_frame)
+        hi = len(self) if end is None else min(len(self), end - self.first_frame + 1)
+        src = self.source[lo:hi]
+        frames = np.arange(lo, hi) + self.first_frame
+        return frames, self.H[np.maximum(src, 0)], src >= 0
+
+    def warp(self, shapes, start=None, end=None):
+        """Warp {id: (k,2) reference pts} into frames start…end → (frames, {id: (m,k,2) float32}, ok)."""
+        frames, Hs, ok = self.held(start, end)
+        ids = list(shapes)
+        if not ids:
+            return frames, {}, ok
+        arrays = [np.asarray(shapes[i], np.float32).reshape(-1, 2) for i in ids]
+        pts = np.concatenate(arrays).reshape(-1, 1, 2)
+        out = np.zeros((len(frames), len(pts), 2), np.float32)
+        # all shapes go through one perspectiveTransform per frame
+        for i in np.flatnonzero(ok):
+            out[i] = cv2.perspectiveTransform(pts, Hs[i]).reshape(-1, 2)
+        cuts = np.cumsum([len(a) for a in arrays])[:-1]
+        return frames, dict(zip(ids, np.split(out, cuts, axis=1))), ok
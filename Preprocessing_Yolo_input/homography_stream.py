@@ -0,0 +1,167 @@
+"""
+homography_stream.py
+Streaming, parallel reference → frame homographies for a whole video
+without holding the decoded video in memory.
+
+    for idx, frame, H in stream_homographies(video_path, ref_frame):
+        ...                       # idx is 1-based, frames come in order
+
+Layout:
+  reader process   decodes the video into a ring of `slots` shared-memory
+                   frame buffers; it blocks when every slot is in use, so
+                   at most `slots` frames exist at any time
+  worker processes each build one HomographyEngine from the reference
+                   frame at start-up (the reference is pickled once per
+                   worker, not once per frame) and estimate H for the
+                   slots they are handed
+  caller           reassembles results in frame order and hands each slot
+                   back to the reader once the caller moves on
+
+With keyframe_gap > 0 the reader runs KeyframeSelector and only keyframes
+go to the workers; the frames in between are interpolated (keyframes.py).
+The last frame is always a keyframe.
+
+The yielded `frame` is a view into shared memory: it is valid until the
+next iteration, so copy it if it has to outlive the loop body.
+"""
+
+from multiprocessing import Process, Queue, cpu_count
+from multiprocessing.shared_memory import SharedMemory
+
+import cv2
+import numpy as np
+
+from homography import make_engine
+from keyframes import KeyframeSelector, interpolate_between
+
+
+def _ring(shm, slots, shape):
+    return np.ndarray((slots,) + shape, dtype=np.uint8, buffer=shm.buf)
+
+
+def _reader(video_path, shm_name, slots, shape, free_q, task_q, result_q,
+            n_workers, keyframe_gap):
+    shm = SharedMemory(name=shm_name)
+    ring = _ring(shm, slots, shape)
+    selector = KeyframeSelector(keyframe_gap) if keyframe_gap > 0 else None
+    cap = cv2.VideoCapture(video_path)
+
+    def dispatch(idx, slot, is_key):
+        if is_key:
+            task_q.put((idx, slot))
+        else:
+            result_q.put((idx, slot, None, False))
+
+    # each frame is dispatched one read late so the last one can be forced to a keyframe
+    held, idx = None, 0
+    while True:
+        slot = free_q.get()
+        ok, frm = cap.read()
+        if not ok:
+            free_q.put(slot)
+            break
+        idx += 1
+        ring[slot] = frm
+        is_key = selector is None or selector.is_keyframe(idx, frm)
+        if held is not None:
+            dispatch(*held)
+        held = (idx, slot, is_key)
+    if held is not None:
+        dispatch(held[0], held[1], True)
+
+    for _ in range(n_workers):
+        task_q.put(None)
+    result_q.put(("end", idx, None, None))
+    cap.release()
+    del ring
+    shm.close()
+
+
+def _worker(ref_frame, shm_name, slots, shape, task_q, result_q, engine_kw):
+    shm = SharedMemory(name=shm_name)
+    ring = _ring(shm, slots, shape)
+    engine = make_engine(ref_frame, **engine_kw)
+    while True:
+        task = task_q.get()
+        if task is None:
+            break
+        idx, slot = task
+        result_q.put((idx, slot, engine.estimate(ring[slot]), True))
+    del ring
+    shm.close()
+
+
+def stream_homographies(video_path, ref_frame, workers=None, slots=None,
+                        keyframe_gap=0, engine_kw=None):
+    """Yield (idx, frame, H) for every frame of `video_path`, in order (idx is 1-based)."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open {video_path}")
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    shape = (h, w, 3)
+    workers = workers or max(1, cpu_count() - 1)
+    # keyframe mode keeps the frames between two keyframes until both ends are known
+    slots = slots or (2 * workers + 2 + keyframe_gap)
+    engine_kw = dict(engine_kw or {})
+
+    shm = SharedMemory(create=True, size=slots * h * w * 3)
+    free_q, task_q, result_q = Queue(), Queue(), Queue()
+    for s in range(slots):
+        free_q.put(s)
+
+    procs = [Process(target=_reader, daemon=True,
+                     args=(video_path, shm.name, slots, shape, free_q, task_q, result_q,
+                           workers, keyframe_gap))]
+    procs += [Process(target=_worker, daemon=True,
+                      args=(ref_frame, shm.name, slots, shape, task_q, result_q, engine_kw))
+              for _ in range(workers)]
+    for p in procs:
+        p.start()
+
+    ring = _ring(shm, slots, shape)
+    try:
+        got = {}               # idx → (slot, H, is_key), waiting to be emitted
+        total = None           # frame count, known once the reader is done
+        next_idx, prev_key = 1, None
+        while total is None or next_idx <= total:
+            # emit the longest in-order run we can: a keyframe, or the
+            # non-key frames up to and including the next estimated keyframe
+            block = []
+            k = next_idx
+            while k in got and not got[k][2]:
+                k += 1
+            if k in got:
+                block = list(range(next_idx, k + 1))
+            if not block:
+                msg = result_q.get()
+                if msg[0] == "end":
+                    total = msg[1]
+                else:
+                    got[msg[0]] = msg[1:]
+                continue
+
+            slot_k, H_k, _ = got[k]
+            if prev_key is not None and len(block) > 1:
+                Hs = interpolate_between(prev_key[0], prev_key[1], k, H_k, (w, h)) + [H_k]
+            else:
+                Hs = [H_k] * len(block)
+            for idx, H in zip(block, Hs):
+                slot = got.pop(idx)[0]
+                yield idx, ring[slot], H
+                free_q.put(slot)
+            prev_key = (k, H_k)
+            next_idx = k + 1
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+            p.join()
+        del ring
+        try:
+            shm.close()
+        except BufferError:
+            pass          # the caller still holds a yielded frame view
+        shm.unlink()
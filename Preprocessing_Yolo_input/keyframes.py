@@ -0,0 +1,101 @@
+"""
+keyframes.py
+Keyframe-sparse homographies: estimate H only on keyframes and interpolate
+the frames in between.
+
+The drone drifts slowly, so a fresh homography every frame is wasted work.
+KeyframeSelector marks a frame as a keyframe when `max_gap` frames have
+passed since the last one, or earlier when a cheap drift check (phase
+correlation of a downsampled gray frame against the last keyframe) says the
+view moved more than `drift_px` full-resolution pixels.  Between two
+keyframes the four frame corners warped by each keyframe H are interpolated
+linearly and turned back into a homography, so every annotated shape
+(polygons, crossing lines, masks) moves smoothly from one keyframe position
+to the next.
+"""
+
+import cv2
+import numpy as np
+
+
+class KeyframeSelector:
+    def __init__(self, max_gap=25, drift_px=8.0, thumb_w=320):
+        self.max_gap = max_gap      # frames between forced keyframes
+        self.drift_px = drift_px    # shift (full-res px) since the last keyframe that forces one
+        self.thumb_w = thumb_w      # width of the drift-check thumbnail
+        self.scale = 1.0            # full-res px per thumbnail px
+        self.window = None
+        self.key_idx = None
+        self.key_thumb = None
+
+    def _thumb(self, frame):
+        h, w = frame.shape[:2]
+        tw = min(self.thumb_w, w)
+        th = max(1, round(h * tw / w))
+        if self.window is None:
+            self.scale = w / tw
+            self.window = cv2.createHanningWindow((tw, th), cv2.CV_32F)
+        small = cv2.resize(frame, (tw, th), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+    def drift(self, frame):
+        """Estimated shift (full-resolution px) of `frame` relative to the last keyframe."""
+        (dx, dy), _ = cv2.phaseCorrelate(self.key_thumb, self._thumb(frame), self.window)
+        return float(np.hypot(dx, dy)) * self.scale
+
+    def is_keyframe(self, idx, frame):
+        """Call once per frame, in order; True when `frame` should get a full estimate."""
+        if (self.key_idx is None or idx - self.key_idx >= self.max_gap
+                or self.drift(frame) > self.drift_px):
+            self.key_idx = idx
+            self.key_thumb = self._thumb(frame)
+            return True
+        return False
+
+
+def interpolate_between(k0, H0, k1, H1, size):
+    """Homographies for frames k0+1 … k1-1, lerping the frame corners from H0 to H1."""
+    n = k1 - k0 - 1
+    if H0 is None or H1 is None:
+        return [H0 if H0 is not None else H1] * n
+    w, h = size
+    corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+    c0 = cv2.perspectiveTransform(corners, H0).reshape(-1, 2)
+    c1 = cv2.perspectiveTransform(corners, H1).reshape(-1, 2)
+    out = []
+    for i in range(1, n + 1):
+        t = i / (k1 - k0)
+        ct = ((1 - t) * c0 + t * c1).astype(np.float32)
+        out.append(cv2.getPerspectiveTransform(corners.reshape(-1, 2), ct))
+    return out
+
+
+def keyframe_homographies(frames, engine, selector):
+    """Stream (idx, H) for every (idx, frame) in `frames`, estimating H on keyframes only.
+
+    Output is delayed until the next keyframe is known, so only the pending
+    frame indices are buffered, never the frames themselves.  The last frame
+    is always estimated so the tail is interpolated, not extrapolated.
+    """
+    prev = None              # (idx, H) of the last keyframe
+    pending = []             # frame indices waiting for the next keyframe
+    last = None              # (idx, frame) of the most recent non-key frame
+    size = None
+    for idx, frame in frames:
+        if size is None:
+            size = (frame.shape[1], frame.shape[0])
+        if not selector.is_keyframe(idx, frame):
+            pending.append(idx)
+            last = (idx, frame)
+            continue
+        H = engine.estimate(frame)
+        if prev is not None:
+            yield from zip(pending, interpolate_between(prev[0], prev[1], idx, H, size))
+        yield idx, H
+        prev, pending, last = (idx, H), [], None
+
+    if last is not None:
+        idx, frame = last
+        H = engine.estimate(frame)
+        yield from zip(pending[:-1], interpolate_between(prev[0], prev[1], idx, H, size))
+        yield idx, H
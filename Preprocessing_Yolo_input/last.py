@@ -11,10 +11,19 @@ id    – ROI name (e.g. ID‑1, Right, …)
 """
 
 from ultralytics import YOLO
-import cv2, csv, json
+import cv2
 from pathlib import Path
 import numpy as np
 
+from polygon_tracks import open_tracks
+from detection import read_strided, infer, to_records
+from roi_index import RoiLabelMap
+from event_log import EventLog
+from stride import StridePolicy, watch_lights
+from roi_crops import CropPlanner, CroppedModel
+from light_panels import LightPanels
+from pipeline import Pipeline
+
 # ------------------------------------------------------------------
 # 1) paths
 # ------------------------------------------------------------------
@@ -25,80 +34,39 @@ MODEL_PT = "best.pt"
 POLY_CSV = "polygons.csv"  # a sheet in which has the polygon for each intersection
 OUT_DIR = Path("outputs_video")  # the output directory in which output will be saved
 OUT_DIR.mkdir(parents=True, exist_ok=True)
-LIGHT_DIR = OUT_DIR / "original_lights"
-LIGHT_DIR.mkdir(exist_ok=True)
 
 VIDEO_OUT = OUT_DIR / "annotated.mp4"  # annotated output video
-COUNTS_DIR = OUT_DIR / "counts"  # output text files that's going to hold the cars count dictionaries
-COUNTS_DIR.mkdir(exist_ok=True)
+EVENTS_LOG = OUT_DIR / "events.jsonl"  # one {"kind": "frame", "frame", "cars", "lights"} line per frame (event_log.py)
+
+BATCH_SIZE = 8  # frames per YOLO call (1 = one call per frame); see benchmark_detection.py
+QUEUE_SIZE = 4  # batches queued between the decode / infer / post / encode stages (pipeline.py)
+STRIDE = 1  # >1: detect only every STRIDE frames while all lights are red and counts hold (stride.py)
+STRIDE_GUARD = 30  # frames detected at full rate after a yellow/green light or a light change
+WRITE_SKIPPED = True  # write the frames skipped by the stride too (False: grab them undecoded, the video holds detected frames only)
+LIGHT_HOLD = 3  # frames a new panel colour must persist before the light state changes (light_panels.py)
+ROI_CROPS = False  # detect only on crops around the polygons and light panels (roi_crops.py, benchmark_crops.py)
 
 """
 ------------------------------------------------------------------
-2) load polygon ROIs  →  {frame_idx: [(id, np.ndarray[4,2]), …], …}
+2) load polygon ROIs  →  tracks.polys(frame_idx) = [(id, np.ndarray[4,2]), …]
 
-- Creates empty dictionary:
-- The keys of the dictionary are int, representing frame numbers.
-- The values are a list of tuple[str, np.ndarray], where:
+- polygons.csv is converted once into polygons.tracks/ (see polygon_tracks.py),
+  later runs only memory-map it instead of re-parsing the CSV.
+- tracks.polys(frame_idx) returns a list of tuple[str, np.ndarray] for that frame:
 - str is the polygon ID (like 'ID‑1', 'Right', etc.)
-- {
-  1: [
-    ('ID-1', array([[ 956,  571],
-                    [ 969,  610],
-                    [1502,  402],
-                    [1477,  359]], dtype=int32)),
-    ('ID-2', array([[ 921,  587],
-                    [ 892,  600],
-                    [ 789,  335],
-                    [ 814,  312]], dtype=int32)),
-    ('ID-3', array([[ 894,  644],
-                    [ 914,  688],
-                    [ 409,  976],
-                    [ 378,  931]], dtype=int32)),
-    ('ID-4', array([[ 949,  667],
-                    [ 978,  655],
-                    [1010,  902],
-                    [ 971,  905]], dtype=int32))
-  ],
-  2: [
-    ('ID-1', array([[ 956,  571],
-                    [ 968,  610],
-                    [1501,  402],
-                    [1477,  359]], dtype=int32)),
-    ('ID-2', array([[ 921,  587],
-                    [ 892,  601],
-                    [ 789,  335],
-                    [ 815,  312]], dtype=int32)),
-    ('ID-3', array([[ 894,  644],
-                    [ 913,  688],
-                    [ 409,  976],
-                    [ 377,  932]], dtype=int32)),
-    ('ID-4', array([[ 949,  667],
-                    [ 978,  655],
-                    [1008,  902],
-                    [ 970,  905]], dtype=int32))
+- the arrays are float32 views into the mapped file, e.g. frame 1:
+  [
+    ('ID-1', array([[ 956.,  571.],
+                    [ 969.,  610.],
+                    [1502.,  402.],
+                    [1477.,  359.]], dtype=float32)),
+    ('ID-2', array([[ 921.,  587.], …], dtype=float32)),
+    …
   ]
-}
+- frames with no rows in the CSV return []
 ------------------------------------------------------------------
 """
-#                   1               ID-1  ([],[],[],[])
-poly_by_frame: dict[int, list[tuple[str, np.ndarray]]] = {}
-
-# store the values of the csv file, into the dictionary "poly_by_frame"
-with open(POLY_CSV, newline="") as f:
-    rdr = csv.DictReader(f)
-    for row in rdr:
-        fidx = int(row["frame"])  # 1‑based in sheet
-        ident = row["id"]
-        pts = np.array(
-            [
-                [int(row["x1"]), int(row["y1"])],
-                [int(row["x2"]), int(row["y2"])],
-                [int(row["x3"]), int(row["y3"])],
-                [int(row["x4"]), int(row["y4"])],
-            ],
-            dtype=np.int32,
-        )
-        poly_by_frame.setdefault(fidx, []).append((ident, pts))
+tracks = open_tracks(POLY_CSV)
 
 # pick some colours
 COLOURS = [(0, 255, 0), (0, 128, 255), (255, 0, 0), (128, 0, 255), (0, 255, 255), (255, 0, 255), (255, 255, 0)]
@@ -121,9 +89,6 @@ TRAFFIC_LIGHT_STATE_COLOUR = {
     "unknown": (128, 128, 128)
 }
 
-# priority if two colours are detected on the same pole in one frame
-PRIORITY = {"red": 3, "yellow": 2, "green": 1}
-
 # ------------------------------------------------------------------
 # 3) YOLO
 # ------------------------------------------------------------------
@@ -139,51 +104,19 @@ w, h = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HE
 fps = cap.get(cv2.CAP_PROP_FPS) or 30
 writer = cv2.VideoWriter(str(VIDEO_OUT), cv2.VideoWriter_fourcc(*"mp4v"), fps,
                          (w, h))  # To write frames -> output video
+roi_map = RoiLabelMap((h, w))  # polygon label map for the car counts (roi_index.py)
+events = EventLog(EVENTS_LOG)  # per-frame car counts & light states
+panels = LightPanels(traffic_light_polygons, hold=LIGHT_HOLD)  # light states from the panel pixels
+if ROI_CROPS:
+    # boxes come back in frame coordinates; the plan follows the polygons of the last handled frame
+    planner = CropPlanner((w, h), panels=[(x, y, pw, ph) for _, x, y, pw, ph in traffic_light_polygons])
+    model = CroppedModel(model, planner)
 
 # ------------------------------------------------------------------
 # 5) main loop
 # ------------------------------------------------------------------
-# SKIP_EVERY = 5
-frame_idx = 1  # 1‑based to match CSV
-
-while True:
-    ok, frame = cap.read()
-    if not ok: break  # leave loop when there is no frames left
-
-    # inside while-loop, right after you read the frame
-    tl_state = {name: "unknown" for name, *_ in traffic_light_polygons}
-    tl_score = {name: 0.0 for name in tl_state}
-
-    # ── get polygons for this frame; fall back to last known if missing ──
-    if frame_idx in poly_by_frame:
-        polys = poly_by_frame[frame_idx]
-        last_polys = polys  # keep a copy in case next frame missing
-    else:
-        polys = last_polys  # use previous set
-
-    # build a dict {id:0}
-    counts = {pid: 0 for pid, _ in polys}  # looks like: {'ID-1': 0, 'ID-2': 0, 'ID-3': 0, 'ID-4': 0}
-
-    # ── detect cars/traffic lights ──
-    res = model(frame, conf=0.20, verbose=False)
-    boxes = res[0].boxes
-
-    # ── tally cars per polygon ──
-    for box in boxes:
-        cls_id = int(box.cls[0])  # car class
-
-        if cls_id != 0:  # skip non-car class detections
-            continue
-
-        x1, y1, x2, y2 = box.xyxy[0]
-        cx, cy = float((x1 + x2) / 2), float((y1 + y2) / 2)
-
-        for pid, poly in polys:
-            # cv2.pointPolygonTest returns +1, 0, -1 (inside, on edge, outside)
-            if cv2.pointPolygonTest(poly, (cx, cy), measureDist=False) >= 0:
-                counts[pid] += 1
-                break
-
+def annotate(frame, res, polys, counts, tl_state):
+    """Draw the polygons with their counts, the YOLO boxes of `res` and the light states on `frame`."""
     # ── draw polygons & counts ──
     for i, (pid, poly) in enumerate(polys):
         # print(i) # 0,1,...
@@ -201,7 +134,7 @@ while True:
         text_y = 40 + i * 40  # stack each line 30px apart
         cv2.putText(
             frame,  # frame to draw on
-            f"{pid}: {counts[pid]}",  # text to draw
+            f"{pid}: {counts.get(pid, 0)}",  # text to draw
             (text_x, text_y),  # position
             cv2.FONT_HERSHEY_SIMPLEX,
             1.0,  # font scale
@@ -210,7 +143,8 @@ while True:
         )
 
     # draw YOLO boxes without labels/conf
-    frame = res[0].plot(img=frame, labels=False, line_width=2)
+    if res is not None:
+        frame = res.plot(img=frame, labels=False, line_width=2)
 
     # drawing boxes around traffic lights (optional)
     # for i, (tl_id, x, y, w, h) in enumerate(traffic_light_boxes):
@@ -224,33 +158,6 @@ while True:
     #     cv2.putText(frame, tl_id, (x + 4, y - 6),
     #                 cv2.FONT_HERSHEY_SIMPLEX, 0.5, colour, 1)
 
-    for det in boxes:
-        cls_id = int(det.cls[0])  # 1=green, 2=red, 3=yellow
-        if cls_id not in (1, 2, 3):
-            continue  # skip cars etc.
-
-        # map numeric class → colour string
-        colour_str = {1: "green", 2: "red", 3: "yellow"}[cls_id]
-
-        # centre of YOLO box
-        x1, y1, x2, y2 = det.xyxy[0]
-        cx, cy = float((x1 + x2) / 2), float((y1 + y2) / 2)
-
-        conf = float(det.conf[0])  # confidence
-
-        # find which pole the centre falls into
-        for name, px, py, pw, ph in traffic_light_polygons:
-            if px <= cx <= px + pw and py <= cy <= py + ph:
-                # accept new state if (a) state was unknown, (b) new colour has
-                # higher PRIORITY than existing, or (c) same colour but higher conf
-                old_col = tl_state[name]
-                if (old_col == "unknown" or
-                        PRIORITY[colour_str] > PRIORITY.get(old_col, 0) or
-                        (colour_str == old_col and conf > tl_score[name])):
-                    tl_state[name] = colour_str
-                    tl_score[name] = conf
-                break  # stop checking other poles
-
     # ------------------------------------------------------------------
     # draw the traffic-light rectangles with colour coded by state
     # ------------------------------------------------------------------
@@ -260,30 +167,79 @@ while True:
         cv2.rectangle(frame, (px, py), (px + pw, py + ph), colour, 2)
         cv2.putText(frame, f"{name}:{state}", (px + 2, py - 6),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, colour, 1)
+    return frame
+
+
+# decoding, YOLO (BATCH_SIZE frames per call) and video encoding run in their own threads;
+# the loop below handles the frames one by one in order; frame_idx is 1-based to match CSV.
+# The light panels are read in the decode thread (watch_lights), so a light change ends the
+# stride before the next batch is planned, not a pipeline depth later (stride.py)
+policy = StridePolicy(k=STRIDE, guard=STRIDE_GUARD)
+pipe = Pipeline(maxsize=QUEUE_SIZE)
+plans = read_strided(cap, policy, BATCH_SIZE, decode_skipped=WRITE_SKIPPED)
+batches = pipe.source("decode", watch_lights(plans, panels, policy))
+batches = pipe.stage("infer", lambda plan: infer(model, plan, conf=0.20, verbose=False), batches)
+encode = pipe.sink("encode", writer.write)
+frame_idx = 0  # frames handled so far, also when the video yields none
+last_polys = []
+last_res, counts, tl_state = None, {}, None
+try:
+    try:
+        for frame_idx, frame, res, states in pipe.consume("post", batches, unbatch=True):
+            if frame_idx % 100 == 1 and frame_idx > 1:
+                print(f"[INFO] processed {frame_idx - 1} frames…")
+
+            # light state per pole from the panel pixels, read before anything is drawn
+            # (not the detector's light classes); a grabbed frame keeps the last one
+            if states is not None:
+                tl_state = states
+
+            # ── get polygons for this frame; fall back to last known if missing ──
+            polys = [(pid, poly.astype(np.int32)) for pid, poly in tracks.polys(frame_idx)]
+            if polys:
+                last_polys = polys  # keep a copy in case next frame missing
+            else:
+                polys = last_polys  # use previous set
+
+            if res is None:
+                # skipped by the stride: counts hold; a decoded frame (WRITE_SKIPPED) is written
+                # with the last detections drawn on it, a grabbed one is left out of the video
+                if frame is not None:
+                    encode(annotate(frame, last_res, polys, counts, tl_state))
+                events.append("frame", frame=frame_idx, cars=counts, lights=tl_state, skipped=True)
+                continue
+
+            if ROI_CROPS:
+                planner.update(polys)
+
+            # ── cars/traffic lights detected in this frame: one row per box (cls, cx, cy, w, h, conf) ──
+            dets = to_records(res.boxes)
+
+            # ── tally cars per polygon ──
+            # each car centre counts for the first polygon containing it, edges included
+            # (pointPolygonTest >= 0); the label map only re-rasterizes when polys change
+            roi_map.update(polys)
+            cars = dets[dets["cls"] == 0]  # car class only
+            counts = roi_map.count(np.stack([cars["cx"], cars["cy"]], axis=1))
+
+            # ── save frame & counts ──
+            encode(annotate(frame, res, polys, counts, tl_state))
+            last_res = res
+
+            # Combine car counts and light states in one event of the log
+            events.append("frame", frame=frame_idx,
+                          cars=counts,  # {'ID-1': 12, …}
+                          lights=tl_state)  # {'ID-1': 'green', …}
+            policy.update(frame_idx, tl_state, counts)
+    finally:
+        pipe.close()  # the encoder has written every frame; on an error, also stops the other stages
+    pipe.report()
+    events.append("pipeline", stages=pipe.summary())
+    events.append("stride", k=STRIDE, frames=frame_idx, detected=policy.detected)
+finally:
+    cap.release()
+    writer.release()
+    events.close()
 
-        # ── save frame & counts ──
-    writer.write(frame)
-    (COUNTS_DIR / f"frame_{frame_idx:06d}.txt").write_text(json.dumps(counts))
-
-    # # skip frames quickly (≈6× faster)
-    # for _ in range(SKIP_EVERY):
-    #     if not cap.grab(): break
-    #     frame_idx += 1
-
-    # Combine car counts and light states in one record
-    record = {
-        "cars": counts,  # {'ID-1': 12, …}
-        "lights": tl_state  # {'ID-1': 'green', …}
-    }
-    (LIGHT_DIR / f"frame_{frame_idx:06d}.json").write_text(json.dumps(record))
-
-    frame_idx += 1
-
-    if frame_idx % 100 == 1:
-        print(f"[INFO] processed {frame_idx - 1} frames…")
-
-# ------------------------------------------------------------------
-cap.release();
-writer.release()
 print(f"[DONE] annotated video  →  {VIDEO_OUT}")
-print(f"[DONE] per‑frame counts →  {COUNTS_DIR}")
\ No newline at end of file
+print(f"[DONE] per‑frame counts →  {EVENTS_LOG}")
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""
+light_panels.py
+Traffic-light states read straight from the fixed panel rectangles, in
+place of the detector's light classes (1 green, 2 red, 3 yellow).
+
+    panels = LightPanels(traffic_light_polygons)     # [(name, x, y, w, h), …]
+    tl_state = panels.read(frame)                    # {"ID-1": "red", …}
+
+A panel's colour is the HSV rule of detect_light_state() in the red-light
+code (hsv_state() below): a pixel is red / yellow / green when it lies in
+the cv2.inRange() box of (10, 50, 40) around the (h, s, v) centres below,
+clamped to [0, 179] / [0, 255] (no hue wrap), and the colour with the
+largest mask wins, red before yellow before green on a tie.  The boxes
+do not overlap, so every BGR colour is in at most one of them.  The rule
+is evaluated once (on first use, ~16 MB) for every 24-bit BGR colour,
+which gives a lookup table colour → class.  Per frame each panel crop is
+only indexed into the table and counted, with no HSV conversion.  A panel
+whose lit pixels are fewer than `min_lit` of its area reads "unknown";
+with min_lit=0 classify() gives exactly detect_light_state(), which
+--check verifies on random panels.
+
+Hysteresis: a panel takes a new colour only after it was read `hold`
+frames in a row; "unknown" readings keep the current state.  read() does
+not need the detector, so it also runs on frames the detection stride
+skips (detect_strided(..., decode_skipped=True)).
+
+    python light_panels.py VIDEO [--frames 600]    # state changes and µs per frame
+    python light_panels.py --check [--panels 2000] # classify() against hsv_state()
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+STATES = ("unknown", "red", "yellow", "green")      # lookup table codes
+HSV_CENTRES = {"red": (3, 255, 255), "yellow": (28, 255, 255), "green": (60, 255, 217)}
+HSV_MARGIN = (10, 50, 40)
+_LUT = None
+
+
+def _bounds(name):
+    """Clamped (lower, upper) HSV bounds of colour `name`, as detect_light_state() passes them to cv2.inRange()."""
+    centre, margin = np.array(HSV_CENTRES[name]), np.array(HSV_MARGIN)
+    return np.maximum(centre - margin, 0), np.minimum(centre + margin, (179, 255, 255))
+
+
+def hsv_state(img):
+    """detect_light_state() of the red-light code, lower-case: the colour whose HSV mask covers most of `img`."""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    sums = {name: np.sum(cv2.inRange(hsv, *_bounds(name))) for name in STATES[1:]}
+    return max(sums, key=sums.get)
+
+
+def lut():
+    """uint8 table of 2**24 entries, built on first use: BGR packed as b | g << 8 | r << 16 → index into STATES."""
+    global _LUT
+    if _LUT is None:
+        table = np.zeros(1 << 24, np.uint8)
+        gb = np.arange(1 << 16, dtype=np.uint32)
+        bgr = np.empty((1, 1 << 16, 3), np.uint8)
+        bgr[0, :, 0], bgr[0, :, 1] = gb & 0xFF, gb >> 8
+        bounds = [_bounds(name) for name in STATES[1:]]
+        for r in range(256):        # one red value (65536 colours) at a time
+            bgr[0, :, 2] = r
+            hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+            codes = table[r << 16:(r + 1) << 16]
+            for code, (lo, hi) in enumerate(bounds, start=1):
+                match = cv2.inRange(hsv, lo, hi)[0] > 0
+                assert not (codes[match]).any(), "HSV colour boxes overlap"
+                codes[match] = code
+        _LUT = table
+    return _LUT
+
+
+class LightPanels:
+    def __init__(self, panels, hold=3, min_lit=0.02):
+        self.panels = [(name, int(x), int(y), int(w), int(h)) for name, x, y, w, h in panels]
+        self.hold = hold            # consecutive readings before a state change is taken
+        self.min_lit = min_lit      # share of a panel's pixels that must match a colour
+        self.state = {name: "unknown" for name, *_ in self.panels}
+        self._pending = {name: ("unknown", 0) for name in self.state}
+        lut()
+
+    def classify(self, frame):
+        """Raw colour of each panel in `frame`, without hysteresis."""
+        table = lut()
+        out = {}
+        for name, x, y, w, h in self.panels:
+            # BGRA pixels read as uint32 are b | g << 8 | r << 16 | a << 24
+            bgra = cv2.cvtColor(np.ascontiguousarray(frame[y:y + h, x:x + w]), cv2.COLOR_BGR2BGRA)
+            codes = np.take(table, bgra.view(np.uint32) & 0xFFFFFF)
+            counts = [np.count_nonzero(codes == code) for code in range(1, len(STATES))]
+            best = int(np.argmax(counts))
+            out[name] = STATES[best + 1] if counts[best] >= self.min_lit * codes.size else "unknown"
+        return out
+
+    def read(self, frame):
+        """Panel name → state for `frame`, after hysteresis."""
+        for name, colour in self.classify(frame).items():
+            if colour == "unknown" or colour == self.state[name]:
+                self._pending[name] = ("unknown", 0)
+                continue
+            seen, n = self._pending[name]
+            n = n + 1 if seen == colour else 1
+            if n >= self.hold:
+                self.state[name] = colour
+                n = 0
+            self._pending[name] = (colour, n)
+        return dict(self.state)
+
+
+def check(n_panels, seed=0):
+    """classify() with min_lit=0 against hsv_state() on random panels; returns the number that differ."""
+    rng = np.random.default_rng(seed)
+    panels = LightPanels([("P", 0, 0, 40, 130)], min_lit=0)
+    names = list(HSV_CENTRES)
+    bad = 0
+    for _ in range(n_panels):
+        # around 1-3 of the centres, margins ±2x (hue wrapping past 0 / 179), plus uniform noise
+        hsv = rng.integers(0, 256, (130, 40, 3))
+        for name in rng.choice(names, rng.integers(1, 4), replace=False):
+            m = rng.random((130, 40)) < rng.random()
+            hsv[m] = np.array(HSV_CENTRES[name]) + rng.integers(-2, 3, (m.sum(), 3)) * HSV_MARGIN
+        hsv[..., 0] %= 180
+        img = cv2.cvtColor(np.clip(hsv, 0, 255).astype(np.uint8), cv2.COLOR_HSV2BGR)
+        bad += panels.classify(img)["P"] != hsv_state(img)
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Panel light states of a video, with timing")
+    ap.add_argument("video", nargs="?")
+    ap.add_argument("--frames", type=int, default=600)
+    ap.add_argument("--hold", type=int, default=3)
+    ap.add_argument("--check", action="store_true", help="compare with detect_light_state() on random panels")
+    ap.add_argument("--panels", type=int, default=2000, help="random panels for --check")
+    args = ap.parse_args()
+    if args.check:
+        bad = check(args.panels)
+        print(f"{args.panels} random panels, {bad} differ from detect_light_state()")
+        raise SystemExit(bad > 0)
+    if args.video is None:
+        ap.error("VIDEO is required unless --check is given")
+
+    panels = LightPanels([("ID-1", 15, 83, 40, 130), ("ID-2", 105, 83, 40, 130),
+                          ("ID-3", 180, 83, 40, 130), ("ID-4", 270, 83, 40, 130)], hold=args.hold)
+    cap = cv2.VideoCapture(args.video)
+    prev, secs, n = None, 0.0, 0
+    while n < args.frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        n += 1
+        t0 = time.perf_counter()
+        state = panels.read(frame)
+        secs += time.perf_counter() - t0
+        if state != prev:
+            print(f"{n:>7}  " + "  ".join(f"{k}:{v}" for k, v in state.items()))
+            prev = state
+    cap.release()
+    print(f"{n} frames, {secs / max(n, 1) * 1e6:.0f} µs per frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import math
 import numpy as np
 import pprint
 
+from schedule import compile_schedule
+
 # === VIDEO & SCHEDULE PARAMETERS ===
 fps = 30
 total_frames = 895 * fps    # 45 525 frames in a 895-second video
@@ -77,4 +79,9 @@ while cycle_start < total_frames:
 
 # === PRINT THE HYBRID SCHEDULE ===
 print("Hybrid traffic_light_schedule:")
-pprint.pprint(schedule)
\ No newline at end of file
+pprint.pprint(schedule)
+
+# === COMPILE TO A PER-FRAME STATE TABLE (75-frame yellow lead/lag) ===
+timeline = compile_schedule(schedule, lead=75, lag=75, n_frames=total_frames)
+timeline.save("hybrid_schedule.timeline")
+print(f"Saved hybrid_schedule.timeline ({len(timeline.lights)} lights x {timeline.n_frames} frames)")
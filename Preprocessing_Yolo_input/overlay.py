@@ -0,0 +1,104 @@
+"""
+overlay.py
+Drawing helpers shared by the overlay scripts (test.py, OOO.py, Test2.py,
+testtest.py).
+
+SpriteCache renders an overlay element (a traffic-light panel with its
+label and arrows) once per key and alpha-blits the pre-composited pixels on
+every later frame, instead of redrawing the rectangle, circles, text and
+arrows from primitives per frame and light:
+
+    panels = SpriteCache(draw_panel)          # draw_panel(img, key) paints one key
+    panels.blit(frame, (lid, colours, state))
+
+Any hashable key works, so lerped colours (finalcodeforprocessing.txt) get
+one sprite per blend step by keying on the colour triple.  A sprite is
+found by drawing the key on a black and on a white canvas: pixels that come
+out the same are covered, and the difference gives the coverage of
+anti-aliased edges, which are blended per pixel.  The blit reproduces what
+the primitives would have drawn on the frame.
+
+Preview shows the frames in a window at most `max_fps` times per second
+(every frame with None, never with 0), so the written output_video.mp4 is
+not held back by resizing and imshow.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+
+class SpriteCache:
+    def __init__(self, draw):
+        self.draw = draw        # draw(img, key) paints the element for `key` onto img
+        self.sprites = {}       # (key, frame shape) → (y0, x0, colour, opaque mask, edge pixels)
+
+    def blit(self, frame, key):
+        """Composite the sprite for `key` onto `frame` in place, rendering it on first use."""
+        sprite = self.sprites.get((key, frame.shape))
+        if sprite is None:
+            sprite = self.sprites[(key, frame.shape)] = self._render(frame.shape, key)
+        y0, x0, colour, opaque, edge = sprite
+        roi = frame[y0:y0 + colour.shape[0], x0:x0 + colour.shape[1]]
+        if opaque is None:
+            roi[:] = colour
+        else:
+            cv2.copyTo(colour, opaque, roi)
+        if edge is not None:
+            # partly covered pixels: premultiplied colour + what shows through
+            idx, premult, keep = edge
+            if frame.flags.c_contiguous:
+                flat = frame.reshape(-1)
+                flat.put(idx, (premult + flat.take(idx) * keep + 0.5).astype(np.uint8))
+            else:
+                at = np.unravel_index(idx, frame.shape)
+                frame[at] = (premult + frame[at] * keep + 0.5).astype(np.uint8)
+
+    def _render(self, shape, key):
+        black = np.zeros(shape, np.uint8)
+        white = np.full(shape, 255, np.uint8)
+        self.draw(black, key)
+        self.draw(white, key)
+        # touched pixels differ by less than the 255 of bare background
+        diff = cv2.absdiff(white, black)
+        diff = cv2.max(cv2.max(diff[..., 0], diff[..., 1]), diff[..., 2])
+        x0, y0, w, h = cv2.boundingRect(cv2.compare(diff, 255, cv2.CMP_LT))
+        diff, colour = diff[y0:y0 + h, x0:x0 + w], black[y0:y0 + h, x0:x0 + w].copy()
+
+        opaque = (diff == 0).astype(np.uint8)
+        if opaque.all():
+            opaque = None
+        ys, xs = np.nonzero((diff > 0) & (diff < 255))
+        edge = None
+        if len(ys):
+            # the black canvas holds colour·coverage, the white one adds 255·(1 − coverage);
+            # kept as flat (pixel, channel) indices into the frame
+            idx = np.ravel_multi_index(
+                (np.repeat(ys + y0, 3), np.repeat(xs + x0, 3), np.tile(np.arange(3), len(ys))), shape)
+            keep = np.repeat(diff[ys, xs].astype(np.float32) / 255, 3)
+            edge = (idx, colour[ys, xs].reshape(-1).astype(np.float32), keep)
+        return y0, x0, colour, opaque, edge
+
+
+class Preview:
+    def __init__(self, name, size=None, max_fps=10):
+        self.name = name
+        self.size = size            # on-screen (w, h); None shows frames unscaled
+        self.max_fps = max_fps      # None = every frame, 0 = no window at all
+        self.last = None
+
+    def show(self, frame):
+        """Show `frame` if the refresh cap allows; returns the key pressed (-1 for none)."""
+        if self.max_fps == 0:
+            return -1
+        now = time.perf_counter()
+        if self.max_fps and self.last is not None and now - self.last < 1 / self.max_fps:
+            return -1
+        if self.last is None:
+            cv2.namedWindow(self.name, cv2.WINDOW_NORMAL)
+        self.last = now
+        if self.size is not None:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_LINEAR)
+        cv2.imshow(self.name, frame)
+        return cv2.waitKey(1) & 0xFF
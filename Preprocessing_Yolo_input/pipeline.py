@@ -0,0 +1,234 @@
+"""
+pipeline.py
+Staged frame pipeline: decode, inference, post-processing and encoding
+each run in their own worker, linked by bounded queues.
+
+    pipe = Pipeline(maxsize=4)
+    batches = pipe.source("decode", read_strided(cap, policy, BATCH_SIZE))
+    batches = pipe.stage("infer", lambda plan: infer(model, plan, conf=0.2), batches)
+    encode = pipe.sink("encode", writer.write)
+    for idx, frame, res in pipe.consume("post", batches, unbatch=True):
+        ...                     # counting, light states, tracking, drawing
+        encode(frame)
+    pipe.close()                # drains the sinks, joins the workers
+    pipe.report()
+
+source/stage/sink workers are threads (cv2 decode/encode and torch
+inference release the GIL); the consume() loop is the post-processing
+worker, in the calling thread.  Every stage has one worker and every
+queue is FIFO, so items come out in the order the source made them.  A
+queue holds at most `maxsize` items, so at most about
+(stages + 1) * maxsize batches are in flight; a stage that runs ahead
+blocks on its full output queue.  Anything decided in the post loop that
+the source reads (e.g. the StridePolicy stride) reaches it up to that many
+batches late.
+
+An exception in a worker stops the pipeline and is raised again from
+consume(), from the sink callable or from close().  Leaving the consume()
+loop early (break, or an exception in its body) stops the sources and
+stages too; close() still lets the sinks finish what was queued for them,
+joins every worker and drops the items left in the other queues.  Call
+close() in a `finally`.
+
+Per stage, report() prints the items handled, the throughput over the
+stage's lifetime, the share of time it was busy, starved (waiting for
+input) and blocked (waiting for room downstream), and the mean / max
+occupancy of its input queue.  The busiest stage is the bottleneck, and
+the queue in front of it stays full.
+summary() returns the same as a dict for the event log.
+"""
+
+import queue
+import threading
+import time
+
+_END = object()
+_KINDS = ("source", "stage", "consume", "sink")
+
+
+class StageStats:
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        self.items = 0
+        self.busy = self.starved = self.blocked = 0.0
+        self.q_sum = self.q_max = self.q_n = 0     # occupancy of the input queue, sampled per get
+        self.t0 = self.t1 = None
+
+    def as_dict(self):
+        span = max((self.t1 or time.perf_counter()) - (self.t0 or time.perf_counter()), 1e-9)
+        return {"items": self.items, "per_s": self.items / span,
+                "busy": self.busy / span, "starved": self.starved / span, "blocked": self.blocked / span,
+                "q_mean": self.q_sum / self.q_n if self.q_n else None, "q_max": self.q_max if self.q_n else None}
+
+
+class Pipeline:
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self.stats = {}                 # stage name → StageStats, in pipeline order
+        self._threads = []
+        self._sinks = []                # input queues of the sinks
+        self._queues = []               # every other queue
+        self._stop = threading.Event()
+        self._error = None
+
+    def _start(self, name, kind, target, *args):
+        st = self.stats[name] = StageStats(name, kind)
+        t = threading.Thread(target=self._run, args=(st, target, *args), name=name, daemon=True)
+        self._threads.append(t)
+        t.start()
+        return st
+
+    def _run(self, st, target, *args):
+        st.t0 = time.perf_counter()
+        try:
+            target(st, *args)
+        except BaseException as exc:           # handed to the consumer
+            self._error = self._error or exc
+            self._stop.set()
+        finally:
+            st.t1 = time.perf_counter()
+
+    def _get(self, q, st, drain=False):
+        n = q.qsize()
+        st.q_sum, st.q_max, st.q_n = st.q_sum + n, max(st.q_max, n), st.q_n + 1
+        t = time.perf_counter()
+        while True:
+            if self._stop.is_set() and not drain:     # sinks finish what is queued, the others stop
+                item = _END
+                break
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._stop.is_set():
+                    item = _END
+                    break
+        st.starved += time.perf_counter() - t
+        return item
+
+    def _put(self, q, item, st):
+        t = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        if st is not None:
+            st.blocked += time.perf_counter() - t
+
+    def source(self, name, iterable):
+        """Queue fed with the items of `iterable`, read by a worker."""
+        out = queue.Queue(self.maxsize)
+        self._queues.append(out)
+
+        def run(st):
+            it = iter(iterable)
+            try:
+                while not self._stop.is_set():
+                    t = time.perf_counter()
+                    item = next(it, _END)
+                    st.busy += time.perf_counter() - t
+                    if item is _END:
+                        break
+                    st.items += 1
+                    self._put(out, item, st)
+            finally:
+                self._put(out, _END, st)
+
+        self._start(name, "source", run)
+        return out
+
+    def stage(self, name, fn, inbox):
+        """Queue of fn(item) for every item of `inbox`, mapped by a worker."""
+        out = queue.Queue(self.maxsize)
+        self._queues.append(out)
+
+        def run(st):
+            try:
+                while True:
+                    item = self._get(inbox, st)
+                    if item is _END:
+                        break
+                    t = time.perf_counter()
+                    item = fn(item)
+                    st.busy += time.perf_counter() - t
+                    st.items += 1
+                    self._put(out, item, st)
+            finally:
+                self._put(out, _END, st)
+
+        self._start(name, "stage", run)
+        return out
+
+    def sink(self, name, fn):
+        """Callable queueing its argument for fn(item) in a worker."""
+        inbox = queue.Queue(self.maxsize)
+
+        def run(st):
+            while True:
+                item = self._get(inbox, st, drain=True)
+                if item is _END:
+                    break
+                t = time.perf_counter()
+                fn(item)
+                st.busy += time.perf_counter() - t
+                st.items += 1
+
+        def put(item):
+            if self._error is not None:
+                raise self._error
+            self._put(inbox, item, None)
+
+        self._start(name, "sink", run)
+        self._sinks.append(inbox)
+        return put
+
+    def consume(self, name, inbox, unbatch=False):
+        """Items of `inbox` in order (each item's elements with `unbatch`), handled by the caller."""
+        st = self.stats[name] = StageStats(name, "consume")
+        st.t0 = time.perf_counter()
+        try:
+            while True:
+                item = self._get(inbox, st)
+                if item is _END:
+                    break
+                for x in (item if unbatch else (item,)):
+                    t = time.perf_counter()
+                    yield x
+                    st.busy += time.perf_counter() - t
+                    st.items += 1
+        finally:
+            st.t1 = time.perf_counter()
+            self._stop.set()        # nothing reads the other queues any more
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """Drain the sinks, stop and join every worker; raises the first worker error."""
+        for inbox in self._sinks:
+            self._put(inbox, _END, None)
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        for q in self._queues:      # items nobody consumed (frames, results) are dropped
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+        if self._error is not None:
+            raise self._error
+
+    def summary(self):
+        """Stage name → stats dict, in pipeline order (source, stages, consumer, sinks)."""
+        order = sorted(self.stats.values(), key=lambda st: _KINDS.index(st.kind))
+        return {st.name: st.as_dict() for st in order}
+
+    def report(self):
+        print(f"{'stage':<10}{'items':>8}{'per s':>9}{'busy':>7}{'starved':>9}{'blocked':>9}{'q mean':>8}{'q max':>7}")
+        for name, d in self.summary().items():
+            q = f"{d['q_mean']:>8.1f}{d['q_max']:>7}" if d["q_mean"] is not None else f"{'-':>8}{'-':>7}"
+            print(f"{name:<10}{d['items']:>8}{d['per_s']:>9.1f}{d['busy']:>7.0%}{d['starved']:>9.0%}"
+                  f"{d['blocked']:>9.0%}{q}")
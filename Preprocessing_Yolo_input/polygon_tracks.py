@@ -0,0 +1,177 @@
+"""
+polygon_tracks.py
+Binary per-frame polygon tracks, the fast replacement for re-parsing
+polygons.csv / dynamic_polygons.csv on every run.
+
+A track is a directory (`dynamic_polygons.tracks/`, `polygons.tracks/`):
+
+    coords.f32   float32 (frames, ids, 4, 2), raw C order, memory-mapped
+    valid.u8     uint8   (frames, ids), 1 where the id has a polygon
+    meta.json    {"ids": [...], "first_frame": 1, "n_frames": N}
+
+Row i holds frame `first_frame + i` (the CSV `frame` column), so finding a
+frame's polygons is an index, not a parse:
+
+    tracks = PolygonTracks("dynamic_polygons.tracks")
+    coords, valid = tracks.frame(frame_idx)      # zero-copy views
+    for pid, poly in tracks.polys(frame_idx): ...
+
+Frames are fixed-size records appended in order, so the exporter streams
+them straight to disk.  Existing CSVs convert with
+
+    python polygon_tracks.py polygons.csv [--out polygons.tracks]
+"""
+
+import argparse
+import csv
+import json
+from pathlib import Path
+
+import numpy as np
+
+COORDS_FILE = "coords.f32"
+VALID_FILE = "valid.u8"
+META_FILE = "meta.json"
+
+
+class PolygonTrackWriter:
+    def __init__(self, out_dir, ids, first_frame=1, resume_frames=0):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.ids = list(ids)
+        self.index = {pid: j for j, pid in enumerate(self.ids)}
+        self.first_frame = first_frame
+        # meta.json only exists for a finished track
+        (self.out_dir / META_FILE).unlink(missing_ok=True)
+        # resume_frames > 0 keeps that many records of an interrupted run and appends after them
+        self.n_frames = resume_frames
+        self._coords = open_after(self.out_dir / COORDS_FILE, resume_frames * len(self.ids) * 4 * 2 * 4)
+        self._valid = open_after(self.out_dir / VALID_FILE, resume_frames * len(self.ids))
+
+    def write(self, frame_idx, polys):
+        """Append `polys` ({id: (4,2)}) as frame `frame_idx`; skipped frames are stored invalid."""
+        if frame_idx < self.first_frame + self.n_frames:
+            raise ValueError(f"frame {frame_idx} written out of order")
+        while self.first_frame + self.n_frames < frame_idx:
+            self._append({})
+        self._append(polys)
+
+    def _append(self, polys):
+        coords = np.zeros((len(self.ids), 4, 2), np.float32)
+        valid = np.zeros(len(self.ids), np.uint8)
+        for pid, pts in polys.items():
+            j = self.index[pid]
+            coords[j] = np.asarray(pts, np.float32).reshape(4, 2)
+            valid[j] = 1
+        self._coords.write(coords.tobytes())
+        self._valid.write(valid.tobytes())
+        self.n_frames += 1
+
+    def flush(self):
+        self._coords.flush()
+        self._valid.flush()
+
+    def close(self, complete=True):
+        self._coords.close()
+        self._valid.close()
+        if complete:
+            meta = {"ids": self.ids, "first_frame": self.first_frame, "n_frames": self.n_frames}
+            (self.out_dir / META_FILE).write_text(json.dumps(meta, indent=2))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(complete=exc_type is None)
+
+
+def open_after(path, keep):
+    """Open `path` for appending after its first `keep` bytes (a fresh file when keep is 0)."""
+    if not keep:
+        return open(path, "wb")
+    with open(path, "r+b") as f:
+        f.truncate(keep)
+    return open(path, "ab")
+
+
+class PolygonTracks:
+    def __init__(self, path):
+        self.path = Path(path)
+        meta = json.loads((self.path / META_FILE).read_text())
+        self.ids = meta["ids"]
+        self.first_frame = meta["first_frame"]
+        n, k = meta["n_frames"], len(self.ids)
+        if n * k == 0:        # np.memmap refuses empty files
+            self.coords = np.zeros((n, k, 4, 2), np.float32)
+            self.valid = np.zeros((n, k), bool)
+        else:
+            # plain ndarray views of the maps: np.memmap indexing is several times slower
+            self.coords = np.asarray(
+                np.memmap(self.path / COORDS_FILE, np.float32, "r", shape=(n, k, 4, 2)))
+            self.valid = np.asarray(np.memmap(self.path / VALID_FILE, np.bool_, "r", shape=(n, k)))
+
+    def __len__(self):
+        return len(self.coords)
+
+    @property
+    def last_frame(self):
+        return self.first_frame + len(self) - 1
+
+    def frame(self, frame_idx):
+        """(coords (ids,4,2), valid (ids,)) views for `frame_idx`, or None outside the track."""
+        i = frame_idx - self.first_frame
+        if not 0 <= i < len(self):
+            return None
+        return self.coords[i], self.valid[i]
+
+    def polys(self, frame_idx):
+        """[(id, (4,2) float32 view), …] for the ids present on `frame_idx` ([] if none)."""
+        f = self.frame(frame_idx)
+        if f is None:
+            return []
+        coords, valid = f
+        return [(pid, coords[j]) for j, (pid, ok) in enumerate(zip(self.ids, valid.tolist())) if ok]
+
+
+def csv_to_tracks(csv_path, out_dir=None):
+    """Convert a frame,id,x1..y4 CSV into a track directory (default: <csv>.tracks); returns its path."""
+    csv_path = Path(csv_path)
+    out_dir = Path(out_dir) if out_dir else csv_path.with_suffix(".tracks")
+    by_frame, ids = {}, {}
+    with open(csv_path, newline="") as f:
+        for row in csv.DictReader(f):
+            pid = row["id"]
+            ids.setdefault(pid, None)
+            by_frame.setdefault(int(row["frame"]), {})[pid] = [
+                [float(row[f"x{i}"]), float(row[f"y{i}"])] for i in range(1, 5)]
+
+    first = min(by_frame, default=1)
+    with PolygonTrackWriter(out_dir, ids, first_frame=first) as tw:
+        for fidx in sorted(by_frame):
+            tw.write(fidx, by_frame[fidx])
+    return out_dir
+
+
+def open_tracks(csv_path, tracks_dir=None):
+    """PolygonTracks for `csv_path`, converting it once if the track directory is missing or stale."""
+    csv_path = Path(csv_path)
+    tracks_dir = Path(tracks_dir) if tracks_dir else csv_path.with_suffix(".tracks")
+    meta = tracks_dir / META_FILE
+    if not meta.exists() or (csv_path.exists() and meta.stat().st_mtime < csv_path.stat().st_mtime):
+        csv_to_tracks(csv_path, tracks_dir)
+    return PolygonTracks(tracks_dir)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert a polygons CSV into a binary track directory")
+    ap.add_argument("csv")
+    ap.add_argument("--out", help="track directory (default: <csv>.tracks)")
+    args = ap.parse_args()
+    out = csv_to_tracks(args.csv, args.out)
+    tracks = PolygonTracks(out)
+    print(f"{out}: {len(tracks)} frames × {len(tracks.ids)} ids "
+          f"(frames {tracks.first_frame}–{tracks.last_frame})")
+
+
+if __name__ == "__main__":
+    main()
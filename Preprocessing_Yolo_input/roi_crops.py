@@ -0,0 +1,223 @@
+"""
+roi_crops.py
+Detection on the intersection region only: the ROI polygons and the
+traffic-light panel strip are cropped out of each frame, packed into small
+mosaics for the detector, and the boxes are mapped back to the frame.
+
+    planner = CropPlanner((w, h), panels=[(x, y, pw, ph) for _, x, y, pw, ph in traffic_light_polygons])
+    model = CroppedModel(YOLO(MODEL_PT), planner)      # used like the YOLO model
+    for frame, res in detect(model, cap, BATCH_SIZE, conf=0.2):
+        dets = to_records(res.boxes)                   # frame coordinates, as before
+        ...
+        planner.update(polys)                          # re-plans only when polys change
+
+Planning (frame pixels):
+  regions   the bounding box of every polygon and of the panel strip, grown
+            by `margin`, clipped to the frame; overlapping boxes are merged
+  tiles     a region larger than `tile` model pixels is split into
+            overlapping tiles; each tile owns the part of itself up to the
+            middle of its overlaps, so every point is owned by one tile
+  mosaics   tiles are resized by `scale` and shelf-packed, `gap` pixels
+            apart, into canvases `tile` wide (and at most `tile` high)
+
+`scale` defaults to tile / max(w, h), the scale the whole frame gets when
+it is letterboxed to imgsz=tile, so objects look the same size to the
+detector as in a full-frame run.  A box is kept when its centre lies in
+the part of a tile that tile owns, which covers every polygon and panel.
+Before the first update() (no polygons yet) the plan is the whole frame.
+"""
+
+import cv2
+import numpy as np
+
+STRIDE = 32             # canvas heights are padded to the detector stride
+PAD_VALUE = 114         # ultralytics letterbox grey
+
+
+def _merge(rects):
+    """Union of overlapping (x0, y0, x1, y1) rects until none overlap."""
+    rects = [list(r) for r in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(r) for r in rects]
+
+
+def _split(lo, hi, size, overlap):
+    """[(start, end, own_start, own_end)] tiles of at most `size` covering [lo, hi)."""
+    if hi - lo <= size:
+        return [(lo, hi, lo, hi)]
+    step = size - overlap
+    n = -(-(hi - lo - overlap) // step)
+    starts = [lo + round(i * (hi - lo - size) / (n - 1)) for i in range(n)]
+    tiles = []
+    for i, s in enumerate(starts):
+        own0 = lo if i == 0 else (starts[i - 1] + size + s) // 2
+        own1 = hi if i == n - 1 else (s + size + starts[i + 1]) // 2
+        tiles.append((s, s + size, own0, own1))
+    return tiles
+
+
+class CropPlanner:
+    def __init__(self, frame_size, panels=(), margin=96, scale=None, tile=640, overlap=64, gap=16):
+        self.frame_w, self.frame_h = frame_size
+        self.panels = [tuple(map(int, p)) for p in panels]      # (x, y, w, h) traffic-light boxes
+        self.margin = margin
+        self.scale = scale or tile / max(frame_size)
+        self.tile = tile                                        # canvas width = detector imgsz
+        self.overlap = overlap                                  # model pixels shared by neighbouring tiles
+        self.gap = gap
+        self._key = None
+        self.replans = 0
+        self._plan([(0, 0, self.frame_w, self.frame_h)])
+
+    def update(self, polys):
+        """Plan the crops for `polys` ([(pid, (k,2))]) plus the panels, unless they are unchanged."""
+        key = [(pid, np.asarray(poly).tobytes()) for pid, poly in polys]
+        if key == self._key or not polys:
+            return
+        self._key = key
+        m = self.margin
+        rects = []
+        for _, poly in polys:
+            x, y, w, h = cv2.boundingRect(np.asarray(poly, np.float32).reshape(-1, 1, 2))
+            rects.append((x - m, y - m, x + w + m, y + h + m))
+        if self.panels:
+            xs = [(x, x + w) for x, _, w, _ in self.panels]
+            ys = [(y, y + h) for _, y, _, h in self.panels]
+            rects.append((min(a for a, _ in xs) - m, min(a for a, _ in ys) - m,
+                          max(b for _, b in xs) + m, max(b for _, b in ys) + m))
+        clipped = [(max(0, x0), max(0, y0), min(self.frame_w, x1), min(self.frame_h, y1))
+                   for x0, y0, x1, y1 in rects]
+        self._plan(_merge([r for r in clipped if r[0] < r[2] and r[1] < r[3]]))
+        self.replans += 1
+
+    def _plan(self, regions):
+        # tiles in frame pixels: (x0, y0, x1, y1) crop and (ox0, oy0, ox1, oy1) owned part
+        size, overlap = self.tile / self.scale, self.overlap / self.scale
+        tiles = []
+        for x0, y0, x1, y1 in regions:
+            for tx0, tx1, ox0, ox1 in _split(x0, x1, int(size), int(overlap)):
+                for ty0, ty1, oy0, oy1 in _split(y0, y1, int(size), int(overlap)):
+                    tiles.append(((tx0, ty0, tx1, ty1), (ox0, oy0, ox1, oy1)))
+
+        # shelf packing of the scaled tiles, tallest first
+        canvases, shelf_x, shelf_y, shelf_h = [[]], 0, 0, 0
+        heights = [0]
+        for crop, own in sorted(tiles, key=lambda t: t[0][1] - t[0][3]):
+            sw = min(self.tile, max(1, round((crop[2] - crop[0]) * self.scale)))
+            sh = min(self.tile, max(1, round((crop[3] - crop[1]) * self.scale)))
+            if shelf_x and shelf_x + sw > self.tile:                # next shelf
+                shelf_x, shelf_y, shelf_h = 0, shelf_y + shelf_h + self.gap, 0
+            if shelf_y and shelf_y + sh > self.tile:                # next canvas
+                canvases.append([])
+                heights.append(0)
+                shelf_x, shelf_y, shelf_h = 0, 0, 0
+            canvases[-1].append((crop, own, (shelf_x, shelf_y, sw, sh)))
+            heights[-1] = max(heights[-1], shelf_y + sh)
+            shelf_x += sw + self.gap
+            shelf_h = max(shelf_h, sh)
+        # one attribute, swapped whole: a detector thread reads a consistent plan
+        self.layout = (canvases, [-(-h // STRIDE) * STRIDE for h in heights])
+
+    @property
+    def canvases(self):
+        return self.layout[0]
+
+    @property
+    def heights(self):
+        return self.layout[1]
+
+    @property
+    def crop_pixels(self):
+        """Frame pixels cropped per frame (overlaps counted twice)."""
+        return sum((c[2] - c[0]) * (c[3] - c[1]) for placed in self.canvases for c, _, _ in placed)
+
+    @property
+    def model_pixels(self):
+        """Pixels of the mosaics the detector gets per frame."""
+        return self.tile * sum(self.heights)
+
+    def mosaics(self, frame, layout=None):
+        """The detector input images for `frame` (under `layout`, default the current one)."""
+        out = []
+        for placed, h in zip(*(layout or self.layout)):
+            canvas = np.full((h, self.tile, 3), PAD_VALUE, np.uint8)
+            for (x0, y0, x1, y1), _, (cx, cy, sw, sh) in placed:
+                canvas[cy:cy + sh, cx:cx + sw] = cv2.resize(frame[y0:y1, x0:x1], (sw, sh),
+                                                            interpolation=cv2.INTER_LINEAR)
+            out.append(canvas)
+        return out
+
+    def to_frame(self, k, xywh, layout=None):
+        """Map (n,4) centre/size boxes of mosaic `k` to frame coordinates → (xywh, keep mask)."""
+        out = np.zeros((len(xywh), 4), np.float32)
+        keep = np.zeros(len(xywh), bool)
+        for (x0, y0, x1, y1), (ox0, oy0, ox1, oy1), (cx, cy, sw, sh) in (layout or self.layout)[0][k]:
+            sx, sy = sw / (x1 - x0), sh / (y1 - y0)
+            inside = ((xywh[:, 0] >= cx) & (xywh[:, 0] < cx + sw) &
+                      (xywh[:, 1] >= cy) & (xywh[:, 1] < cy + sh) & ~keep)
+            fx = x0 + (xywh[:, 0] - cx) / sx
+            fy = y0 + (xywh[:, 1] - cy) / sy
+            own = inside & (fx >= ox0) & (fx < ox1) & (fy >= oy0) & (fy < oy1)
+            out[own] = np.stack([fx, fy, xywh[:, 2] / sx, xywh[:, 3] / sy], axis=1)[own]
+            keep |= own
+        return out, keep
+
+
+class CropBoxes:
+    """The part of ultralytics Boxes that to_records() reads, as numpy arrays."""
+
+    def __init__(self, xywh, cls, conf):
+        self.xywh, self.cls, self.conf = xywh, cls, conf
+
+    def __len__(self):
+        return len(self.cls)
+
+
+class CropResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+    def plot(self, img, line_width=2, **_):
+        """Draw the boxes on `img` (the ultralytics labels/conf options are ignored)."""
+        for (x, y, w, h), c in zip(self.boxes.xywh.tolist(), self.boxes.cls.astype(int).tolist()):
+            colour = [(0, 255, 255), (0, 255, 0), (0, 0, 255), (0, 200, 255)][c % 4]
+            cv2.rectangle(img, (int(x - w / 2), int(y - h / 2)), (int(x + w / 2), int(y + h / 2)),
+                          colour, line_width)
+        return img
+
+
+class CroppedModel:
+    def __init__(self, model, planner):
+        self.model = model
+        self.planner = planner
+
+    def __call__(self, frames, **predict_kw):
+        """One CropResult per frame, from a single detector call over all their mosaics."""
+        plan = self.planner
+        layout = plan.layout
+        mosaics = [plan.mosaics(f, layout) for f in frames]
+        flat = [m for ms in mosaics for m in ms]
+        results = iter(self.model(flat, **{**predict_kw, "imgsz": plan.tile}) if flat else ())
+        out = []
+        for ms in mosaics:
+            xywh, cls, conf = [np.zeros((0, 4), np.float32)], [np.zeros(0, np.float32)], [np.zeros(0, np.float32)]
+            for k in range(len(ms)):
+                b = next(results).boxes
+                bx, keep = plan.to_frame(k, b.xywh.cpu().numpy(), layout)
+                xywh.append(bx[keep])
+                cls.append(b.cls.cpu().numpy()[keep])
+                conf.append(b.conf.cpu().numpy()[keep])
+            out.append(CropResult(CropBoxes(np.concatenate(xywh), np.concatenate(cls), np.concatenate(conf))))
+        return out
@@ -0,0 +1,89 @@
+"""
+roi_index.py
+Car-to-polygon assignment through a rasterized label map.
+
+The counting loops in last.py and run_traffic_management test every car
+centre against each ROI polygon with cv2.pointPolygonTest(poly, c, False)
+>= 0 and count it for the first polygon that contains it (edges included).
+RoiLabelMap rasterizes the frame's polygons once into a small uint8 image of
+`cell` x `cell` pixel cells and answers all centres with one gather:
+
+    roi_map = RoiLabelMap((h, w))
+    roi_map.update(polys)                 # [(pid, (k,2) int32)]; no-op if unchanged
+    counts = roi_map.count(centres)       # (n,2) → {pid: cars}, as the loop counted
+
+A cell holds 1 + the index of the first polygon that contains it, 0 for
+none, or AMBIGUOUS where some polygon edge passes through or near the
+cell (and around non-convex polygons).  Centres in ambiguous cells (and
+outside the frame) go through the same pointPolygonTest loop as before, so
+counts are exactly the old ones; only the few cars on a polygon border
+still cost Python calls.
+"""
+
+import cv2
+import numpy as np
+
+AMBIGUOUS = 255
+SHIFT = 4                       # sub-cell bits for the rasterizer
+
+
+class RoiLabelMap:
+    def __init__(self, shape, cell=4):
+        self.cell = cell
+        h, w = shape[:2]
+        self.labels = np.zeros((-(-h // cell), -(-w // cell)), np.uint8)
+        self.ids, self.polys = [], []
+        self._key = None
+        self.rasterized = 0     # how often update() actually re-rasterized
+
+    def update(self, polys):
+        """Use `polys` ([(pid, poly)]) for the next lookups, re-rasterizing only if they changed."""
+        if len(polys) >= AMBIGUOUS:
+            raise ValueError(f"at most {AMBIGUOUS - 1} polygons per label map")
+        key = [(pid, np.asarray(poly).tobytes()) for pid, poly in polys]
+        if key == self._key:
+            return
+        self._key = key
+        self.ids = [pid for pid, _ in polys]
+        self.polys = [np.asarray(poly, np.int32).reshape(-1, 2) for _, poly in polys]
+
+        # cell (i, j) covers pixels [j·cell, (j+1)·cell) × [i·cell, …); in label-map
+        # coordinates its centre is the integer point (j, i)
+        pts = [np.round((p / self.cell - 0.5) * (1 << SHIFT)).astype(np.int32) for p in self.polys]
+        self.labels[:] = 0
+        for k in range(len(pts) - 1, -1, -1):       # earliest polygon painted last, so it wins
+            cv2.fillPoly(self.labels, [pts[k]], k + 1, cv2.LINE_8, SHIFT)
+        # any cell an edge touches lies within √2/2 of it; a 3-cell-wide stroke covers that
+        cv2.polylines(self.labels, pts, True, AMBIGUOUS, 3, cv2.LINE_8, SHIFT)
+        for p in self.polys:
+            # fillPoly and pointPolygonTest disagree inside self-intersecting outlines,
+            # so non-convex polygons are looked up exactly over their whole bounding box
+            if not cv2.isContourConvex(p):
+                x, y, w, h = cv2.boundingRect(p)
+                cv2.rectangle(self.labels, (x // self.cell - 1, y // self.cell - 1),
+                              ((x + w) // self.cell + 1, (y + h) // self.cell + 1), AMBIGUOUS, -1)
+        self.rasterized += 1
+
+    def assign(self, centres):
+        """Index into the current polygons of the first one containing each centre, -1 for none."""
+        c = np.asarray(centres, np.float32).reshape(-1, 2)
+        if not self.polys:
+            return np.full(len(c), -1, np.intp)
+        ij = np.floor(c[:, ::-1] / self.cell).astype(np.intp)
+        inside = ((ij >= 0) & (ij < self.labels.shape)).all(axis=1)
+        label = np.full(len(c), AMBIGUOUS, np.intp)
+        label[inside] = self.labels[ij[inside, 0], ij[inside, 1]]
+        out = label - 1
+        for n in np.flatnonzero(label == AMBIGUOUS):
+            pt = (float(c[n, 0]), float(c[n, 1]))
+            out[n] = next((k for k, poly in enumerate(self.polys)
+                           if cv2.pointPolygonTest(poly, pt, False) >= 0), -1)
+        return out
+
+    def count(self, centres):
+        """{pid: number of centres whose first containing polygon is pid}, for every current pid."""
+        hits = np.bincount(self.assign(centres) + 1, minlength=len(self.ids) + 1)[1:]
+        counts = {pid: 0 for pid in self.ids}
+        for pid, n in zip(self.ids, hits.tolist()):
+            counts[pid] += n
+        return counts
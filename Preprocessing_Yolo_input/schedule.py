@@ -0,0 +1,109 @@
+"""
+schedule.py
+Signal schedules compiled into per-frame light states.
+
+The overlay scripts keep `traffic_light_schedule` as green intervals
+{light: [(start, end), ...]} and used to scan every interval for every
+light on every frame.  compile_schedule() applies the yellow rules once
+(`lead` frames of yellow before each green, `lag` frames after it) and
+stores one uint8 state per light and frame, so a lookup is an index:
+
+    timeline = compile_schedule(traffic_light_schedule, lead=75, lag=75)
+    timeline.state("ID-2", frame_count)     # 'red' / 'yellow' / 'green'
+    timeline.save("schedule.timeline")      # lol.py / ABOOD.PY
+    timeline = Timeline.load("schedule.timeline")
+
+Where windows overlap, the earlier interval wins, and within an interval
+the lead yellow, then green, then lag yellow, exactly as the interval scans
+did.  Frames past the last window (or lights without a schedule) are red.
+
+File layout (`.timeline`): the magic b"TLSTATE1", a little-endian uint32
+header length, a JSON header {"lights": [...], "n_frames": N, "states":
+[...]} and the (lights, N) uint8 state matrix, row-major.
+
+    python schedule.py schedule.timeline [--frame 1200]
+"""
+
+import argparse
+import json
+import struct
+
+import numpy as np
+
+STATES = ("red", "yellow", "green")
+RED, YELLOW, GREEN = range(len(STATES))
+MAGIC = b"TLSTATE1"
+
+
+class Timeline:
+    def __init__(self, lights, states):
+        self.lights = list(lights)
+        self.states = np.ascontiguousarray(states, np.uint8).reshape(len(self.lights), -1)
+        # per light, the state name of every frame: one list index per lookup
+        self._names = {lid: [STATES[c] for c in row.tolist()]
+                       for lid, row in zip(self.lights, self.states)}
+
+    @property
+    def n_frames(self):
+        return self.states.shape[1]
+
+    def state(self, light, frame):
+        """'red', 'yellow' or 'green' for `light` on `frame`."""
+        names = self._names.get(light)
+        if names is None or not 0 <= frame < len(names):
+            return "red"
+        return names[frame]
+
+    def code(self, light, frame):
+        """Same as state(), as RED / YELLOW / GREEN."""
+        return STATES.index(self.state(light, frame))
+
+    def save(self, path):
+        header = json.dumps({"lights": self.lights, "n_frames": self.n_frames,
+                             "states": list(STATES)}).encode()
+        with open(path, "wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(header)) + header)
+            f.write(self.states.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a compiled schedule")
+            (n,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(n))
+            states = np.frombuffer(f.read(), np.uint8)
+        return cls(header["lights"], states.reshape(len(header["lights"]), header["n_frames"]))
+
+
+def compile_schedule(schedule, lead=75, lag=75, n_frames=None):
+    """Timeline of {light: [(start, end), ...]} green intervals with yellow `lead`/`lag` frames around each."""
+    ends = [end + lag for periods in schedule.values() for _, end in periods]
+    n_frames = n_frames if n_frames is not None else max(ends, default=0)
+    states = np.full((len(schedule), n_frames), RED, np.uint8)
+    for row, periods in zip(states, schedule.values()):
+        # paint back to front so the earliest matching rule ends up on top
+        for start, end in reversed(periods):
+            row[max(end, 0):max(end + lag, 0)] = YELLOW
+            row[max(start, 0):max(end, 0)] = GREEN
+            row[max(start - lead, 0):max(start, 0)] = YELLOW
+    return Timeline(schedule, states)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Summarise a compiled schedule")
+    ap.add_argument("timeline")
+    ap.add_argument("--frame", type=int, help="print every light's state on this frame")
+    args = ap.parse_args()
+    tl = Timeline.load(args.timeline)
+    print(f"{args.timeline}: {len(tl.lights)} lights × {tl.n_frames} frames")
+    for lid, row in zip(tl.lights, tl.states):
+        share = np.bincount(row, minlength=len(STATES)) / max(len(row), 1)
+        line = "  ".join(f"{s} {100 * p:.1f}%" for s, p in zip(STATES, share))
+        if args.frame is not None:
+            line += f"  | frame {args.frame}: {tl.state(lid, args.frame)}"
+        print(f"  {lid:<8}{line}")
+
+
+if __name__ == "__main__":
+    main()
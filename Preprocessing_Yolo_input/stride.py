@@ -0,0 +1,150 @@
+"""
+stride.py
+Light-state-driven detection stride, and the report comparing a strided
+run with a full-rate one.
+
+While every watched light is red and the ROI car counts hold still,
+nothing crosses the counting lines, so the detector only needs to run
+every `k` frames.  Around yellow/green phases and light changes it runs on
+every frame again:
+
+    policy = StridePolicy(k=5, guard=30)
+    for idx, frame, res in detect_strided(model, cap, policy, BATCH_SIZE, conf=0.2):
+        if frame is None:               # skipped: grabbed, not decoded
+            tracker.update(np.empty((0, 5)))     # SORT predictions coast
+            continue                    # counts / light states hold
+        ...
+        policy.update(idx, tl_state, counts)
+
+After a detected frame, full rate holds for `guard` frames when any light
+is not red (yellow, green, unknown) or the states changed, and for the next
+frame when any count moved by more than `count_tol`.  A change is seen at
+most k - 1 frames late, or at once when the light states of skipped frames
+are fed to watch() (light_panels.py reads them without the detector).
+k=1 detects every frame.
+
+In a staged run (pipeline.py) update() is called from the post-processing
+loop, up to (stages + 1) * queue size batches behind the decoder that asks
+for the stride.  The light states are therefore read in the decode stage
+itself, before the next batch is planned:
+
+    plans = watch_lights(read_strided(cap, policy, BATCH_SIZE, decode_skipped=True), panels, policy)
+    batches = pipe.source("decode", plans)      # batches of (idx, frame, detect, light states)
+
+so a light change ends the stride within one batch, as in a plain loop;
+only the count rule of update() lags by the pipeline depth.
+
+Both loops log a "stride" event (k, frames, detected) at the end.  To
+compare a strided event log with a full-rate one (skipped share, per-frame
+count deviation, crossings and best-frame counts):
+
+    python stride.py full/events.jsonl strided/events.jsonl
+"""
+
+import argparse
+
+import numpy as np
+
+from event_log import EventLogReader
+
+
+class StridePolicy:
+    def __init__(self, k=5, guard=30, count_tol=1, calm=("red",)):
+        self.k = k                  # detection stride while calm
+        self.guard = guard          # full-rate frames after activity
+        self.count_tol = count_tol  # count change tolerated while calm
+        self.calm = set(calm)       # light states that allow striding
+        self.full_until = 1         # last frame that must be detected at full rate
+        self.last_idx = 0
+        self.watched = 0            # last frame fed to watch()
+        self.detected = 0
+        self._states = self._counts = self._watched_states = None
+
+    @property
+    def stride(self):
+        """Frames to advance from the last detected frame to the next one to detect."""
+        return 1 if max(self.last_idx, self.watched) + 1 <= self.full_until else self.k
+
+    def watch(self, idx, states):
+        """Feed light states read on frame `idx` before it is detected (or skipped); a change ends the stride at once."""
+        prev = self._watched_states if self._watched_states is not None else self._states
+        calm = all(s in self.calm for s in states.values())
+        if not calm or (prev is not None and states != prev):
+            self.full_until = max(self.full_until, idx + self.guard)
+        self._watched_states = dict(states)
+        self.watched = max(self.watched, idx)
+
+    def update(self, idx, states, counts):
+        """Feed the light states and ROI counts found on detected frame `idx`."""
+        calm = all(s in self.calm for s in states.values())
+        changed = self._states is not None and states != self._states
+        if not calm or changed:
+            self.full_until = max(self.full_until, idx + self.guard)
+        elif self._counts is not None:
+            moved = max((abs(counts.get(p, 0) - self._counts.get(p, 0))
+                         for p in {*counts, *self._counts}), default=0)
+            if moved > self.count_tol:
+                self.full_until = max(self.full_until, idx + 1)
+        self._states, self._counts = dict(states), dict(counts)
+        self.last_idx = idx
+        self.detected += 1
+
+
+def watch_lights(plans, panels, policy):
+    """read_strided() batches as [(idx, frame, detect, states)], each decoded frame's panels read and fed to policy.watch()."""
+    for plan in plans:
+        out = []
+        for idx, frame, detect in plan:
+            states = None
+            if frame is not None:       # grabbed frames cannot be read
+                states = panels.read(frame)
+                policy.watch(idx, states)
+            out.append((idx, frame, detect, states))
+        yield out
+
+
+def report(full_path, strided_path):
+    """Print how far the strided run's counts, crossings and best frames are from the full-rate run."""
+    with EventLogReader(full_path) as full, EventLogReader(strided_path) as strided:
+        stats = strided.last("stride")
+        if stats:
+            print(f"stride {stats['k']}: detected {stats['detected']}/{stats['frames']} frames, "
+                  f"skipped {1 - stats['detected'] / max(stats['frames'], 1):.1%}")
+
+        a = {ev["frame"]: ev["cars"] for ev in full.iter("frame")}
+        b = {ev["frame"]: ev["cars"] for ev in strided.iter("frame")}
+        frames = sorted(a.keys() & b.keys())
+        if frames:
+            ids = sorted({p for f in frames for p in (*a[f], *b[f])})
+            diff = np.array([[abs(a[f].get(p, 0) - b[f].get(p, 0)) for p in ids] for f in frames])
+            print(f"per-frame counts over {len(frames)} frames:")
+            print(f"  {'id':<8}{'mean |d|':>10}{'max |d|':>9}{'frames off':>12}")
+            for j, p in enumerate(ids):
+                print(f"  {p:<8}{diff[:, j].mean():>10.3f}{diff[:, j].max():>9}{(diff[:, j] > 0).mean():>11.1%}")
+
+        ca, cb = full.last("crossings"), strided.last("crossings")
+        if ca and cb:
+            print("crossings (full → strided):")
+            for p in sorted(ca["crossings"].keys() | cb["crossings"].keys()):
+                x, y = ca["crossings"].get(p, 0), cb["crossings"].get(p, 0)
+                print(f"  {p:<8}{x:>6} → {y:<6}({y - x:+d})")
+
+        tids = sorted({ev["tid"] for log in (full, strided) for ev in log.iter("best")})
+        if tids:
+            print("best-frame counts (full → strided):")
+            for t in tids:
+                x, y = full.last("best", tid=t), strided.last("best", tid=t)
+                x, y = (ev["cars"].get(t, 0) if ev else None for ev in (x, y))
+                print(f"  {t:<8}{x!s:>6} → {y!s}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare a strided run's event log with a full-rate one")
+    ap.add_argument("full")
+    ap.add_argument("strided")
+    args = ap.parse_args()
+    report(args.full, args.strided)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,9 @@ import math
 import numpy as np
 import pyautogui
 
+from overlay import SpriteCache, Preview
+from schedule import compile_schedule
+
 # === TRAFFIC LIGHT CONFIGURATION ===
 traffic_lights_positions = {
     # ID‑1 split into two panels, one below the other
@@ -19,6 +22,10 @@ traffic_lights_positions = {
 
 screen_w, screen_h = pyautogui.size()
 
+# on-screen preview refresh cap (frames/s); None shows every frame, 0 disables
+# the window so output_video.mp4 is written at full speed
+PREVIEW_FPS = 10
+
 # 25 FPS → frame windows for green states (start_frame, end_frame)
 #       Traffic Lights Frames count for scheduling
 #           for 14 sec ----> 350
@@ -117,34 +124,20 @@ def get_circle_centers(center):
         (cx, int(cy + panel_height/3))
     )
 # /////////////////////////////////////////////////////////////////////
+# green intervals compiled once into a per-frame state table
+timeline = compile_schedule(traffic_light_schedule, lead=75, lag=75)
+
+panel_colors = {
+    'yellow': (dark_red, base_yellow, dark_green),
+    'green':  (dark_red, dark_yellow, base_green),
+    'red':    (base_red, dark_yellow, dark_green),
+}
+
 def get_panel_colors_by_schedule(light_id, frame_count):
-    for start, end in traffic_light_schedule.get(light_id, []):
-        # yellow BEFORE green (red→yellow)
-        if start - 75 <= frame_count < start:
-            return dark_red, base_yellow, dark_green
-        # green phase
-        if start <= frame_count < end:
-            return dark_red, dark_yellow, base_green
-        # yellow BEFORE red (green→yellow)
-        if end <= frame_count < end + 75:
-            return dark_red, base_yellow, dark_green
-    # default RED
-    return base_red, dark_yellow, dark_green
-
-
-# //////////////////////////////////////////////////////////////////////////////////
+    return panel_colors[timeline.state(light_id, frame_count)]
+
 def get_light_state(lid, fcount):
-    for start, end in traffic_light_schedule.get(lid, []):
-        # yellow before green
-        if start - 75 <= fcount < start:
-            return 'yellow'
-        # green
-        if start <= fcount < end:
-            return 'green'
-        # yellow after green
-        if end <= fcount < end + 75:
-            return 'yellow'
-    return 'red'
+    return timeline.state(lid, fcount)
 
 def draw_direction_arrows(frame, center, color):
     cx, cy = center
@@ -160,27 +153,51 @@ def draw_direction_arrows(frame, center, color):
                     (cx+10, arrow_y-20),
                     color, 2, tipLength=0.3)
 
+def draw_panel(img, key):
+    """Draw the panel for key (lid, (r, y, g) colours, state); SpriteCache renders each key once."""
+    lid, (r, y, g), state = key
+    ctr = traffic_lights_positions[lid]
+    tl = (int(ctr[0]-panel_width/2), int(ctr[1]-panel_height/2))
+    br = (int(ctr[0]+panel_width/2), int(ctr[1]+panel_height/2))
+    cv2.rectangle(img, tl, br, (255,255,255), -1)
+    rc,yc,gc = get_circle_centers(ctr)
+    cv2.circle(img, rc, circle_radius, r, -1)
+    cv2.circle(img, yc, circle_radius, y, -1)
+    cv2.circle(img, gc, circle_radius, g, -1)
+    cv2.putText(img, lid, (br[0]+5, ctr[1]),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255),1)
+
+    # arrows on ID-2 & ID-4
+    if lid in ("ID-2","ID-4"):
+        col = base_green if state=="green" else base_yellow if state=="yellow" else base_red
+        draw_direction_arrows(img, ctr, col)
+        # arrows on split panels ID-1 and ID-3: only UP for *-F, only LEFT for *-L
+    if lid in ("ID-1-F", "ID-3-F", "ID-1-L", "ID-3-L"):
+        col = base_green if state == "green" else base_yellow if state == "yellow" else base_red
+        arrow_y = ctr[1] - panel_height // 2 - 10
+
+        if lid.endswith("-F"):
+            # upward arrow
+            cv2.arrowedLine(
+                img,
+                (ctr[0], arrow_y),
+                (ctr[0], arrow_y - 20),
+                col, 2, tipLength=0.3
+            )
+        else:
+            # leftward arrow
+            cv2.arrowedLine(
+                img,
+                (ctr[0] - 10, arrow_y),
+                (ctr[0] - 30, arrow_y),
+                col, 2, tipLength=0.3
+            )
+
 def transform_points(pts, H):
     pts = pts.reshape(-1,1,2)
     t   = cv2.perspectiveTransform(pts, H)
     return t.reshape(-1,2).astype(np.int32)
 
-def compute_dynamic_homography(ref_img, cur_img):
-    g1 = cv2.cvtColor(ref_img, cv2.COLOR_BGR2GRAY)
-    g2 = cv2.cvtColor(cur_img, cv2.COLOR_BGR2GRAY)
-    sift = cv2.SIFT_create()
-    k1,d1 = sift.detectAndCompute(g1, None)
-    k2,d2 = sift.detectAndCompute(g2, None)
-    if d1 is None or d2 is None: return None
-    bf = cv2.BFMatcher(cv2.NORM_L2)
-    m = bf.knnMatch(d1, d2, k=2)
-    good = [x for x,y in m if x.distance < 0.75*y.distance]
-    if len(good) < 10: return None
-    src = np.float32([k1[x.queryIdx].pt for x in good]).reshape(-1,1,2)
-    dst = np.float32([k2[x.trainIdx].pt for x in good]).reshape(-1,1,2)
-    H,_ = cv2.findHomography(src, dst, cv2.RANSAC, 5.0)
-    return H
-
 # --- ANNOTATION SETUP ---
 current_annotation_id = None
 annotations = {k:[] for k in world_intersections}
@@ -226,9 +243,6 @@ out = cv2.VideoWriter("output_video.mp4",
                       cv2.VideoWriter_fourcc(*"mp4v"),
                       fps, (w, h))
 
-# create a resizable window
-cv2.namedWindow("Dynamic Intersection Overlays", cv2.WINDOW_NORMAL)
-#
 cv2.namedWindow("Select Reference Frame")
 while True:
     ret, frm = cap.read()
@@ -243,6 +257,10 @@ while True:
     if k==ord('q'):
         cap.release(); cv2.destroyAllWindows(); exit()
 cv2.destroyWindow("Select Reference Frame")
+
+# the dynamic overlays below are disabled; to enable them, import HomographyEngine
+# from homography.py and compute the reference features once, before the loop:
+# engine = HomographyEngine(ref_frame)
 #
 # # --- STEP 2: ANNOTATION MODE ---
 # cv2.namedWindow("Reference Frame")
@@ -302,6 +320,10 @@ w   = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
 h   = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 out = cv2.VideoWriter("output_video.mp4", cv2.VideoWriter_fourcc(*"mp4v"), fps, (w,h))
 
+# panels are rendered once per light/state and blitted; the preview is rate-capped
+panels  = SpriteCache(draw_panel)
+preview = Preview("Dynamic Intersection Overlays", (screen_w, screen_h), PREVIEW_FPS)
+
 # --- STEP 4: MAIN LOOP ---
 frame_count = 0
 while True:
@@ -309,48 +331,12 @@ while True:
     if not ret: break
     frame_count += 1
 
-    # Hdyn = compute_dynamic_homography(ref_frame, frame)
+    # Hdyn = engine.estimate(frame)
 
     # draw static traffic lights
-    for lid, ctr in traffic_lights_positions.items():
-        r,y,g = get_panel_colors_by_schedule(lid, frame_count)
-        tl = (int(ctr[0]-panel_width/2), int(ctr[1]-panel_height/2))
-        br = (int(ctr[0]+panel_width/2), int(ctr[1]+panel_height/2))
-        cv2.rectangle(frame, tl, br, (255,255,255), -1)
-        rc,yc,gc = get_circle_centers(ctr)
-        cv2.circle(frame, rc, circle_radius, r, -1)
-        cv2.circle(frame, yc, circle_radius, y, -1)
-        cv2.circle(frame, gc, circle_radius, g, -1)
-        cv2.putText(frame, lid, (br[0]+5, ctr[1]),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255),1)
-
-        # arrows on ID-2 & ID-4
-        if lid in ("ID-2","ID-4"):
-            st = get_light_state(lid, frame_count)
-            col = base_green if st=="green" else base_yellow if st=="yellow" else base_red
-            draw_direction_arrows(frame, ctr, col)
-            # arrows on split panels ID-1 and ID-3: only UP for *-F, only LEFT for *-L
-        if lid in ("ID-1-F", "ID-3-F", "ID-1-L", "ID-3-L"):
-            state = get_light_state(lid, frame_count)
-            col = base_green if state == "green" else base_yellow if state == "yellow" else base_red
-            arrow_y = ctr[1] - panel_height // 2 - 10
-
-            if lid.endswith("-F"):
-                # upward arrow
-                cv2.arrowedLine(
-                    frame,
-                    (ctr[0], arrow_y),
-                    (ctr[0], arrow_y - 20),
-                    col, 2, tipLength=0.3
-                )
-            else:
-                # leftward arrow
-                cv2.arrowedLine(
-                    frame,
-                    (ctr[0] - 10, arrow_y),
-                    (ctr[0] - 30, arrow_y),
-                    col, 2, tipLength=0.3
-                )
+    for lid in traffic_lights_positions:
+        panels.blit(frame, (lid, get_panel_colors_by_schedule(lid, frame_count),
+                            get_light_state(lid, frame_count)))
 
 
     # # dynamic homography overlays & crossing lines
@@ -396,12 +382,8 @@ while True:
 
     cv2.putText(frame, f"Frame: {frame_count}", (20,60),
                 cv2.FONT_HERSHEY_SIMPLEX,1,(255,255,255),2)
-    frame_resized = cv2.resize(frame, (screen_w, screen_h),
-                               interpolation=cv2.INTER_LINEAR)
-    cv2.imshow("Dynamic Intersection Overlays", frame_resized)
     out.write(frame)
-
-    if cv2.waitKey(1)&0xFF==ord('q'):
+    if preview.show(frame) == ord('q'):
         break
 
 cap.release()
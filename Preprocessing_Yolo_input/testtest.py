@@ -1,6 +1,10 @@
 import cv2
 import numpy as np
-from multiprocessing import Pool, cpu_count
+
+from homography_stream import stream_homographies
+from dynamic_export import save_exclusion_masks
+from overlay import SpriteCache, Preview
+from schedule import compile_schedule
 
 # === TRAFFIC LIGHT CONFIGURATION ===
 traffic_lights_positions = {
@@ -45,6 +49,18 @@ panel_height  = 90
 circle_radius = 8
 crossing_offset = 5
 
+# 0: estimate H on every frame; set >0 to enable keyframes (H at most every
+# N frames, sooner when the view drifts, interpolated in between)
+KEYFRAME_GAP = 0
+
+# on-screen preview refresh cap (frames/s); None shows every frame, 0 disables
+# the window so output_video.mp4 is written at full speed
+PREVIEW_FPS = 10
+
+# the masks drawn on the reference frame only serve this run; set a path
+# (e.g. 'exclusion_masks.csv') to also save them for tool.py / export_cli.py
+SAVE_MASKS = None
+
 # Globals for annotation
 current_annotation_id = None
 annotations = {k: [] for k in world_intersections}
@@ -65,23 +81,22 @@ def get_circle_centers(center):
         (cx, int(cy + panel_height/3))
     )
 
+# green intervals compiled once into a per-frame state table
+timeline = compile_schedule(traffic_light_schedule, lead=0, lag=50)
+# the panels also light yellow 50 frames before each green
+panel_timeline = compile_schedule(traffic_light_schedule, lead=50, lag=50)
+
+panel_colors = {
+    'yellow': (dark_red, base_yellow, dark_green),
+    'green':  (dark_red, dark_yellow, base_green),
+    'red':    (base_red, dark_yellow, dark_green),
+}
+
 def get_panel_colors_by_schedule(light_id, frame_count):
-    for start, end in traffic_light_schedule.get(light_id, []):
-        if start - 50 <= frame_count < start:
-            return dark_red, base_yellow, dark_green
-        if start <= frame_count < end:
-            return dark_red, dark_yellow, base_green
-        if end <= frame_count < end + 50:
-            return dark_red, base_yellow, dark_green
-    return base_red, dark_yellow, dark_green
+    return panel_colors[panel_timeline.state(light_id, frame_count)]
 
 def get_light_state(lid, fcount):
-    for start, end in traffic_light_schedule.get(lid, []):
-        if start <= fcount < end:
-            return 'green'
-        if end <= fcount < end + 50:
-            return 'yellow'
-    return 'red'
+    return timeline.state(lid, fcount)
 
 def draw_direction_arrows(frame, center, color):
     cx, cy = center
@@ -89,33 +104,39 @@ def draw_direction_arrows(frame, center, color):
     cv2.arrowedLine(frame, (cx-10, arrow_y), (cx-30, arrow_y), color, 2, tipLength=0.3)
     cv2.arrowedLine(frame, (cx+10, arrow_y), (cx+10, arrow_y-20), color, 2, tipLength=0.3)
 
+def draw_panel(img, key):
+    """Draw the panel for key (lid, (r, y, g) colours, state); SpriteCache renders each key once."""
+    lid, (r, y, g), state = key
+    ctr = traffic_lights_positions[lid]
+    tl = (ctr[0] - panel_width//2, ctr[1] - panel_height//2)
+    br = (ctr[0] + panel_width//2, ctr[1] + panel_height//2)
+    cv2.rectangle(img, tl, br, (255,255,255), -1)
+    rc, yc, gc = get_circle_centers(ctr)
+    cv2.circle(img, rc, circle_radius, r, -1)
+    cv2.circle(img, yc, circle_radius, y, -1)
+    cv2.circle(img, gc, circle_radius, g, -1)
+    cv2.putText(img, lid, (br[0]+5, ctr[1]),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
+
+    if lid in ("ID-2", "ID-4"):
+        col = base_green if state=="green" else base_yellow if state=="yellow" else base_red
+        draw_direction_arrows(img, ctr, col)
+
+    if lid in ("ID-1-F", "ID-3-F", "ID-1-L", "ID-3-L"):
+        col = base_green if state=="green" else base_yellow if state=="yellow" else base_red
+        arrow_y = ctr[1] - panel_height//2 - 10
+        if lid.endswith("-F"):
+            cv2.arrowedLine(img, (ctr[0], arrow_y),
+                            (ctr[0], arrow_y-20), col, 2, tipLength=0.3)
+        else:
+            cv2.arrowedLine(img, (ctr[0]-10, arrow_y),
+                            (ctr[0]-30, arrow_y), col, 2, tipLength=0.3)
+
 def transform_points(pts, H):
     pts = pts.reshape(-1,1,2)
     t = cv2.perspectiveTransform(pts, H)
     return t.reshape(-1,2).astype(np.int32)
 
-def compute_dynamic_homography(ref_img, cur_img):
-    g1 = cv2.cvtColor(ref_img, cv2.COLOR_BGR2GRAY)
-    g2 = cv2.cvtColor(cur_img, cv2.COLOR_BGR2GRAY)
-    sift = cv2.SIFT_create()
-    k1,d1 = sift.detectAndCompute(g1, None)
-    k2,d2 = sift.detectAndCompute(g2, None)
-    if d1 is None or d2 is None:
-        return None
-    bf = cv2.BFMatcher(cv2.NORM_L2)
-    matches = bf.knnMatch(d1, d2, k=2)
-    good = [m for m,n in matches if m.distance < 0.75*n.distance]
-    if len(good) < 10:
-        return None
-    src_pts = np.float32([k1[m.queryIdx].pt for m in good]).reshape(-1,1,2)
-    dst_pts = np.float32([k2[m.trainIdx].pt for m in good]).reshape(-1,1,2)
-    H, _ = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
-    return H
-
-def compute_homography_parallel(args):
-    ref_frame, frame = args
-    return compute_dynamic_homography(ref_frame, frame)
-
 def mouse_callback_ref(evt, x, y, flags, param):
     global current_annotation_id, current_mask_mode, current_mask_annotation
     global current_crossing_mode, current_crossing_annotation, current_crossing_id
@@ -212,61 +233,35 @@ def main():
     cv2.destroyWindow("Reference Frame")
     cap.release()
 
-    # --- STEP 3: PRELOAD FRAMES ---
-    cap = cv2.VideoCapture(video_path)
-    frames = []
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame.copy())
-    cap.release()
-
-    # --- STEP 4: PARALLEL HOMOGRAPHY COMPUTATION ---
-    args = [(ref_frame, f) for f in frames]
-    with Pool(processes=cpu_count()) as pool:
-        homographies = pool.map(compute_homography_parallel, args)
-
-    # --- STEP 5: OUTPUT & PROCESSING ---
+    # --- STEP 3: OUTPUT & STREAMED HOMOGRAPHIES ---
+    # frames are decoded, matched in parallel and handed back in order one at
+    # a time, so memory stays bounded whatever the video length
     cap = cv2.VideoCapture(video_path)
     fps = int(cap.get(cv2.CAP_PROP_FPS))
     w   = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     h   = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
     out = cv2.VideoWriter("output_video.mp4",
                           cv2.VideoWriter_fourcc(*"mp4v"),
                           fps, (w, h))
 
-    for idx, (frame, Hdyn) in enumerate(zip(frames, homographies), start=1):
+    # panels are rendered once per light/state and blitted; the preview is rate-capped
+    panels  = SpriteCache(draw_panel)
+    preview = Preview("Dynamic Intersection Overlays", max_fps=PREVIEW_FPS)
+
+    # the masked areas (moving traffic) are left out of feature detection
+    if SAVE_MASKS:
+        save_exclusion_masks(mask_polygons, SAVE_MASKS)
+        print(f"Saved {len(mask_polygons)} exclusion masks to {SAVE_MASKS}")
+    for idx, frame, Hdyn in stream_homographies(video_path, ref_frame,
+                                                keyframe_gap=KEYFRAME_GAP,
+                                                engine_kw={"exclude": mask_polygons}):
         frame_count = idx
 
         # draw traffic lights
-        for lid, ctr in traffic_lights_positions.items():
-            r, y, g = get_panel_colors_by_schedule(lid, frame_count)
-            tl = (ctr[0] - panel_width//2, ctr[1] - panel_height//2)
-            br = (ctr[0] + panel_width//2, ctr[1] + panel_height//2)
-            cv2.rectangle(frame, tl, br, (255,255,255), -1)
-            rc, yc, gc = get_circle_centers(ctr)
-            cv2.circle(frame, rc, circle_radius, r, -1)
-            cv2.circle(frame, yc, circle_radius, y, -1)
-            cv2.circle(frame, gc, circle_radius, g, -1)
-            cv2.putText(frame, lid, (br[0]+5, ctr[1]),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
-
-            if lid in ("ID-2", "ID-4"):
-                st = get_light_state(lid, frame_count)
-                col = base_green if st=="green" else base_yellow if st=="yellow" else base_red
-                draw_direction_arrows(frame, ctr, col)
-
-            if lid in ("ID-1-F", "ID-3-F", "ID-1-L", "ID-3-L"):
-                st = get_light_state(lid, frame_count)
-                col = base_green if st=="green" else base_yellow if st=="yellow" else base_red
-                arrow_y = ctr[1] - panel_height//2 - 10
-                if lid.endswith("-F"):
-                    cv2.arrowedLine(frame, (ctr[0], arrow_y),
-                                    (ctr[0], arrow_y-20), col, 2, tipLength=0.3)
-                else:
-                    cv2.arrowedLine(frame, (ctr[0]-10, arrow_y),
-                                    (ctr[0]-30, arrow_y), col, 2, tipLength=0.3)
+        for lid in traffic_lights_positions:
+            panels.blit(frame, (lid, get_panel_colors_by_schedule(lid, frame_count),
+                                get_light_state(lid, frame_count)))
 
         # dynamic overlays & crossing lines
         if Hdyn is not None:
@@ -309,11 +304,9 @@ def main():
         out.write(frame)
         cv2.putText(frame, f"Frame: {frame_count}", (20,60),
                     cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
-        cv2.imshow("Dynamic Intersection Overlays", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        if preview.show(frame) == ord('q'):
             break
 
-    cap.release()
     out.release()
     cv2.destroyAllWindows()
     print("Processed video saved to output_video.mp4")
@@ -3,6 +3,11 @@ import csv
 import numpy as np
 from pathlib import Path
 
+from homography import make_engine
+from homography_stack import HomographyStack
+from dynamic_export import (load_static_shapes, load_exclusion_masks, export_dynamic_shapes,
+                            reproject_dynamic_shapes)
+
 # =============================================================================
 # Dynamic Annotation + Export Tool
 # Combines interactive annotation with per-frame SIFT-based warping
@@ -11,6 +16,16 @@ from pathlib import Path
 # --- CONFIG ---
 VIDEO_PATH = r"C:\Users\odysh\OneDrive\Desktop\Preprocessing_Yolo_input\videos\15-min-testing.mp4"
 OUTPUT_DIR = Path.cwd()
+HOMOGRAPHY_MODE = 'sift'    # 'sift' = full SIFT every frame, 'track' = LK tracking + SIFT re-anchor,
+                            # 'adaptive' = ORB, escalating to SIFT only when the fit is poor
+REANCHOR_EVERY = 30         # 'track' mode: frames between forced SIFT re-anchors
+ANALYSIS_SCALE = 1.0        # <1: matching runs on a downscaled gray frame, H is mapped back to full res
+REFINE = False              # refit H at full resolution on the inliers
+KEYFRAME_GAP = 0            # >0: estimate H at most every N frames (sooner on drift), interpolate between
+INT_COORDS = False          # True: int coordinates like polygons.csv (last.py parses them with int())
+REUSE_HOMOGRAPHIES = True   # re-warp from a saved homographies.stack (same video + ref frame) instead of SIFT
+CHECKPOINT_EVERY = 500      # frames between export checkpoints; rerunning an interrupted export resumes it
+EXCLUDE_MASKS = None        # e.g. 'exclusion_masks.csv': reference-frame polygons (moving traffic) left out of feature detection
 
 # --- Globals ---
 current_id = None       # e.g. 'ID-1'
@@ -52,6 +67,7 @@ while True:
     k = cv2.waitKey(30) & 0xFF
     if k == ord('c'):
         ref_frame = frame.copy()
+        ref_idx = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1
         cv2.destroyWindow("Select Ref")
         break
     elif k == ord('q'):
@@ -126,66 +142,38 @@ print("Static annotations saved.")
 # EXPORT: Dynamic per-frame transformation
 # =============================================================================
 
-def compute_dynamic_homography(ref,cur):
-    g1,g2 = cv2.cvtColor(ref,cv2.COLOR_BGR2GRAY), cv2.cvtColor(cur,cv2.COLOR_BGR2GRAY)
-    sift=cv2.SIFT_create()
-    k1,d1=sift.detectAndCompute(g1,None); k2,d2=sift.detectAndCompute(g2,None)
-    if d1 is None or d2 is None: return None
-    bf=cv2.BFMatcher(cv2.NORM_L2); m=bf.knnMatch(d1,d2,k=2)
-    good=[x for x,y in m if x.distance<0.75*y.distance]
-    if len(good)<10: return None
-    src=np.float32([k1[x.queryIdx].pt for x in good]).reshape(-1,1,2)
-    dst=np.float32([k2[x.trainIdx].pt for x in good]).reshape(-1,1,2)
-    H,_=cv2.findHomography(src,dst,cv2.RANSAC,5.0); return H
-
-# prepare export CSVs
-dyn_poly=open(OUTPUT_DIR/'dynamic_polygons.csv','w',newline='')
-dyn_line=open(OUTPUT_DIR/'dynamic_lines.csv','w',newline='')
-pw=csv.writer(dyn_poly); lw=csv.writer(dyn_line)
-pw.writerow(['frame','id','x1','y1','x2','y2','x3','y3','x4','y4'])
-lw.writerow(['frame','id','x1','y1','x2','y2'])
-
 # read static back into arrays
-world={} ; lines={}
-with open(OUTPUT_DIR/'world_intersections.csv') as f:
-    for r in csv.DictReader(f):
-        world[r['id']] = np.array([
-            [float(r['x1']),float(r['y1'])],
-            [float(r['x2']),float(r['y2'])],
-            [float(r['x3']),float(r['y3'])],
-            [float(r['x4']),float(r['y4'])]
-        ], np.float32)
-with open(OUTPUT_DIR/'crossing_lines.csv') as f:
-    for r in csv.DictReader(f):
-        lines[r['id']] = np.array([
-            [float(r['x1']),float(r['y1'])],
-            [float(r['x2']),float(r['y2'])]
-        ], np.float32)
-
-# rewind video for export
-cap.set(cv2.CAP_PROP_POS_FRAMES,0)
-frame_idx=0; last_H=None
-while True:
-    ret,frm=cap.read()
-    if not ret: break
-    frame_idx+=1
-    H=compute_dynamic_homography(ref_frame,frm)
-    if H is not None: last_H=H
-    if last_H is None: continue
-
-    # dynamic polygons
-    for iid,pts in world.items():
-        pts_arr = pts.reshape(-1,1,2)  # now numpy, reshape works
-        warped = cv2.perspectiveTransform(pts_arr, last_H).reshape(-1,2)
-        pw.writerow([frame_idx,iid] + warped.flatten().tolist())
-
-    # dynamic lines
-    for iid,pts in lines.items():
-        pts_arr = pts.reshape(-1,1,2)
-        warped = cv2.perspectiveTransform(pts_arr, last_H).reshape(-1,2)
-        lw.writerow([frame_idx,iid] + warped.flatten().tolist())
-
-cap.release(); dyn_poly.close(); dyn_line.close()
+world, lines = load_static_shapes(OUTPUT_DIR)
+
+# a stack saved by an earlier export of the same video and reference frame
+# already holds every homography: only the shapes need re-warping
+stack_dir = OUTPUT_DIR/'homographies.stack'
+stack_meta = HomographyStack(stack_dir).meta if (stack_dir/'meta.json').exists() else {}
+if (REUSE_HOMOGRAPHIES and stack_meta.get('video') == str(VIDEO_PATH)
+        and stack_meta.get('ref_frame') == ref_idx):
+    print("Reprojecting from saved homographies.stack")
+    reproject_dynamic_shapes(stack_dir, world, lines, OUTPUT_DIR, int_coords=INT_COORDS)
+else:
+    # reference features are computed once and reused for every frame
+    exclude = []
+    if EXCLUDE_MASKS:
+        exclude = load_exclusion_masks(OUTPUT_DIR/EXCLUDE_MASKS)   # [] if the file is missing
+        print(f"Exclusion masks: {len(exclude)} polygons from {OUTPUT_DIR/EXCLUDE_MASKS}")
+    engine_kw = {'scale': ANALYSIS_SCALE, 'refine': REFINE, 'exclude': exclude}
+    if HOMOGRAPHY_MODE == 'track':
+        engine_kw['reanchor_every'] = REANCHOR_EVERY
+    engine = make_engine(ref_frame, HOMOGRAPHY_MODE, **engine_kw)
+
+    # warp the static shapes into every frame
+    export_dynamic_shapes(cap, engine, world, lines, OUTPUT_DIR,
+                          keyframe_gap=KEYFRAME_GAP, int_coords=INT_COORDS,
+                          video=VIDEO_PATH, ref_frame=ref_idx,
+                          checkpoint_every=CHECKPOINT_EVERY)
+
+cap.release()
 print("Dynamic export complete:")
 print(" - dynamic_polygons.csv")
 print(" - dynamic_lines.csv")
+print(" - dynamic_polygons.tracks/")
+print(" - homographies.stack/")
+print(" - homography_log.csv")
@@ -0,0 +1,115 @@
+"""
+track_state.py
+Per-track state in fixed-size arrays, one row per live SORT track, freed
+once SORT has dropped the track.
+
+    store = TrackStore(capacity=256)
+    store.field("side", dtype=np.int8, fill=NO_SIDE)     # (capacity,) array, reset for every new track
+    rows = store.rows(tracked[:, 4].astype(int))         # row per track id, new ids get free rows
+    store["side"][rows] = sides
+    store.evict(live_ids(tracker))                       # free the rows of tracks SORT deleted
+    coasted(tracker, tracked[:, 4])                      # their predicted boxes on a frame not detected
+    store.summary()     # {"tracks": 212, "capacity": 256, "peak": 240, "added": 5310, "evicted": 5098, "bytes": …}
+
+The dicts and sets the loops kept per track id (last_positions and
+seen_ids in run_traffic_management, last_box_side / saved_ids /
+unique_ids in the red-light violation loop) only ever grew: SORT numbers
+its tracks 1, 2, 3, … and never reuses an id, so after hours of footage
+they held every id ever seen.  Here the state of a track lives in one row
+of each field array, and evict() gives the row back as soon as the id is
+no longer among SORT's trackers.  An id SORT deleted never comes back, so
+dropping its state changes nothing.  Memory follows the number of live
+tracks; the arrays only grow (doubling) if more tracks are alive at once
+than `capacity`, and `added` still counts every id ever seen.
+"""
+
+import sys
+
+import numpy as np
+
+
+def live_ids(tracker):
+    """Ids of the tracks a sort.Sort still keeps (it reports tracker k as id k + 1)."""
+    return [trk.id + 1 for trk in tracker.trackers]
+
+
+def coasted(tracker, ids):
+    """(n, 5) x1, y1, x2, y2, id of SORT's predicted boxes for the tracks in `ids` still kept, for frames not detected."""
+    ids = {int(i) for i in ids}
+    boxes = [np.r_[trk.get_state()[0][:4], trk.id + 1] for trk in tracker.trackers if trk.id + 1 in ids]
+    return np.array(boxes, np.float64).reshape(-1, 5)
+
+
+class TrackStore:
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.row = {}                                   # track id → row
+        self.ids = np.full(capacity, -1, np.int64)      # track id per row, -1 for a free row
+        self._free = list(range(capacity - 1, -1, -1))
+        self._fields = {}                               # name → (array, fill)
+        self.added = self.evicted = self.peak = 0
+
+    def __len__(self):
+        return len(self.row)
+
+    def __getitem__(self, name):
+        return self._fields[name][0]
+
+    def field(self, name, shape=(), dtype=np.float64, fill=0):
+        """(capacity, *shape) array `name`; declared again with a larger shape it keeps its values."""
+        new = np.full((self.capacity,) + tuple(shape), fill, dtype)
+        if name in self._fields:
+            old = self._fields[name][0]
+            new[(slice(None),) + tuple(slice(0, n) for n in old.shape[1:])] = old
+        self._fields[name] = (new, fill)
+        return new
+
+    def _grow(self):
+        cap = self.capacity * 2
+        self.ids = np.concatenate([self.ids, np.full(cap - self.capacity, -1, np.int64)])
+        for name, (arr, fill) in self._fields.items():
+            new = np.full((cap,) + arr.shape[1:], fill, arr.dtype)
+            new[:self.capacity] = arr
+            self._fields[name] = (new, fill)
+        self._free = list(range(cap - 1, self.capacity - 1, -1)) + self._free
+        self.capacity = cap
+
+    def rows(self, track_ids):
+        """Row per id of `track_ids`; ids not stored yet get a free row with every field at its fill."""
+        rows = np.empty(len(track_ids), np.intp)
+        new = []
+        for i, tid in enumerate(np.asarray(track_ids).tolist()):
+            r = self.row.get(tid)
+            if r is None:
+                if not self._free:
+                    self._grow()
+                r = self.row[tid] = self._free.pop()
+                self.ids[r] = tid
+                new.append(r)
+            rows[i] = r
+        if new:
+            for arr, fill in self._fields.values():
+                arr[new] = fill
+            self.added += len(new)
+            self.peak = max(self.peak, len(self.row))
+        return rows
+
+    def evict(self, live):
+        """Free the rows of every stored id not in `live`; returns how many were freed."""
+        used = self.ids >= 0
+        dead = np.flatnonzero(used & ~np.isin(self.ids, np.asarray(list(live), np.int64)))
+        for r in dead.tolist():
+            del self.row[int(self.ids[r])]
+            self._free.append(r)
+        self.ids[dead] = -1
+        self.evicted += len(dead)
+        return len(dead)
+
+    def nbytes(self):
+        """Bytes held by the arrays and the id → row map."""
+        return (self.ids.nbytes + sum(arr.nbytes for arr, _ in self._fields.values())
+                + sys.getsizeof(self.row) + sys.getsizeof(self._free))
+
+    def summary(self):
+        return {"tracks": len(self.row), "capacity": self.capacity, "peak": self.peak,
+                "added": self.added, "evicted": self.evicted, "bytes": self.nbytes()}